@@ -0,0 +1,104 @@
+"""
+Cost of looking up options of attributes for an HTTP method: the previous
+ContextOperator dispatch, versus AttributeContextOperator backed by
+AttributePolicyTable. Also compares the required-field check of an object,
+looping over children versus a subset test on precomputed names.
+
+Usage: python benchmarks/bench_attr_context.py [children] [rounds]
+"""
+
+import sys
+import time
+
+from restpf.utils.constants import (
+    HTTPMethodConfig,
+    AppearanceConfig,
+)
+from restpf.utils.helper_classes import ContextOperator
+from restpf.resource.attributes import (
+    Object,
+    Integer,
+    AttributeIndex,
+    attribute_context,
+)
+
+
+def _generate_http_method_context_operator(method_prefix):
+    return {
+        method: f'{method_prefix}_in_{method.name.lower()}'
+        for method in HTTPMethodConfig
+    }
+
+
+class DispatchAttributeContextOperator(ContextOperator):
+
+    OPERATION_MAPPING = {
+        'appear': _generate_http_method_context_operator('appear'),
+        'unknown': _generate_http_method_context_operator('unknown'),
+    }
+
+
+def check_required_by_loop(attr_context, node, names):
+    for name, child in node.bh_named_children.items():
+        if name in names:
+            continue
+        if attr_context.appear(child) is AppearanceConfig.REQUIRE:
+            return False
+    return True
+
+
+def check_required_by_table(attr_context, node, names):
+    return attr_context.required_children(node) <= names
+
+
+def measure(func, rounds):
+    start = time.perf_counter()
+    for _ in range(rounds):
+        func()
+    return time.perf_counter() - start
+
+
+def main(children, rounds):
+    node = Object({f'a{idx}': Integer for idx in range(children)})
+    AttributeIndex(node)
+    nodes = list(node.bh_children)
+    names = frozenset(node.bh_named_children)
+
+    method = HTTPMethodConfig.POST
+    dispatch_context = DispatchAttributeContextOperator(method)
+    table_context = attribute_context(method)
+
+    for name, func in [
+        (
+            'appear/dispatch',
+            lambda: [dispatch_context.appear(n) for n in nodes],
+        ),
+        (
+            'appear/table',
+            lambda: [table_context.appear(n) for n in nodes],
+        ),
+        (
+            'required/loop',
+            lambda: check_required_by_loop(dispatch_context, node, names),
+        ),
+        (
+            'required/table',
+            lambda: check_required_by_table(table_context, node, names),
+        ),
+        (
+            'context/create',
+            lambda: DispatchAttributeContextOperator(method),
+        ),
+        (
+            'context/shared',
+            lambda: attribute_context(method),
+        ),
+    ]:
+        elapsed = measure(func, rounds)
+        print(f'{name:>16}: {elapsed / rounds * 1e6:8.2f} us')
+
+
+if __name__ == '__main__':
+    children = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    rounds = int(sys.argv[2]) if len(sys.argv) > 2 else 10000
+    main(children, rounds)
@@ -0,0 +1,79 @@
+"""
+Bytes on the wire, encode and decode time of a GET representation with a
+large `Array(Object(...))`, for every codec of default_codecs.
+
+Usage: python benchmarks/bench_codecs.py [elements]
+"""
+
+import asyncio
+import sys
+import time
+
+from restpf.resource.attributes import (
+    Array,
+    Object,
+    Integer,
+    String,
+    Bool,
+)
+from restpf.resource.definition import (
+    Attributes,
+    Resource,
+)
+from restpf.pipeline.codecs import default_codecs
+from restpf.pipeline.single_resource.get import (
+    GetSingleResourcePipelineRunner,
+)
+
+
+def create_resource(elements):
+    resource = Resource(
+        'bench',
+        Attributes({
+            'items': Array(Object({
+                'id': Integer,
+                'name': String,
+                'enabled': Bool,
+            })),
+        }),
+        None,
+    )
+
+    @resource.attributes.items.GET
+    def get_items(resource_id):
+        return [
+            {'id': idx, 'name': f'name-{idx}', 'enabled': bool(idx % 2)}
+            for idx in range(elements)
+        ]
+
+    return resource
+
+
+def measure(func, *args):
+    start = time.perf_counter()
+    ret = func(*args)
+    return time.perf_counter() - start, ret
+
+
+async def main(elements):
+    resource = create_resource(elements)
+    runner = GetSingleResourcePipelineRunner()
+    runner.build(resource, raw_resource_id=1)
+    pipeline = await runner.run_pipeline()
+
+    for codec in default_codecs:
+        encode_seconds, data = measure(pipeline.encode_representation, codec)
+        decode_seconds, representation = measure(
+            codec.decode_representation, resource, data,
+        )
+        assert representation == pipeline.representation
+        print(
+            f'{codec.MEDIA_TYPE:>36}: {len(data):9d} bytes, '
+            f'encode {encode_seconds * 1e3:7.1f} ms, '
+            f'decode {decode_seconds * 1e3:7.1f} ms',
+        )
+
+
+if __name__ == '__main__':
+    elements = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    asyncio.run(main(elements))
@@ -0,0 +1,138 @@
+"""
+Cost per request of merging the returns of callbacks into raw output, for a
+resource with a callback on every attribute: collecting into TreeState then
+merging recursively, versus the slots of OutputMergeLayout.
+
+Usage: python benchmarks/bench_merge.py [groups] [requests]
+"""
+
+import asyncio
+import sys
+import time
+
+from restpf.utils.constants import HTTPMethodConfig
+from restpf.utils.helper_classes import TreeState
+from restpf.resource.attributes import (
+    Object,
+    Integer,
+)
+from restpf.resource.definition import (
+    Attributes,
+    Resource,
+)
+from restpf.pipeline.protocol import (
+    ContextRule,
+    ResourceState,
+)
+from restpf.pipeline.operations import _merge_output_of_node
+
+
+LEAVES_PER_GROUP = 10
+
+
+class GetContextRule(ContextRule):
+    HTTPMethod = HTTPMethodConfig.GET
+
+
+def create_plan(groups):
+    resource = Resource(
+        'bench',
+        Attributes({
+            f'group{group}': Object({
+                f'leaf{leaf}': Integer
+                for leaf in range(LEAVES_PER_GROUP)
+            })
+            for group in range(groups)
+        }),
+        None,
+    )
+
+    for group in range(groups):
+        group_registrar = getattr(resource.attributes, f'group{group}')
+        group_registrar.GET(lambda: {})
+        for leaf in range(LEAVES_PER_GROUP):
+            registrar = getattr(
+                getattr(resource.attributes, f'group{group}'),
+                f'leaf{leaf}',
+            )
+            registrar.GET(lambda: 1)
+
+    plan, _ = asyncio.run(GetContextRule().select_plan(
+        resource, ResourceState(None, None, None),
+    ))
+    return plan
+
+
+def merge_tree_state(tree_state):
+    # reference implementation, merging recursively.
+    root_gap = tree_state.root_gap
+    ret = root_gap.value if root_gap else {}
+    ret = _merge_output_of_node(ret, None, tree_state)
+
+    def merge_children(node_ret, node):
+        for name, child in node.children:
+            child_ret = _merge_output_of_node(
+                node_ret.get(name), child.value, child.next,
+            )
+            node_ret[name] = child_ret
+            if child.next:
+                merge_children(child_ret, child.next)
+
+    if tree_state:
+        merge_children(ret, tree_state)
+    return ret
+
+
+def run_tree_state(plan, rets):
+    name2raw_obj = {}
+    for entry, ret in zip(plan.entries, rets):
+        tree_state = name2raw_obj.get(entry.collection_name)
+        if tree_state is None:
+            tree_state = name2raw_obj[entry.collection_name] = TreeState()
+        tree_state.touch(entry.path).value = ret
+
+    return {
+        name: merge_tree_state(tree_state)
+        for name, tree_state in name2raw_obj.items()
+    }
+
+
+def run_layout(plan, rets):
+    layout = plan.merge_layout
+    slot_values = layout.create_slot_values()
+    for slot, ret in zip(layout.entry_slots, rets):
+        slot_values[slot] = ret
+    return layout.merge(slot_values)
+
+
+def measure(run, plan, rets, requests):
+    start = time.perf_counter()
+    for _ in range(requests):
+        ret = run(plan, rets)
+    return time.perf_counter() - start, ret
+
+
+def main(groups, requests):
+    plan = create_plan(groups)
+    rets = [
+        {} if entry.attr.bh_children else entry.attr.path_id
+        for entry in plan.entries
+    ]
+    print(f'callbacks: {len(plan.entries)}')
+
+    results = []
+    for name, run in [
+        ('tree_state', run_tree_state),
+        ('layout', run_layout),
+    ]:
+        elapsed, ret = measure(run, plan, rets, requests)
+        results.append(ret)
+        print(f'{name:>12}: {elapsed / requests * 1e6:8.1f} us/request')
+
+    assert results[0] == results[1]
+
+
+if __name__ == '__main__':
+    groups = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    requests = int(sys.argv[2]) if len(sys.argv) > 2 else 1000
+    main(groups, requests)
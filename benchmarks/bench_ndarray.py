@@ -0,0 +1,70 @@
+"""
+Validation and serialization of a large `Array(Float)`, from a list of
+floats through output states, from the same list through compiled
+functions, and from a NumPy ndarray through compiled functions.
+
+Usage: python benchmarks/bench_ndarray.py [elements]
+"""
+
+import sys
+import time
+
+import numpy
+
+from restpf.resource.attributes import (
+    AttributeContextOperator,
+    HTTPMethodConfig,
+    Array,
+    Float,
+)
+from restpf.resource.attribute_states import (
+    create_attribute_state_tree_for_output,
+    node2statecls_default_output,
+)
+from restpf.resource.attribute_compilers import (
+    compiled_validator,
+    compiled_serializer,
+)
+
+
+def run_states(attr, value):
+    state = create_attribute_state_tree_for_output(attr, value)
+    assert state.validate(AttributeContextOperator(HTTPMethodConfig.GET))
+    return state.serialize()
+
+
+def run_compiled(attr, value):
+    validate = compiled_validator(
+        attr, HTTPMethodConfig.GET, node2statecls_default_output,
+    )
+    assert validate(value)
+    return compiled_serializer(attr)(value)
+
+
+def measure(run, attr, value):
+    start = time.perf_counter()
+    ret = run(attr, value)
+    return time.perf_counter() - start, ret
+
+
+def main(elements):
+    attr = Array(Float)
+    array = numpy.random.random(elements)
+    values = array.tolist()
+
+    expected = None
+    for name, run, value in [
+        ('states', run_states, values),
+        ('list', run_compiled, values),
+        ('ndarray', run_compiled, array),
+    ]:
+        elapsed, ret = measure(run, attr, value)
+        if expected is None:
+            expected = ret
+        assert expected == ret
+        print(f'{name:>8}: {elapsed * 1e3:8.1f} ms')
+
+
+if __name__ == '__main__':
+    elements = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    main(elements)
@@ -0,0 +1,79 @@
+"""
+Input of a POST with a large `Array(Object(...))` from request bytes:
+`json.loads`, building input states and validating them, versus parsing and
+validating in one pass (compile_parser). Invalid payloads are rejected on the
+first violation.
+
+Usage: python benchmarks/bench_parse.py [elements]
+"""
+
+import json
+import sys
+import time
+
+from restpf.resource.attributes import (
+    AttributeContextOperator,
+    HTTPMethodConfig,
+    Array,
+    Object,
+    Integer,
+    String,
+    Bool,
+)
+from restpf.resource.attribute_states import (
+    create_attribute_state_tree_for_input,
+)
+from restpf.resource.attribute_compilers import compiled_parser
+
+
+def run_states(attr, body):
+    state = create_attribute_state_tree_for_input(attr, json.loads(body))
+    return state.validate(AttributeContextOperator(HTTPMethodConfig.POST))
+
+
+def run_parser(attr, body):
+    try:
+        compiled_parser(attr, HTTPMethodConfig.POST)(body)
+        return True
+    except RuntimeError:
+        return False
+
+
+def measure(run, attr, body):
+    start = time.perf_counter()
+    ret = run(attr, body)
+    return time.perf_counter() - start, ret
+
+
+def main(elements):
+    attr = Array(Object({
+        'id': Integer,
+        'name': String,
+        'enabled': Bool,
+    }))
+    values = [
+        {'id': idx, 'name': f'name-{idx}', 'enabled': bool(idx % 2)}
+        for idx in range(elements)
+    ]
+    valid_body = json.dumps(values).encode('utf-8')
+    values[0]['id'] = 'not an integer'
+    invalid_body = json.dumps(values).encode('utf-8')
+
+    for body_name, body in [
+        ('valid', valid_body),
+        ('invalid', invalid_body),
+    ]:
+        for name, run in [
+            ('states', run_states),
+            ('parser', run_parser),
+        ]:
+            elapsed, ret = measure(run, attr, body)
+            print(
+                f'{body_name:>8} {name:>8}: {elapsed * 1e3:8.1f} ms, '
+                f'valid={ret}',
+            )
+
+
+if __name__ == '__main__':
+    elements = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    main(elements)
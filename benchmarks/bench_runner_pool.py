@@ -0,0 +1,113 @@
+"""
+Cost per request of building runners from scratch, versus reusing pooled
+runners (PipelineRunnerPool).
+
+Usage: python benchmarks/bench_runner_pool.py [requests]
+"""
+
+import asyncio
+import sys
+import time
+import tracemalloc
+
+from restpf.resource.attributes import (
+    Integer,
+    String,
+)
+from restpf.resource.definition import (
+    Attributes,
+    Resource,
+)
+from restpf.pipeline.protocol import PipelineRunnerPool
+from restpf.pipeline.single_resource.get import (
+    GetSingleResourcePipelineRunner,
+)
+
+
+def create_resource():
+    resource = Resource(
+        'bench',
+        Attributes({
+            'foo': Integer,
+            'bar': String,
+        }),
+        None,
+        coalesce_pipelines=False,
+    )
+
+    @resource.attributes.foo.GET
+    def get_foo(resource_id):
+        return resource_id
+
+    @resource.attributes.bar.GET
+    def get_bar(resource_id):
+        return str(resource_id)
+
+    return resource
+
+
+def setup_fresh(resource, resource_id):
+    runner = GetSingleResourcePipelineRunner()
+    runner.build(resource, raw_resource_id=resource_id)
+    return runner
+
+
+def create_setup_pooled(resource):
+    pool = PipelineRunnerPool(GetSingleResourcePipelineRunner, resource)
+
+    def setup_pooled(resource, resource_id):
+        runner = pool.acquire(raw_resource_id=resource_id)
+        pool.release(runner)
+        return runner
+
+    return setup_pooled
+
+
+def measure_setup(setup, resource, requests):
+    setup(resource, 0)
+
+    start = time.perf_counter()
+    for resource_id in range(requests):
+        setup(resource, resource_id)
+    elapsed = time.perf_counter() - start
+
+    # keep runners alive, so that every allocation is counted.
+    runners = []
+    tracemalloc.start()
+    for resource_id in range(requests):
+        runners.append(setup(resource, resource_id))
+    allocated, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return elapsed / requests, allocated / requests
+
+
+async def measure_request(setup, resource, requests):
+    await setup(resource, 0).run_pipeline()
+
+    start = time.perf_counter()
+    for resource_id in range(requests):
+        runner = setup(resource, resource_id)
+        await runner.run_pipeline()
+    return (time.perf_counter() - start) / requests
+
+
+async def main(requests):
+    resource = create_resource()
+
+    for name, setup in [
+        ('fresh', setup_fresh),
+        ('pooled', create_setup_pooled(resource)),
+    ]:
+        setup_seconds, setup_bytes = measure_setup(setup, resource, requests)
+        request_seconds = await measure_request(setup, resource, requests)
+        print(
+            f'{name:>8}: setup {setup_seconds * 1e6:6.1f} us, '
+            f'{setup_bytes:7.1f} bytes; '
+            f'request {request_seconds * 1e6:6.1f} us',
+        )
+
+
+if __name__ == '__main__':
+    requests = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    asyncio.run(main(requests))
@@ -0,0 +1,72 @@
+"""
+Cost per level of building, validating and serializing state trees, for a
+deep schema (nested `Object`s, deeper than the recursion limit) and a wide
+one (a flat `Object` with the same number of leaves).
+
+Usage: python benchmarks/bench_state_depth.py [levels]
+"""
+
+import sys
+import time
+
+from restpf.resource.attributes import (
+    AttributeContextOperator,
+    HTTPMethodConfig,
+    Object,
+    Integer,
+)
+from restpf.resource.attribute_states import (
+    create_attribute_state_tree_for_output,
+)
+
+
+def deep_schema(levels):
+    attr = Integer()
+    value = 1
+    for _ in range(levels):
+        attr = Object({'a': attr})
+        value = {'a': value}
+    return attr, value
+
+
+def wide_schema(levels):
+    attr = Object({f'a{idx}': Integer for idx in range(levels)})
+    value = {f'a{idx}': idx for idx in range(levels)}
+    return attr, value
+
+
+def measure(attr, value, max_depth):
+    start = time.perf_counter()
+    state = create_attribute_state_tree_for_output(
+        attr, value, max_depth=max_depth,
+    )
+    built = time.perf_counter()
+    state.validate(
+        AttributeContextOperator(HTTPMethodConfig.GET),
+        max_depth=max_depth,
+    )
+    validated = time.perf_counter()
+    state.serialize(max_depth=max_depth)
+    serialized = time.perf_counter()
+    return built - start, validated - built, serialized - validated
+
+
+def main(levels):
+    for name, (attr, value) in [
+        ('deep', deep_schema(levels)),
+        ('wide', wide_schema(levels)),
+    ]:
+        elapsed = measure(attr, value, levels + 1)
+        print(
+            f'{name:>6}: ' + ', '.join(
+                f'{step} {t / levels * 1e6:6.2f} us/level'
+                for step, t in zip(
+                    ['build', 'validate', 'serialize'], elapsed,
+                )
+            ),
+        )
+
+
+if __name__ == '__main__':
+    levels = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    main(levels)
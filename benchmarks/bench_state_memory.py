@@ -0,0 +1,92 @@
+"""
+Memory of attribute state trees, e.g. the input state of a POST with a large
+`Array(Object(...))`, and the peak memory of validating and serializing an
+output state eagerly or lazily, in two walks or a single one.
+
+Usage: python benchmarks/bench_state_memory.py [elements]
+"""
+
+import sys
+import tracemalloc
+
+from restpf.resource.attributes import (
+    AttributeContextOperator,
+    HTTPMethodConfig,
+    Array,
+    Object,
+    Integer,
+    String,
+    Bool,
+)
+from restpf.resource.attribute_states import (
+    create_attribute_state_tree_for_input,
+    create_attribute_state_tree_for_output,
+)
+
+
+def count_nodes(state):
+    return 1 + sum(map(count_nodes, state.bh_children))
+
+
+def measure(create, attr, value):
+    tracemalloc.start()
+    state = create(attr, value)
+    allocated, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return allocated, count_nodes(state)
+
+
+def measure_serialize_peak(attr, value, lazy, single_walk=False):
+    attr_context = AttributeContextOperator(HTTPMethodConfig.GET)
+
+    tracemalloc.start()
+    state = create_attribute_state_tree_for_output(attr, value, lazy=lazy)
+    if single_walk:
+        is_valid, _ = state.validate_and_serialize(attr_context)
+        assert is_valid
+    else:
+        assert state.validate(attr_context)
+        state.serialize()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return peak
+
+
+def main(elements):
+    attr = Array(Object({
+        'id': Integer,
+        'name': String,
+        'enabled': Bool,
+    }))
+    value = [
+        {'id': idx, 'name': f'name-{idx}', 'enabled': bool(idx % 2)}
+        for idx in range(elements)
+    ]
+
+    for name, create in [
+        ('input', create_attribute_state_tree_for_input),
+        ('output', create_attribute_state_tree_for_output),
+    ]:
+        allocated, nodes = measure(create, attr, value)
+        print(
+            f'{name:>8}: {nodes} nodes, {allocated / 2 ** 20:7.2f} MiB, '
+            f'{allocated / nodes:6.1f} bytes/node',
+        )
+
+    for name, lazy, single_walk in [
+        ('eager', False, False),
+        ('lazy', True, False),
+        ('single', True, True),
+    ]:
+        peak = measure_serialize_peak(attr, value, lazy, single_walk)
+        print(
+            f'{name:>8}: peak of validate and serialize '
+            f'{peak / 2 ** 20:7.2f} MiB',
+        )
+
+
+if __name__ == '__main__':
+    elements = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    main(elements)
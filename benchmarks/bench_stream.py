@@ -0,0 +1,99 @@
+"""
+Time to first byte and peak memory of a GET with a large `Array(Object(...))`,
+encoding the whole representation at once, versus streaming chunks.
+
+Usage: python benchmarks/bench_stream.py [elements]
+"""
+
+import asyncio
+import sys
+import time
+import tracemalloc
+
+from restpf.resource.attributes import (
+    Array,
+    Object,
+    Integer,
+    String,
+)
+from restpf.resource.definition import (
+    Attributes,
+    Resource,
+)
+from restpf.utils.encoders import dumps_json
+from restpf.pipeline.single_resource.get import (
+    GetSingleResourcePipelineRunner,
+)
+
+
+def create_resource(elements):
+    resource = Resource(
+        'bench',
+        Attributes({
+            'items': Array(Object({
+                'id': Integer,
+                'name': String,
+            })),
+        }),
+        None,
+        coalesce_pipelines=False,
+    )
+
+    @resource.attributes.items.GET
+    def get_items(resource_id):
+        return [
+            {'id': idx, 'name': f'name-{idx}'}
+            for idx in range(elements)
+        ]
+
+    return resource
+
+
+async def run_whole(runner):
+    pipeline = await runner.run_pipeline()
+    yield dumps_json(pipeline.representation).encode('utf-8')
+
+
+async def run_stream(runner):
+    _, chunks = await runner.stream_pipeline()
+    for chunk in chunks:
+        yield chunk
+
+
+async def measure(run, resource):
+    runner = GetSingleResourcePipelineRunner()
+    runner.build(resource, raw_resource_id=1)
+
+    tracemalloc.start()
+    start = time.perf_counter()
+    first_byte = None
+    size = 0
+    async for chunk in run(runner):
+        if first_byte is None:
+            first_byte = time.perf_counter() - start
+        size += len(chunk)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return first_byte, elapsed, peak, size
+
+
+async def main(elements):
+    resource = create_resource(elements)
+
+    for name, run in [
+        ('whole', run_whole),
+        ('stream', run_stream),
+    ]:
+        first_byte, elapsed, peak, size = await measure(run, resource)
+        print(
+            f'{name:>8}: first byte {first_byte * 1e3:7.1f} ms, '
+            f'total {elapsed * 1e3:7.1f} ms, '
+            f'peak {peak / 2 ** 20:7.2f} MiB, {size} bytes',
+        )
+
+
+if __name__ == '__main__':
+    elements = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    asyncio.run(main(elements))
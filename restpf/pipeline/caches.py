@@ -0,0 +1,133 @@
+"""
+Caches shared by pipelines of a resource.
+
+- RepresentationCache: representations generated by GET pipelines, keyed by
+resource name and id. Representations of different sparse fieldsets of the same
+id share one entry. Invalidated by write pipelines (POST, PATCH and DELETE) of
+the same id.
+- CallbackMemo: memoized returns of a callback registered with `cache_ttl`,
+keyed by resource id, invalidated the same way.
+
+Usage:
+
+foo = Resource(
+    'foo',
+    Attributes(...),
+    representation_cache=RepresentationCache(max_entries=10000, ttl=60),
+)
+"""
+
+import sys
+import collections.abc as abc
+
+from restpf.utils.helper_classes import LRUCache
+
+
+def estimate_size(obj):
+    '''
+    Rough estimation of bytes of a JSON-like object.
+    '''
+    size = sys.getsizeof(obj)
+
+    if isinstance(obj, abc.Mapping):
+        for key, value in obj.items():
+            size += estimate_size(key) + estimate_size(value)
+    elif isinstance(obj, (list, tuple)):
+        for value in obj:
+            size += estimate_size(value)
+
+    return size
+
+
+class RepresentationCache:
+
+    '''
+    Representations are shared by readers, and should not be mutated.
+    '''
+
+    def __init__(self, max_entries=1024, max_bytes=None, ttl=None, **options):
+        self._cache = LRUCache(
+            max_entries=max_entries,
+            max_bytes=max_bytes,
+            ttl=ttl,
+            sizeof=estimate_size if max_bytes is not None else None,
+            **options
+        )
+        # bumped on every invalidation, see `begin`.
+        self._generation = 0
+
+    def _key(self, resource, resource_id):
+        return (resource.name, resource_id)
+
+    def __len__(self):
+        return len(self._cache)
+
+    @property
+    def lru(self):
+        return self._cache
+
+    def get(self, resource, resource_id, fields=None):
+        '''
+        `fields`: normalized sparse fieldset, None for all fields.
+        '''
+        fields2rep = self._cache.get(self._key(resource, resource_id))
+        if fields2rep is None:
+            return None
+        return fields2rep.get(fields)
+
+    def begin(self):
+        '''
+        Should be called before generating the representation, and passed to
+        `set`. A representation generated concurrently with an invalidation
+        will not be cached, since it might be stale.
+        '''
+        return self._generation
+
+    def set(self, resource, resource_id, representation, token, fields=None):
+        if token != self._generation:
+            return
+        key = self._key(resource, resource_id)
+        fields2rep = dict(self._cache.get(key) or {})
+        fields2rep[fields] = representation
+        self._cache.set(key, fields2rep)
+
+    def invalidate(self, resource, resource_id):
+        self._generation += 1
+        self._cache.pop(self._key(resource, resource_id))
+
+    def clear(self):
+        self._generation += 1
+        self._cache.clear()
+
+
+class CallbackMemo:
+
+    '''
+    Like RepresentationCache, a return computed concurrently with an
+    invalidation will not be memoized, see `begin`.
+    '''
+
+    def __init__(self, max_entries=1024, ttl=None):
+        self._cache = LRUCache(max_entries=max_entries, ttl=ttl)
+        self._generation = 0
+
+    def __len__(self):
+        return len(self._cache)
+
+    def get(self, resource_id, default=None):
+        return self._cache.get(resource_id, default)
+
+    def begin(self):
+        '''
+        Should be called before calling the callback, and passed to `set`.
+        '''
+        return self._generation
+
+    def set(self, resource_id, ret, token):
+        if token != self._generation:
+            return
+        self._cache.set(resource_id, ret)
+
+    def invalidate(self, resource_id):
+        self._generation += 1
+        self._cache.pop(resource_id)
@@ -0,0 +1,278 @@
+"""
+Codecs of representations and input, selected per request by content
+negotiation.
+
+- JSONCodec: application/json.
+- MessagePackCodec: application/msgpack, if msgpack is installed.
+- CBORCodec: application/cbor, if cbor2 is installed.
+- SchemaCodec: wraps one of above, type tags and names of attributes are
+dropped, since both sides share the attribute tree, see _PackerCompiler.
+
+Usage:
+
+codec = default_codecs.negotiate(request.headers.get('Accept'))
+if codec is None:
+    # 406 Not Acceptable.
+    ...
+body = pipeline.encode_representation(codec)
+
+For POST/PATCH, pass the body as `raw_attributes` (bytes) and the codec of
+`Content-Type` as `input_codec`.
+"""
+
+import json
+
+from restpf.utils.encoders import dumps_json
+from restpf.resource.attribute_compilers import (
+    compiled_serializer,
+    compiled_packer,
+    compiled_unpacker,
+)
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import cbor2
+except ImportError:
+    cbor2 = None
+
+
+class Codec:
+
+    # require subclass to override.
+    MEDIA_TYPE = None
+
+    def dumps(self, value):
+        raise NotImplementedError
+
+    def loads(self, data):
+        raise NotImplementedError
+
+    def encode_representation(self, resource, representation):
+        return self.dumps(representation)
+
+    def decode_representation(self, resource, data):
+        return self.loads(data)
+
+    def encode_input(self, node, value):
+        '''
+        `value`: raw value of attribute tree `node`, e.g. raw_attributes.
+        '''
+        return self.dumps(value)
+
+    def decode_input(self, node, data):
+        return self.loads(data)
+
+
+class JSONCodec(Codec):
+
+    MEDIA_TYPE = 'application/json'
+
+    def dumps(self, value):
+        return dumps_json(value).encode('utf-8')
+
+    def loads(self, data):
+        return json.loads(data)
+
+
+class MessagePackCodec(Codec):
+
+    MEDIA_TYPE = 'application/msgpack'
+
+    def dumps(self, value):
+        return msgpack.packb(value)
+
+    def loads(self, data):
+        return msgpack.unpackb(data)
+
+
+class CBORCodec(Codec):
+
+    MEDIA_TYPE = 'application/cbor'
+
+    def dumps(self, value):
+        return cbor2.dumps(value)
+
+    def loads(self, data):
+        return cbor2.loads(data)
+
+
+class SchemaCodec(Codec):
+
+    '''
+    Representation of single resource is packed as
+    [0, id, packed attributes, packed relationships], and multiple resources
+    as [1, [id, packed attributes, packed relationships], ...].
+    '''
+
+    SINGLE = 0
+    MULTIPLE = 1
+
+    def __init__(self, codec):
+        self.codec = codec
+        _, subtype = codec.MEDIA_TYPE.split('/')
+        self.MEDIA_TYPE = f'application/vnd.restpf.schema+{subtype}'
+
+    def dumps(self, value):
+        return self.codec.dumps(value)
+
+    def loads(self, data):
+        return self.codec.loads(data)
+
+    def _pack_resource(self, resource, representation):
+        return [
+            representation['id'],
+            compiled_packer(resource.attributes_obj.attr_obj)(
+                representation['attributes'],
+            ),
+            compiled_packer(resource.relationships_obj.attr_obj)(
+                representation['relationships'],
+            ),
+        ]
+
+    def _unpack_resource(self, resource, packed):
+        resource_id, attributes, relationships = packed
+        ret = {
+            'id': resource_id,
+            'type': resource.name,
+        }
+        for name, node, packed_value in [
+            ('attributes', resource.attributes_obj.attr_obj, attributes),
+            ('relationships', resource.relationships_obj.attr_obj,
+             relationships),
+        ]:
+            ret[name] = compiled_serializer(node)(
+                compiled_unpacker(node)(packed_value),
+            )
+        return ret
+
+    def encode_representation(self, resource, representation):
+        if isinstance(representation, dict):
+            packed = [self.SINGLE] + self._pack_resource(
+                resource, representation,
+            )
+        elif isinstance(representation, list):
+            packed = [self.MULTIPLE] + [
+                self._pack_resource(resource, element)
+                for element in representation
+            ]
+        else:
+            packed = representation
+        return self.dumps(packed)
+
+    def decode_representation(self, resource, data):
+        packed = self.loads(data)
+        if not isinstance(packed, list):
+            return packed
+
+        kind, *rest = packed
+        if kind == self.SINGLE:
+            return self._unpack_resource(resource, rest)
+        else:
+            return [
+                self._unpack_resource(resource, element)
+                for element in rest
+            ]
+
+    def encode_input(self, node, value):
+        return self.dumps(
+            compiled_packer(node)(compiled_serializer(node)(value)),
+        )
+
+    def decode_input(self, node, data):
+        return compiled_unpacker(node)(self.loads(data))
+
+
+def _parse_accept(accept):
+    # media types ordered by quality, then by position.
+    items = []
+    for idx, item in enumerate(accept.split(',')):
+        media_type, *params = item.split(';')
+        media_type = media_type.strip().lower()
+        if not media_type:
+            continue
+
+        quality = 1.0
+        for param in params:
+            key, _, value = param.partition('=')
+            if key.strip() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+
+        if quality > 0:
+            items.append((-quality, idx, media_type))
+
+    return [media_type for _, _, media_type in sorted(items)]
+
+
+class CodecRegistry:
+
+    '''
+    The first registered codec is the default one.
+    '''
+
+    def __init__(self, codecs=()):
+        self._codecs = {}
+        for codec in codecs:
+            self.register(codec)
+
+    def register(self, codec):
+        self._codecs[codec.MEDIA_TYPE] = codec
+
+    def __contains__(self, media_type):
+        return media_type in self._codecs
+
+    def __iter__(self):
+        return iter(self._codecs.values())
+
+    def get(self, content_type):
+        '''
+        Codec of `Content-Type`, None if not registered.
+        '''
+        media_type = content_type.split(';')[0].strip().lower()
+        return self._codecs.get(media_type)
+
+    def negotiate(self, accept=None):
+        '''
+        Codec of `Accept`, the default one if `accept` is empty, None if
+        nothing is acceptable.
+        '''
+        if not accept:
+            return next(iter(self._codecs.values()), None)
+
+        for media_type in _parse_accept(accept):
+            if media_type == '*/*':
+                return next(iter(self._codecs.values()), None)
+
+            if media_type.endswith('/*'):
+                prefix = media_type[:-1]
+                for codec_media_type, codec in self._codecs.items():
+                    if codec_media_type.startswith(prefix):
+                        return codec
+                continue
+
+            codec = self._codecs.get(media_type)
+            if codec is not None:
+                return codec
+
+        return None
+
+
+def create_default_codecs():
+    codecs = [JSONCodec()]
+    if msgpack is not None:
+        codecs.append(MessagePackCodec())
+    if cbor2 is not None:
+        codecs.append(CBORCodec())
+    codecs.append(SchemaCodec(
+        MessagePackCodec() if msgpack is not None else JSONCodec(),
+    ))
+    return CodecRegistry(codecs)
+
+
+default_codecs = create_default_codecs()
@@ -0,0 +1,124 @@
+from restpf.utils.helper_classes import (
+    StateCreator,
+)
+from restpf.resource.attribute_states import (
+    create_attribute_state_tree_for_input,
+)
+
+from restpf.pipeline.protocol import (
+    CallbackKwargsStateVariableMapper,
+    ResourceState,
+    PipelineRunner,
+    MultipleResourcePipeline,
+)
+from restpf.pipeline.single_resource.get import (
+    GetSingleResourceContextRule,
+    GetSingleResourceStateTreeBuilder,
+    GetSingleResourceRepresentationGenerator,
+)
+
+
+class GetMultipleResourcePipelineState(metaclass=StateCreator):
+
+    ATTRS = [
+        'raw_resource_ids',
+        'fields',
+    ]
+
+
+class GetMultipleResourceCallbackKwargsStateVariableMapper(
+    CallbackKwargsStateVariableMapper
+):
+    ATTR2KWARG = {
+        'raw_resource_ids': 'resource_ids',
+    }
+
+
+class GetMultipleResourceContextRule(GetSingleResourceContextRule):
+
+    async def validate_input_state(self, states):
+        return all(map(self._default_validator, states))
+
+    async def validate_output_state(self, states, fields=None):
+        return all(
+            self._default_validator(state, fields)
+            for state in states
+        )
+
+
+class GetMultipleResourceStateTreeBuilder(GetSingleResourceStateTreeBuilder):
+
+    PROXY_ATTRS = [
+        'raw_resource_ids',
+    ]
+
+    def build_input_state(self, resource):
+        return [
+            ResourceState(
+                attributes=None,
+                relationships=None,
+                # for id validation.
+                resource_id=create_attribute_state_tree_for_input(
+                    resource.id_obj,
+                    resource_id,
+                ),
+            )
+            for resource_id in self.raw_resource_ids
+        ]
+
+    def build_output_state(self, resource, raw_objs):
+        return [
+            super(GetMultipleResourceStateTreeBuilder, self)
+            .build_output_state(resource, raw_obj)
+            for raw_obj in raw_objs
+        ]
+
+
+class GetMultipleResourceRepresentationGenerator(
+    GetSingleResourceRepresentationGenerator,
+):
+
+    PROXY_ATTRS = [
+        'raw_resource_ids',
+    ]
+
+    def generate_representation(self, resource, output_states):
+        return [
+            {
+                'id': resource_id,
+                'type': resource.name,
+                'attributes': self.serialize_state(output_state.attributes),
+                'relationships': self.serialize_state(
+                    output_state.relationships,
+                ),
+            }
+            for resource_id, output_state in zip(
+                self.raw_resource_ids, output_states,
+            )
+        ]
+
+    def iter_representation(self, resource, output_states):
+        yield '['
+        for idx, (resource_id, output_state) in enumerate(zip(
+            self.raw_resource_ids, output_states,
+        )):
+            if idx > 0:
+                yield ','
+            yield from self.iter_resource_representation(
+                resource, resource_id, output_state,
+            )
+        yield ']'
+
+
+class GetMultipleResourcePipelineRunner(PipelineRunner):
+
+    CALLBACK_KWARGS_CONTROLLER_CLSES = [
+        GetMultipleResourceCallbackKwargsStateVariableMapper,
+    ]
+    CONTEXT_RULE_CLS = GetMultipleResourceContextRule
+
+    STATE_TREE_BUILDER_CLS = GetMultipleResourceStateTreeBuilder
+    REPRESENTATION_GENERATOR_CLS = GetMultipleResourceRepresentationGenerator
+
+    PIPELINE_CLS = MultipleResourcePipeline
+    PIPELINE_STATE_CLS = GetMultipleResourcePipelineState
@@ -1,24 +1,253 @@
-from collections import deque
+from collections import deque, namedtuple
 
+from restpf.utils.constants import (
+    HTTPMethodConfig,
+    CallbackRegistrarOptions,
+)
 from restpf.utils.helper_classes import (
     ProxyStateOperator,
 )
-from restpf.resource.attributes import (
-    AttributeContextOperator,
+from restpf.utils.helper_functions import (
+    normalize_sparse_fields,
+    prune_sparse_fields,
+    sparse_fields_to_tree,
+    sparse_fields_cover,
+    callback_dependencies,
+    parallel_groups_of_callbacks,
+    is_ndarray,
+)
+from restpf.resource.attribute_compilers import (
+    validate_state,
+    serialize_state,
+    encode_state,
+    compiled_parser,
 )
 from restpf.resource.attribute_states import (
+    create_attribute_state_tree,
     create_attribute_state_tree_for_input,
     create_attribute_state_tree_for_output,
+    node2statecls_default_input,
 )
 
+from .codecs import JSONCodec
 from .states import (
     CallbackKwargsProcessor,
     CallbackKwargsRegistrar,
 )
 
 
+_COLLECTION_NAMES = ('special_hooks', 'attributes', 'relationships')
+
+
+PlanEntry = namedtuple(
+    'PlanEntry',
+    [
+        'callback',
+        'collection_name',
+        'attr',
+        'path',
+        'options',
+        'invoker',
+        'executor',
+        'batch',
+        'cache_ttl',
+        'cache_max_entries',
+    ],
+)
+
+
+def _is_empty_output(value):
+    # ndarray has no truth value.
+    if is_ndarray(value):
+        return value.size == 0
+    return not value
+
+
+def _merge_output_of_node(ret, child_value, has_children):
+    '''
+    `ret`: value provided by the parent, `child_value`: return of the callback
+    of this node.
+    '''
+    if not has_children:
+        # leaf node.
+        return ret if _is_empty_output(child_value) else child_value
+
+    ret = child_value if _is_empty_output(ret) else ret
+    if not isinstance(ret, dict):
+        # none leaf node with wrong ret type.
+        return {}
+    # returns of callbacks might be memoized, copy before merging children.
+    return dict(ret)
+
+
+class OutputMergeLayout:
+
+    '''
+    Slots for the returns of callbacks of a plan, to be merged into raw output
+    in one pass. Each collection occupies a range of slots, covering the
+    attributes with callbacks and their ancestors, ordered by `path_id`. Since
+    ids are assigned in BFS order, parents always precede their children.
+
+    - `entry_slots`: slot of each entry of plan, None if the return is not
+    captured (special hooks).
+    - `slots`: (parent slot, name, has_children) of each slot, parent slot is
+    None for the root of collection.
+    - `collection_roots`: [(collection_name, root slot), ...].
+    '''
+
+    def __init__(self, entries):
+        name2nodes = {}
+        for entry in entries:
+            if entry.collection_name == 'special_hooks':
+                # do not capture the return of special_hooks.
+                continue
+
+            nodes = name2nodes.setdefault(entry.collection_name, {})
+            node = entry.attr
+            while node is not None and node.path_id not in nodes:
+                nodes[node.path_id] = node
+                node = node.bh_parent
+
+        parent_slots = []
+        names = []
+        self.collection_roots = []
+        # (collection_name, path_id) -> slot.
+        node2slot = {}
+
+        for collection_name, nodes in name2nodes.items():
+            self.collection_roots.append((collection_name, len(names)))
+
+            for path_id in sorted(nodes):
+                node = nodes[path_id]
+                parent = node.bh_parent
+                node2slot[(collection_name, path_id)] = len(names)
+                parent_slots.append(
+                    None if parent is None
+                    else node2slot[(collection_name, parent.path_id)],
+                )
+                names.append(node.bh_name)
+
+        inner_slots = set(parent_slots)
+        self.slots = [
+            (parent_slot, name, slot in inner_slots)
+            for slot, (parent_slot, name) in enumerate(
+                zip(parent_slots, names),
+            )
+        ]
+
+        self.entry_slots = [
+            node2slot.get((entry.collection_name, entry.attr.path_id))
+            if entry.collection_name != 'special_hooks' else None
+            for entry in entries
+        ]
+
+    def __len__(self):
+        return len(self.slots)
+
+    def create_slot_values(self):
+        return [None] * len(self.slots)
+
+    def merge(self, slot_values):
+        '''
+        return collection_name -> merged raw output.
+        '''
+        merged = [None] * len(self.slots)
+        for slot, (parent_slot, name, has_children) in enumerate(self.slots):
+            if parent_slot is None:
+                ret = _merge_output_of_node(slot_values[slot], None, True)
+            else:
+                parent_ret = merged[parent_slot]
+                ret = _merge_output_of_node(
+                    parent_ret.get(name), slot_values[slot], has_children,
+                )
+                parent_ret[name] = ret
+            merged[slot] = ret
+
+        return {
+            collection_name: merged[slot]
+            for collection_name, slot in self.collection_roots
+        }
+
+
+def _options_within(options, callbacks):
+    '''
+    Drop `run_after` parents not in `callbacks`, unselected parents are
+    considered as completed.
+    '''
+    options = options or {}
+    run_after_key = CallbackRegistrarOptions.RUN_AFTER.value
+    run_after = options.get(run_after_key)
+    if run_after is None:
+        return options
+
+    if callable(run_after):
+        run_after = [run_after]
+    run_after = [parent for parent in run_after if parent in callbacks]
+
+    options = dict(options)
+    options[run_after_key] = run_after or None
+    return options
+
+
+class ExecutionPlan:
+
+    '''
+    Compiled result of callback selection and scheduling. A plan only depends
+    on the resource definition, the HTTP method and the shape of input state,
+    hence could be shared by requests.
+
+    - `entries`: selected callbacks in BFS order.
+    - `parallel_groups`: groups of indices of `entries`, groups should be
+    executed one after another.
+    - `parents`: indices of entries that must be completed before each entry.
+    - `merge_layout`: see OutputMergeLayout.
+    '''
+
+    def __init__(self, entries):
+        self.entries = entries
+        self.merge_layout = OutputMergeLayout(entries)
+
+        callback2idx = {
+            entry.callback: idx
+            for idx, entry in enumerate(entries)
+        }
+        parallel_groups_of_callbacks_input = [
+            (entry.callback, _options_within(entry.options, callback2idx))
+            for entry in entries
+        ]
+
+        self.parallel_groups = [
+            [callback2idx[callback] for callback in group]
+            for group in parallel_groups_of_callbacks(
+                parallel_groups_of_callbacks_input,
+            )
+        ]
+
+        callback2parents = callback_dependencies(
+            parallel_groups_of_callbacks_input,
+        )
+        self.parents = [
+            [callback2idx[parent] for parent in callback2parents[e.callback]]
+            for e in entries
+        ]
+
+    @property
+    def topological_order(self):
+        return [idx for group in self.parallel_groups for idx in group]
+
+
+def _locate_state(root_state, path):
+    state = root_state
+    for name in path:
+        state = getattr(state, name) if state else None
+    return state
+
+
 class ContextRule:
 
+    # default bound of memoized returns of a callback.
+    DEFAULT_CACHE_MAX_ENTRIES = 1024
+
     HTTPMethod = None
 
     def __init__(self):
@@ -29,10 +258,10 @@ class ContextRule:
             self._callback_kwargs_registrar,
         )
 
-    def _default_validator(self, state):
-        context = AttributeContextOperator(self.HTTPMethod)
+    def _default_validator(self, state, fields=None):
+        # pending (lazy) states are validated by compiled validators.
         return all(map(
-            lambda x: x.validate(context),
+            lambda x: validate_state(x, self.HTTPMethod, fields),
             filter(
                 bool,
                 [
@@ -46,10 +275,19 @@ class ContextRule:
     async def validate_input_state(self, state):
         return self._default_validator(state)
 
-    async def validate_output_state(self, state):
-        return self._default_validator(state)
+    async def validate_output_state(self, state, fields=None):
+        '''
+        `fields`: sparse fieldset of output, attributes not requested are not
+        required.
+        '''
+        return self._default_validator(state, fields)
 
-    def _select_callbacks(self, query, root_attr, root_state):
+    def _select_callbacks(self, query, root_attr, root_state,
+                          fields_tree=None):
+        '''
+        Only attributes covered by `fields_tree` (see sparse_fields_to_tree)
+        are searched.
+        '''
         queue = deque()
         queue.append(
             (root_attr, root_state),
@@ -59,7 +297,7 @@ class ContextRule:
 
         while queue:
             attr, state = queue.popleft()
-            callback, options = query(attr.bh_path, self.HTTPMethod)
+            callback, options = query(attr, self.HTTPMethod)
 
             if callback and (state or root_state is None):
                 ret.append(
@@ -75,6 +313,12 @@ class ContextRule:
                 )
 
             for name, child_attr in attr.bh_named_children.items():
+                if fields_tree is not None and not sparse_fields_cover(
+                    fields_tree, child_attr.bh_path,
+                ):
+                    # prune unrequested subtree.
+                    continue
+
                 child_state = getattr(state, name) if state else None
                 queue.append(
                     (child_attr, child_state),
@@ -82,13 +326,11 @@ class ContextRule:
 
         return ret
 
-    async def select_callbacks(self, resource, state):
-        '''
-        return ordered collection_name -> [(callback, attr, state), ...].
-        '''
+    def _select_callbacks_of_resource(self, resource, state, fields=None):
+        fields_tree = sparse_fields_to_tree(fields)
 
         ret = {}
-        for key in ['special_hooks', 'attributes', 'relationships']:
+        for key in _COLLECTION_NAMES:
             if getattr(resource, key) is None:
                 continue
 
@@ -97,14 +339,128 @@ class ContextRule:
             ret[key] = self._select_callbacks(
                 getattr(
                     attr_collection,
-                    'get_registered_callback_and_options',
+                    'get_registered_callback_and_options_of_attr',
                 ),
                 getattr(attr_collection, 'attr_obj'),
                 getattr(state, key, None),
+                # sparse fieldset doesn't apply to special hooks.
+                None if key == 'special_hooks' else fields_tree,
             )
 
         return ret
 
+    async def select_callbacks(self, resource, state, fields=None):
+        '''
+        return ordered collection_name -> [(callback, attr, state), ...].
+        '''
+        return self._select_callbacks_of_resource(
+            resource, state, normalize_sparse_fields(fields),
+        )
+
+    def _plan_cache_key(self, fields):
+        return (type(self), fields)
+
+    def _compile_plan_candidates(self, resource, fields):
+        candidates = []
+        name2selected = self._select_callbacks_of_resource(
+            resource, None, fields,
+        )
+
+        for collection_name, callback_and_options in name2selected.items():
+            attr_collection = getattr(resource, f'{collection_name}_obj')
+
+            for callback, options in callback_and_options:
+                attr = options['attr']
+                registrar_options = options['options'] or {}
+                candidates.append(PlanEntry(
+                    callback=callback,
+                    collection_name=collection_name,
+                    attr=attr,
+                    path=tuple(attr.bh_path),
+                    options=options['options'],
+                    invoker=attr_collection.get_callback_invoker(callback),
+                    executor=registrar_options.get(
+                        CallbackRegistrarOptions.EXECUTOR.value,
+                    ),
+                    batch=bool(registrar_options.get(
+                        CallbackRegistrarOptions.BATCH.value,
+                    )),
+                    **self._cache_options_of_callback(registrar_options)
+                ))
+
+        return candidates
+
+    def _cache_options_of_callback(self, registrar_options):
+        cache_ttl = registrar_options.get(
+            CallbackRegistrarOptions.CACHE_TTL.value,
+        )
+        # only the return of GET could be memoized.
+        if self.HTTPMethod is not HTTPMethodConfig.GET:
+            cache_ttl = None
+
+        return {
+            'cache_ttl': cache_ttl,
+            'cache_max_entries': registrar_options.get(
+                CallbackRegistrarOptions.CACHE_MAX_ENTRIES.value,
+                self.DEFAULT_CACHE_MAX_ENTRIES,
+            ),
+        }
+
+    async def select_plan(self, resource, state, fields=None):
+        '''
+        return (plan, states), `states` is aligned with `plan.entries`.
+        Callbacks of attributes not covered by sparse fieldset `fields` are
+        not selected.
+        '''
+        fields = prune_sparse_fields(
+            normalize_sparse_fields(fields),
+            resource.attributes_obj.attr_obj,
+            resource.relationships_obj.attr_obj,
+        )
+
+        cache = resource.execution_plan_cache
+        key = self._plan_cache_key(fields)
+
+        candidates = cache.get(key)
+        if candidates is None:
+            candidates = self._compile_plan_candidates(resource, fields)
+            cache.set(key, candidates)
+
+        name2root_state = {
+            name: getattr(state, name, None)
+            for name in _COLLECTION_NAMES
+        }
+
+        shape = []
+        states = []
+        for entry in candidates:
+            root_state = name2root_state[entry.collection_name]
+            entry_state = _locate_state(root_state, entry.path)
+
+            selected = bool(entry_state or root_state is None)
+            shape.append(selected)
+            if selected:
+                states.append(entry_state)
+
+        plan_key = key + (tuple(shape),)
+        plan = cache.get(plan_key)
+        if plan is None:
+            plan = ExecutionPlan([
+                entry
+                for entry, selected in zip(candidates, shape)
+                if selected
+            ])
+            cache.set(plan_key, plan)
+
+        return plan, states
+
+    def reset(self):
+        '''
+        Clear the states of last request, for reusing context rule.
+        '''
+        self._callback_kwargs_registrar.reset()
+        self._callback_kwargs_processor.reset()
+
     def attach_callback_kwargs_controller(self, controller):
         self._callback_kwargs_processor.add_controller(controller)
 
@@ -114,8 +470,16 @@ class ContextRule:
 
 class StateTreeBuilder(ProxyStateOperator):
 
+    # build nested output states lazily, see NestedAttributeState.
+    LAZY_OUTPUT_STATE = False
+
+    # for parsing raw JSON input, should be the same as context rule.
+    HTTPMethod = None
+
     PROXY_ATTRS = [
         'raw_resource_id',
+        # codec of raw bytes input, see _get_attr_state_for_input.
+        'input_codec',
     ]
 
     def _get_id_state_for_input(self, resource):
@@ -124,6 +488,29 @@ class StateTreeBuilder(ProxyStateOperator):
             self.raw_resource_id,
         )
 
+    def _get_attr_state_for_input(self, node, name):
+        '''
+        `name`: name of raw value in pipeline state. Raw bytes are decoded by
+        `input_codec` of pipeline state, or parsed as JSON and validated in
+        one pass if not set, and replaced by the decoded value.
+        '''
+        raw_value = getattr(self, name)
+        if not isinstance(raw_value, (bytes, bytearray, memoryview)):
+            return create_attribute_state_tree_for_input(node, raw_value)
+
+        input_codec = self.input_codec
+        if input_codec is not None and not isinstance(input_codec, JSONCodec):
+            value = input_codec.decode_input(node, raw_value)
+            setattr(self, name, value)
+            return create_attribute_state_tree_for_input(node, value)
+
+        value = compiled_parser(node, self.HTTPMethod)(raw_value)
+        setattr(self, name, value)
+        return create_attribute_state_tree(
+            node, value, node2statecls_default_input,
+            lazy=True, validated_for=self.HTTPMethod,
+        )
+
     def _get_id_state_for_output(self, resource):
         return create_attribute_state_tree_for_output(
             resource.id_obj,
@@ -139,9 +526,33 @@ class StateTreeBuilder(ProxyStateOperator):
 
 class RepresentationGenerator(ProxyStateOperator):
 
+    # compare compiled serializers with the state tree path, for debugging.
+    VERIFY_COMPILED_SERIALIZER = False
+
     PROXY_ATTRS = [
         'raw_resource_id',
     ]
 
+    # if set, `iter_representation` is used to stream the representation.
+    STREAM_REPRESENTATION = False
+
+    def serialize_state(self, state):
+        '''
+        Pending (lazy) states are serialized by compiled serializers.
+        '''
+        return serialize_state(state, self.VERIFY_COMPILED_SERIALIZER)
+
+    def encode_state(self, state):
+        '''
+        Pending (lazy) states are encoded by compiled encoders.
+        '''
+        return encode_state(state)
+
     async def generate_representation(self, resource, output_state):
         return {}
+
+    def iter_representation(self, resource, output_state):
+        '''
+        Generate JSON text pieces of the representation, without building it.
+        '''
+        raise NotImplementedError
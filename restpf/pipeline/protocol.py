@@ -1,6 +1,6 @@
 import asyncio
 from functools import wraps
-from collections import defaultdict
+from collections import ChainMap
 
 from restpf.utils.helper_classes import (
     ProxyStateOperator,
@@ -8,9 +8,16 @@ from restpf.utils.helper_classes import (
 from restpf.utils.helper_functions import (
     method_named_args,
     async_call,
-    parallel_groups_of_callbacks,
 )
-from restpf.utils.helper_classes import TreeState
+from restpf.utils.helper_classes import (
+    SingleFlight,
+)
+from restpf.utils.constants import CallbackSchedulerConfig
+from restpf.utils.encoders import (
+    DEFAULT_CHUNK_SIZE,
+    iter_json,
+    iter_chunks,
+)
 
 from .states import ResourceState                      # noqa
 from .states import RawOutputStateContainer            # noqa
@@ -21,6 +28,7 @@ from .states import CallbackKwargsVariableCollector    # noqa
 from .operations import ContextRule                    # noqa
 from .operations import StateTreeBuilder               # noqa
 from .operations import RepresentationGenerator        # noqa
+from .caches import CallbackMemo
 
 
 def _meta_build(method):
@@ -41,6 +49,11 @@ def _meta_build(method):
     return _wrapper
 
 
+_coalesced_pipelines = SingleFlight()
+
+_MISSING = object()
+
+
 class PipelineRunner:
 
     CALLBACK_KWARGS_CONTROLLER_CLSES = []
@@ -52,12 +65,20 @@ class PipelineRunner:
     PIPELINE_CLS = None
     PIPELINE_STATE_CLS = DefaultPipelineState
 
+    # None for the default scheduler of PIPELINE_CLS.
+    CALLBACK_SCHEDULER = None
+
+    # task of the last coalesced pipeline started by this runner, which keeps
+    # running for other callers even if this caller is cancelled.
+    in_flight = None
+
     @_meta_build
     def build_pipeline_state(self):
         pass
 
     @_meta_build
     def build_context_rule(self):
+        self.callback_kwargs_controllers = []
         # attach callback controller.
         for controller_cls in self.CALLBACK_KWARGS_CONTROLLER_CLSES:
             # init and bind to state.
@@ -65,6 +86,7 @@ class PipelineRunner:
             controller.bind_proxy_state(self.pipeline_state)
             # attach.
             self.context_rule.attach_callback_kwargs_controller(controller)
+            self.callback_kwargs_controllers.append(controller)
 
     @_meta_build
     def build_state_tree_builder(self):
@@ -77,41 +99,156 @@ class PipelineRunner:
     def set_resource(self, resource):
         self.resource = resource
 
+    def build(self, resource, **pipeline_state_kwargs):
+        '''
+        Build all the entities of runner.
+        '''
+        self.build_pipeline_state(**pipeline_state_kwargs)
+        self.build_context_rule()
+        self.build_state_tree_builder()
+        self.build_representation_generator()
+        self.set_resource(resource)
+
+    def rebuild_pipeline_state(self, **pipeline_state_kwargs):
+        '''
+        Reuse a built runner for another request: only the pipeline state is
+        replaced, other entities are rebound to the new state.
+        '''
+        self.build_pipeline_state(**pipeline_state_kwargs)
+        for controller in self.callback_kwargs_controllers:
+            controller.bind_proxy_state(self.pipeline_state)
+        self.context_rule.reset()
+
+    def coalescing_key(self):
+        '''
+        Concurrent pipelines with the same key (not None) are coalesced into
+        one if `coalesce_pipelines` of the resource is set. Callers share the
+        same pipeline instance and representation, which should not be
+        mutated, and callbacks (including their side effects and registered
+        kwargs) run once for all callers. Override for idempotent pipelines.
+        '''
+        return None
+
+    def resource_ids_to_invalidate(self):
+        '''
+        Resource ids modified by this pipeline, whose cached representations
+        should be dropped after running the pipeline.
+        '''
+        return ()
+
     async def run_pipeline(self):
-        pipeline = self.PIPELINE_CLS(
+        key = self.coalescing_key()
+        if key is None or not self.resource.coalesce_pipelines:
+            return await self._run_pipeline()
+        else:
+            return await _coalesced_pipelines.run(key, self._start_in_flight)
+
+    def _start_in_flight(self):
+        self.in_flight = asyncio.ensure_future(self._run_pipeline())
+        return self.in_flight
+
+    def _create_pipeline(self):
+        return self.PIPELINE_CLS(
             pipeline_state=self.pipeline_state,
             resource=self.resource,
             context_rule=self.context_rule,
             state_builder=self.state_tree_builder,
             rep_generator=self.representation_generator,
+            callback_scheduler=self.CALLBACK_SCHEDULER,
         )
-        await pipeline.run()
+
+    async def stream_pipeline(self, chunk_size=DEFAULT_CHUNK_SIZE):
+        '''
+        Run pipeline, return the pipeline and a generator of UTF-8 JSON chunks
+        of its representation, to be written to a chunked response.
+
+        If `STREAM_REPRESENTATION` of the representation generator is set, the
+        representation is encoded as chunks are consumed, without building
+        it. Such pipelines are not coalesced, and streamed representations
+        are not cached.
+        '''
+        if not self.REPRESENTATION_GENERATOR_CLS.STREAM_REPRESENTATION:
+            pipeline = await self.run_pipeline()
+        else:
+            pipeline = await self._run_pipeline(generate_representation=False)
+        return pipeline, pipeline.iter_representation_chunks(chunk_size)
+
+    async def _run_pipeline(self, generate_representation=True):
+        pipeline = self._create_pipeline()
+        try:
+            await pipeline.run(generate_representation)
+        finally:
+            # even if failed, since resources might be partially modified.
+            self._invalidate_caches()
         return pipeline
 
+    def _invalidate_caches(self):
+        representation_cache = self.resource.representation_cache
+        callback_memos = self.resource.callback_memos
 
-def _merge_output_of_callbacks(output_of_callbacks):
+        if representation_cache is None and not callback_memos:
+            return
 
-    def helper(ret, child_value, tree_state):
-        if not tree_state:
-            # leaf node.
-            return child_value if child_value else ret
+        for resource_id in self.resource_ids_to_invalidate():
+            if resource_id is None:
+                continue
+            if representation_cache is not None:
+                representation_cache.invalidate(self.resource, resource_id)
+            for memo in callback_memos.values():
+                memo.invalidate(resource_id)
 
-        ret = ret if ret else child_value
-        if not isinstance(ret, dict):
-            # none leaf node with wrong ret type.
-            ret = {}
 
-        for name, child in tree_state.children:
-            ret[name] = helper(
-                ret.get(name), child.value, child.next,
-            )
-        return ret
+class PipelineRunnerPool:
 
-    # deal with root.
-    root_gap = output_of_callbacks.root_gap
-    ret = root_gap.value if root_gap else {}
+    '''
+    Pool of built runners of `runner_cls` for `resource`. A runner is owned by
+    one request at a time, and reused by following requests, to save the cost
+    of building context rule, kwargs controllers and so on.
+
+    Usage:
 
-    return helper(ret, None, output_of_callbacks)
+    pool = PipelineRunnerPool(GetSingleResourcePipelineRunner, resource)
+    pipeline = await pool.run_pipeline(raw_resource_id=42)
+    '''
+
+    def __init__(self, runner_cls, resource, max_idle=64):
+        self.runner_cls = runner_cls
+        self.resource = resource
+        self.max_idle = max_idle
+
+        self._idle = []
+        # number of runners built, for monitoring.
+        self.built = 0
+
+    def __len__(self):
+        return len(self._idle)
+
+    def acquire(self, **pipeline_state_kwargs):
+        if self._idle:
+            runner = self._idle.pop()
+            runner.rebuild_pipeline_state(**pipeline_state_kwargs)
+        else:
+            runner = self.runner_cls()
+            runner.build(self.resource, **pipeline_state_kwargs)
+            self.built += 1
+        return runner
+
+    def release(self, runner):
+        if len(self._idle) < self.max_idle:
+            self._idle.append(runner)
+
+    async def run_pipeline(self, **pipeline_state_kwargs):
+        runner = self.acquire(**pipeline_state_kwargs)
+        try:
+            return await runner.run_pipeline()
+        finally:
+            in_flight = runner.in_flight
+            if in_flight is None or in_flight.done():
+                self.release(runner)
+            else:
+                # cancelled while the coalesced pipeline is still running on
+                # this runner, release it afterwards.
+                in_flight.add_done_callback(lambda _: self.release(runner))
 
 
 class PipelineBase(ProxyStateOperator):
@@ -132,13 +269,25 @@ class PipelineBase(ProxyStateOperator):
     4. call callbacks and collect strucutred return values.
     5. create `output_state`.
     6. validate `output_state`.
+
+    Callbacks of step 4 are scheduled by `callback_scheduler`:
+
+    - LAYERED: parallel groups are executed one after another.
+    - DATAFLOW: a callback starts as soon as all its dependencies (`run_after`
+    and `before_all`) are completed.
+
+    If `fields` (sparse fieldset) of pipeline state is set, callbacks of
+    unrequested attributes are not invoked.
     '''
 
+    CALLBACK_SCHEDULER = CallbackSchedulerConfig.LAYERED
+
     PROXY_ATTRS = [
         'input_state',
         'merged_output_of_callbacks',
         'output_state',
         'representation',
+        'fields',
     ]
 
     @method_named_args(
@@ -147,6 +296,7 @@ class PipelineBase(ProxyStateOperator):
         'context_rule',
         'state_builder',
         'rep_generator',
+        'callback_scheduler',
     )
     def __init__(self):
         '''
@@ -154,6 +304,9 @@ class PipelineBase(ProxyStateOperator):
         2. other entities all reference `context_rule`.
         '''
 
+        if self.callback_scheduler is None:
+            self.callback_scheduler = self.CALLBACK_SCHEDULER
+
         self.bind_proxy_state(self.pipeline_state)
 
         self.state_builder.bind_proxy_state(self.pipeline_state)
@@ -172,64 +325,104 @@ class PipelineBase(ProxyStateOperator):
         if not input_state_is_valid:
             raise RuntimeError('TODO: input state not valid')
 
-    async def _invoke_callbacks(self):
-        COLLECTION_NAME_KEY = '_collection_name'
-
-        name2selected = await async_call(
-            self.context_rule.select_callbacks,
-            self.resource, self.input_state,
+    def _collect_output_of_callback(self, slot_values, plan, idx, ret):
+        slot = plan.merge_layout.entry_slots[idx]
+        if slot is None:
+            # do not capture the return of special_hooks.
+            return
+        slot_values[slot] = ret
+
+    def _call_plan_entry(self, entry, kwargs):
+        return entry.invoker(
+            kwargs,
+            executor=self.resource.callback_executors.select(entry.executor),
         )
 
-        callback2options = {}
-        parallel_groups_of_callbacks_input = []
+    def _memo_of(self, entry):
+        if entry.cache_ttl is None:
+            return None
+
+        memos = self.resource.callback_memos
+        memo = memos.get(entry.callback)
+        if memo is None:
+            memo = CallbackMemo(
+                max_entries=entry.cache_max_entries,
+                ttl=entry.cache_ttl,
+            )
+            memos[entry.callback] = memo
+        return memo
+
+    async def _invoke_plan_entry(self, entry, state):
+        memo = self._memo_of(entry)
+        if memo is not None:
+            resource_id = getattr(self.pipeline_state, 'raw_resource_id', None)
+            ret = memo.get(resource_id, _MISSING)
+            if ret is not _MISSING:
+                # never call the memoized callback.
+                return ret
+            token = memo.begin()
+
+        kwargs = await async_call(
+            self.context_rule.callback_kwargs,
+            entry.attr, state,
+        )
+        ret = await self._call_plan_entry(entry, kwargs)
 
-        for collection_name, callback_and_options in name2selected.items():
-            for callback, options in callback_and_options:
-                # patch options.
-                options[COLLECTION_NAME_KEY] = collection_name
-                # keep mapping.
-                callback2options[callback] = options
+        if memo is not None:
+            memo.set(resource_id, ret, token)
+        return ret
 
-                parallel_groups_of_callbacks_input.append(
-                    (callback, options.get('options') or {}),
-                )
+    async def _run_plan_layered(self, plan, states, slot_values):
+        for callback_group in plan.parallel_groups:
+            async_callbacks = [
+                self._invoke_plan_entry(plan.entries[idx], states[idx])
+                for idx in callback_group
+            ]
 
-        name2raw_obj = defaultdict(TreeState)
+            for idx, ret in zip(
+                callback_group, await asyncio.gather(*async_callbacks),
+            ):
+                self._collect_output_of_callback(slot_values, plan, idx, ret)
 
-        for callback_group in parallel_groups_of_callbacks(
-            parallel_groups_of_callbacks_input,
-        ):
-            names = []
-            paths = []
-            async_callbacks = []
+    async def _run_plan_dataflow(self, plan, states, slot_values):
+        tasks = {}
 
-            for callback in callback_group:
-                options = callback2options[callback]
+        async def run(idx):
+            parents = plan.parents[idx]
+            if parents:
+                await asyncio.gather(*(tasks[parent] for parent in parents))
 
-                kwargs = await async_call(
-                    self.context_rule.callback_kwargs,
-                    **options,
-                )
+            entry = plan.entries[idx]
+            ret = await self._invoke_plan_entry(entry, states[idx])
+            self._collect_output_of_callback(slot_values, plan, idx, ret)
 
-                names.append(options.get(COLLECTION_NAME_KEY))
-                paths.append(options.get('attr').bh_path)
+        # parents are scheduled before children.
+        for idx in plan.topological_order:
+            tasks[idx] = asyncio.ensure_future(run(idx))
 
-                async_callbacks.append(async_call(callback, **kwargs))
+        try:
+            await asyncio.gather(*tasks.values())
+        except BaseException:
+            for task in tasks.values():
+                task.cancel()
+            raise
 
-            for name, path, ret in zip(
-                names, paths, await asyncio.gather(*async_callbacks),
-            ):
-                if name == 'special_hooks':
-                    # do not capture the return of special_hooks.
-                    continue
+    async def _invoke_callbacks(self):
+        plan, states = await async_call(
+            self.context_rule.select_plan,
+            self.resource, self.input_state, self.fields,
+        )
 
-                name2raw_obj[name].touch(path).value = ret
+        slot_values = plan.merge_layout.create_slot_values()
 
-        for name, tree_state in name2raw_obj.items():
-            name2raw_obj[name] = _merge_output_of_callbacks(tree_state)
+        if self.callback_scheduler is CallbackSchedulerConfig.DATAFLOW:
+            await self._run_plan_dataflow(plan, states, slot_values)
+        else:
+            await self._run_plan_layered(plan, states, slot_values)
 
-        self.merged_output_of_callbacks = \
-            RawOutputStateContainer(**name2raw_obj)
+        self.merged_output_of_callbacks = RawOutputStateContainer(
+            **plan.merge_layout.merge(slot_values),
+        )
 
     async def _build_output_state(self):
         self.output_state = await async_call(
@@ -238,7 +431,7 @@ class PipelineBase(ProxyStateOperator):
         )
         output_state_is_valid = await async_call(
             self.context_rule.validate_output_state,
-            self.output_state,
+            self.output_state, self.fields,
         )
         if not output_state_is_valid:
             raise RuntimeError('TODO: output state not valid')
@@ -251,11 +444,37 @@ class PipelineBase(ProxyStateOperator):
                 self.resource, self.output_state,
             )
 
-    async def run(self):
+    async def run(self, generate_representation=True):
+        '''
+        If `generate_representation` is not set, representation is left to
+        `iter_representation_chunks`.
+        '''
         await self._build_input_state()
         await self._invoke_callbacks()
         await self._build_output_state()
-        await self._generate_representation()
+        if generate_representation:
+            await self._generate_representation()
+        else:
+            self.representation = None
+
+    def encode_representation(self, codec):
+        '''
+        Encode representation by `codec`, see restpf.pipeline.codecs.
+        '''
+        return codec.encode_representation(self.resource, self.representation)
+
+    def iter_representation_chunks(self, chunk_size=DEFAULT_CHUNK_SIZE):
+        '''
+        Generate UTF-8 JSON chunks of the representation, each of them has at
+        most `chunk_size` bytes.
+        '''
+        if self.representation is not None:
+            pieces = iter_json(self.representation)
+        else:
+            pieces = self.rep_generator.iter_representation(
+                self.resource, self.output_state,
+            )
+        return iter_chunks(pieces, chunk_size)
 
 
 class SingleResourcePipeline(PipelineBase):
@@ -263,7 +482,101 @@ class SingleResourcePipeline(PipelineBase):
 
 
 class MultipleResourcePipeline(PipelineBase):
-    pass
+
+    '''
+    Pipeline for resources identified by `raw_resource_ids`, sharing the
+    same plan of callbacks.
+
+    - Callbacks registered with `batch=True` are called once with
+    `resource_ids`, and should return a mapping of resource_id -> value.
+    - Other callbacks are called once per resource with `resource_id`.
+
+    `merged_output_of_callbacks` is a list of RawOutputStateContainer, aligned
+    with `raw_resource_ids`. `state_builder`, `context_rule` and
+    `rep_generator` should deal with lists of states accordingly.
+    '''
+
+    PROXY_ATTRS = [
+        'raw_resource_ids',
+    ]
+
+    async def _call_plan_entry(self, entry, kwargs, resource_ids=None):
+        if resource_ids is None:
+            resource_ids = self.raw_resource_ids
+
+        if entry.batch:
+            id2ret = await super()._call_plan_entry(
+                entry, ChainMap({'resource_ids': resource_ids}, kwargs),
+            )
+            return id2ret or {}
+
+        rets = await asyncio.gather(*(
+            super(MultipleResourcePipeline, self)._call_plan_entry(
+                entry, ChainMap({'resource_id': resource_id}, kwargs),
+            )
+            for resource_id in resource_ids
+        ))
+        return dict(zip(resource_ids, rets))
+
+    async def _invoke_plan_entry(self, entry, state):
+        memo = self._memo_of(entry)
+        if memo is None:
+            return await super()._invoke_plan_entry(entry, state)
+
+        id2ret = {}
+        missing_ids = []
+        for resource_id in self.raw_resource_ids:
+            ret = memo.get(resource_id, _MISSING)
+            if ret is _MISSING:
+                missing_ids.append(resource_id)
+            else:
+                id2ret[resource_id] = ret
+
+        if missing_ids:
+            token = memo.begin()
+            kwargs = await async_call(
+                self.context_rule.callback_kwargs,
+                entry.attr, state,
+            )
+            missing_id2ret = await self._call_plan_entry(
+                entry, kwargs, missing_ids,
+            )
+            for resource_id in missing_ids:
+                ret = missing_id2ret.get(resource_id)
+                memo.set(resource_id, ret, token)
+                id2ret[resource_id] = ret
+
+        return id2ret
+
+    def _collect_output_of_callback(self, id2slot_values, plan, idx, id2ret):
+        for resource_id, slot_values in id2slot_values.items():
+            super()._collect_output_of_callback(
+                slot_values, plan, idx, id2ret.get(resource_id),
+            )
+
+    async def _invoke_callbacks(self):
+        # input states of resources are not bound to callbacks.
+        plan, states = await async_call(
+            self.context_rule.select_plan,
+            self.resource, None, self.fields,
+        )
+
+        id2slot_values = {
+            resource_id: plan.merge_layout.create_slot_values()
+            for resource_id in self.raw_resource_ids
+        }
+
+        if self.callback_scheduler is CallbackSchedulerConfig.DATAFLOW:
+            await self._run_plan_dataflow(plan, states, id2slot_values)
+        else:
+            await self._run_plan_layered(plan, states, id2slot_values)
+
+        self.merged_output_of_callbacks = [
+            RawOutputStateContainer(
+                **plan.merge_layout.merge(id2slot_values[resource_id]),
+            )
+            for resource_id in self.raw_resource_ids
+        ]
 
 
 # TODO: relative resource pipeline.
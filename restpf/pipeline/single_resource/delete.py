@@ -72,3 +72,6 @@ class DeleteSingleResourcePipelineRunner(PipelineRunner):
 
     PIPELINE_CLS = SingleResourcePipeline
     PIPELINE_STATE_CLS = DeleteSingleResourcePipelineState
+
+    def resource_ids_to_invalidate(self):
+        return (self.pipeline_state.raw_resource_id,)
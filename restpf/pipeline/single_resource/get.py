@@ -1,6 +1,12 @@
 from restpf.utils.helper_classes import (
     StateCreator,
 )
+from restpf.utils.helper_functions import (
+    normalize_sparse_fields,
+    sparse_fields_to_tree,
+    prune_by_sparse_fields,
+)
+from restpf.utils.encoders import dumps_json
 from restpf.resource.attributes import (
     HTTPMethodConfig,
 )
@@ -23,6 +29,8 @@ class GetSingleResourcePipelineState(metaclass=StateCreator):
 
     ATTRS = [
         'raw_resource_id',
+        # sparse fieldset, e.g. 'a,b.c' for JSON:API `fields[type]=a,b.c`.
+        'fields',
     ]
 
 
@@ -41,6 +49,13 @@ class GetSingleResourceContextRule(ContextRule):
 
 class GetSingleResourceStateTreeBuilder(StateTreeBuilder):
 
+    # output states are only validated and serialized.
+    LAZY_OUTPUT_STATE = True
+
+    PROXY_ATTRS = [
+        'fields',
+    ]
+
     def build_input_state(self, resource):
         return ResourceState(
             attributes=None,
@@ -50,14 +65,20 @@ class GetSingleResourceStateTreeBuilder(StateTreeBuilder):
         )
 
     def build_output_state(self, resource, raw_obj):
+        # unrequested attributes are skipped.
+        fields_tree = sparse_fields_to_tree(
+            normalize_sparse_fields(self.fields),
+        )
         return ResourceState(
             attributes=create_attribute_state_tree_for_output(
                 resource.attributes_obj.attr_obj,
-                raw_obj.attributes,
+                prune_by_sparse_fields(raw_obj.attributes, fields_tree),
+                lazy=self.LAZY_OUTPUT_STATE,
             ),
             relationships=create_attribute_state_tree_for_output(
                 resource.relationships_obj.attr_obj,
-                raw_obj.relationships,
+                prune_by_sparse_fields(raw_obj.relationships, fields_tree),
+                lazy=self.LAZY_OUTPUT_STATE,
             ),
             # no need to validate.
             resource_id=None,
@@ -66,14 +87,35 @@ class GetSingleResourceStateTreeBuilder(StateTreeBuilder):
 
 class GetSingleResourceRepresentationGenerator(RepresentationGenerator):
 
+    STREAM_REPRESENTATION = True
+
     def generate_representation(self, resource, output_state):
         return {
             'id': self.raw_resource_id,
             'type': resource.name,
-            'attributes': output_state.attributes.serialize(),
-            'relationships': output_state.relationships.serialize(),
+            'attributes': self.serialize_state(output_state.attributes),
+            'relationships': self.serialize_state(
+                output_state.relationships,
+            ),
         }
 
+    def iter_resource_representation(self, resource, resource_id,
+                                     output_state):
+        yield (
+            '{"id":' + dumps_json(resource_id) +
+            ',"type":' + dumps_json(resource.name) +
+            ',"attributes":'
+        )
+        yield from self.encode_state(output_state.attributes)
+        yield ',"relationships":'
+        yield from self.encode_state(output_state.relationships)
+        yield '}'
+
+    def iter_representation(self, resource, output_state):
+        return self.iter_resource_representation(
+            resource, self.raw_resource_id, output_state,
+        )
+
 
 class GetSingleResourcePipelineRunner(PipelineRunner):
 
@@ -87,3 +129,37 @@ class GetSingleResourcePipelineRunner(PipelineRunner):
 
     PIPELINE_CLS = SingleResourcePipeline
     PIPELINE_STATE_CLS = GetSingleResourcePipelineState
+
+    def coalescing_key(self):
+        return (
+            type(self),
+            self.resource,
+            self.CONTEXT_RULE_CLS.HTTPMethod,
+            self.pipeline_state.raw_resource_id,
+            normalize_sparse_fields(self.pipeline_state.fields),
+        )
+
+    async def _run_pipeline(self, generate_representation=True):
+        cache = self.resource.representation_cache
+        if cache is None:
+            return await super()._run_pipeline(generate_representation)
+
+        resource_id = self.pipeline_state.raw_resource_id
+        fields = normalize_sparse_fields(self.pipeline_state.fields)
+
+        representation = cache.get(self.resource, resource_id, fields)
+        if representation is not None:
+            pipeline = self._create_pipeline()
+            pipeline.representation = representation
+            return pipeline
+
+        if not generate_representation:
+            # streamed, nothing to cache.
+            return await super()._run_pipeline(generate_representation)
+
+        token = cache.begin()
+        pipeline = await super()._run_pipeline()
+        cache.set(
+            self.resource, resource_id, pipeline.representation, token, fields,
+        )
+        return pipeline
@@ -39,7 +39,8 @@ class PatchSingleResourceContextRule(ContextRule):
 class PatchSingleResourceStateTreeBuilder(
     PostSingleResourceStateTreeBuilder,
 ):
-    pass
+
+    HTTPMethod = HTTPMethodConfig.PATCH
 
 
 class PatchSingleResourceRepresentationGenerator(RepresentationGenerator):
@@ -61,3 +62,6 @@ class PatchSingleResourcePipelineRunner(PipelineRunner):
 
     PIPELINE_CLS = SingleResourcePipeline
     PIPELINE_STATE_CLS = PatchSingleResourcePipelineState
+
+    def resource_ids_to_invalidate(self):
+        return (self.pipeline_state.raw_resource_id,)
@@ -4,9 +4,6 @@ from restpf.utils.helper_classes import (
 from restpf.resource.attributes import (
     HTTPMethodConfig,
 )
-from restpf.resource.attribute_states import (
-    create_attribute_state_tree_for_input,
-)
 from restpf.pipeline.protocol import (
     ContextRule,
     CallbackKwargsStateVariableMapper,
@@ -25,6 +22,8 @@ class PostSingleResourcePipelineState(metaclass=StateCreator):
         'raw_resource_id',
         'raw_attributes',
         'raw_relationships',
+        # codec of raw_attributes and raw_relationships if they are bytes.
+        'input_codec',
     ]
 
 
@@ -53,20 +52,23 @@ class PostSingleResourceContextRule(ContextRule):
 
 class PostSingleResourceStateTreeBuilder(StateTreeBuilder):
 
+    HTTPMethod = HTTPMethodConfig.POST
+
     PROXY_ATTRS = [
+        # mapping, or raw JSON text (bytes) of request.
         'raw_attributes',
         'raw_relationships',
     ]
 
     def build_input_state(self, resource):
         return ResourceState(
-            attributes=create_attribute_state_tree_for_input(
+            attributes=self._get_attr_state_for_input(
                 resource.attributes_obj.attr_obj,
-                self.raw_attributes,
+                'raw_attributes',
             ),
-            relationships=create_attribute_state_tree_for_input(
+            relationships=self._get_attr_state_for_input(
                 resource.relationships_obj.attr_obj,
-                self.raw_relationships,
+                'raw_relationships',
             ),
             resource_id=self._get_id_state_for_input(resource),
         )
@@ -99,3 +101,10 @@ class PostSingleResourcePipelineRunner(PipelineRunner):
 
     PIPELINE_CLS = SingleResourcePipeline
     PIPELINE_STATE_CLS = PostSingleResourcePipelineState
+
+    def resource_ids_to_invalidate(self):
+        var_collector = getattr(self.pipeline_state, 'var_collector', None)
+        return (
+            self.pipeline_state.raw_resource_id,
+            (var_collector or {}).get('generated_resource_id'),
+        )
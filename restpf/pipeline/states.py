@@ -1,3 +1,5 @@
+from collections import ChainMap
+
 from restpf.utils.helper_classes import (
     StateCreator,
     ProxyStateOperator,
@@ -24,39 +26,72 @@ RawOutputStateContainer = namedtuple_with_default(
 
 class CallbackKwargsProcessor:
 
+    '''
+    Controllers are compiled into a per-request snapshot of kwargs on the
+    first call of `callback_kwargs`. Controllers providing `kwargs_mapping`
+    are chained in as live mappings, hence variables registered by previous
+    callbacks are visible to following callbacks. Controllers providing only
+    `update` are evaluated once per request.
+    '''
+
     def __init__(self):
         self._controllers = []
+        self._snapshot = None
 
     def add_controller(self, controller):
         self._controllers.append(controller)
+        self._snapshot = None
 
-    def callback_kwargs(self, attr, state):
-        # from arguments.
-        ret = {
-            'attr': attr,
-            'state': state,
-        }
-        # from controllers.
+    def reset(self):
+        self._snapshot = None
+
+    def _build_snapshot(self):
+        maps = []
         for controller in self._controllers:
-            controller.update(ret)
+            kwargs_mapping = getattr(controller, 'kwargs_mapping', None)
+            if kwargs_mapping is not None:
+                maps.append(kwargs_mapping())
+            else:
+                ret = {}
+                controller.update(ret)
+                maps.append(ret)
+        # later controllers take precedence.
+        maps.reverse()
+        return maps
+
+    def callback_kwargs(self, attr, state):
+        if self._snapshot is None:
+            self._snapshot = self._build_snapshot()
 
-        return ret
+        return ChainMap(
+            # from controllers.
+            *self._snapshot,
+            # from arguments.
+            {'attr': attr, 'state': state},
+        )
 
 
 class CallbackKwargsRegistrar:
 
     def __init__(self):
-        self._registered_kwargs = {}
+        self.reset()
 
     def register(self, name, value):
         assert name.isidentifier()
         self._registered_kwargs[name] = value
 
+    def reset(self):
+        self._registered_kwargs = {
+            # bind registrar.
+            'callback_kwargs': self,
+        }
+
+    def kwargs_mapping(self):
+        # registered variables.
+        return self._registered_kwargs
+
     def update(self, ret):
-        # bind registrar.
-        ret['callback_kwargs'] = self
-        # bind registered variables.
-        ret.update(self._registered_kwargs)
+        ret.update(self.kwargs_mapping())
 
 
 class CallbackKwargsStateVariableMapper(ProxyStateOperator):
@@ -67,10 +102,14 @@ class CallbackKwargsStateVariableMapper(ProxyStateOperator):
     def _get_proxy_attrs(cls):
         return cls.ATTR2KWARG.keys()
 
+    def kwargs_mapping(self):
+        return {
+            self.ATTR2KWARG[name]: getattr(self, name)
+            for name in self.PROXY_ATTRS
+        }
+
     def update(self, ret):
-        for name in self.PROXY_ATTRS:
-            kwarg_name = self.ATTR2KWARG[name]
-            ret[kwarg_name] = getattr(self, name)
+        ret.update(self.kwargs_mapping())
 
 
 class _CallbackKwargsVariableCollectorPropertyGenerator(type):
@@ -105,11 +144,16 @@ class CallbackKwargsVariableCollector(
     def _get_proxy_attrs(cls):
         return (cls.ATTACH_TO,)
 
+    def kwargs_mapping(self):
+        return ChainMap(
+            # registered variables.
+            self.var_collector,
+            # bind collector.
+            {'var_collector': self},
+        )
+
     def update(self, ret):
-        # bind registrar.
-        ret['var_collector'] = self
-        # bind registered variables.
-        ret.update(self.var_collector)
+        ret.update(self.kwargs_mapping())
 
 
 class DefaultPipelineState(metaclass=StateCreator):
@@ -0,0 +1,1244 @@
+"""
+Compile attribute trees into specialized functions, operating on JSON-like
+raw values directly, without building attribute states.
+
+- compile_validator: raw value -> bool, same as building states with
+`node2statecls` and then calling `validate(attr_context)`.
+- compile_serializer: raw value -> representation, same as building output
+states and then calling `serialize()`.
+- compile_encoder: raw value -> JSON text pieces of the representation,
+without building it.
+- compile_parser: JSON text -> raw value, validated in the same pass as
+compile_validator, and rejected on the first violation.
+
+Behaviors are derived from the state classes returned by `node2statecls`.
+State classes overriding the default behaviors fall back to building states.
+
+Arrays of primitive leaves accept NumPy ndarray (if installed), which is
+validated by its dtype and serialized by `tolist()`. NaN is a float value
+rather than null, in ndarray and list alike.
+"""
+
+import collections.abc as abc
+import json
+from json.decoder import (
+    JSONDecodeError,
+    WHITESPACE,
+    scanstring,
+)
+
+from .attributes import (
+    LeafAttribute,
+    AppearanceConfig,
+    UnknowAttributeConfig,
+    attribute_context,
+    SparseFieldsAttributeContext,
+)
+from .attribute_states import (
+    create_attribute_state_tree,
+    check_state_tree_depth,
+    LeafAttributeState,
+    LeafAttributeOutputState,
+    LeafAttributeInputState,
+    NestedAttributeState,
+    ArrayStateCommon,
+    ArrayStateForOutputDefault,
+    ArrayStateForInputDefault,
+    TupleStateCommon,
+    TupleStateForOutputDefault,
+    ObjectStateCommon,
+    ObjectStateForOutputDefault,
+    node2statecls_default_output,
+    node2statecls_default_input,
+)
+from restpf.utils.helper_classes import LRUCache
+from restpf.utils.helper_functions import (
+    normalize_sparse_fields,
+    prune_sparse_fields,
+    sparse_fields_to_tree,
+    is_ndarray,
+    ndarray_tolist,
+    ndarray_element_type,
+)
+from restpf.utils.encoders import (
+    dumps_json,
+    iter_json,
+)
+
+
+def _inherits(statecls, basecls, *names):
+    # statecls doesn't override `names` of basecls.
+    return issubclass(statecls, basecls) and all(
+        getattr(statecls, name) is getattr(basecls, name)
+        for name in names
+    )
+
+
+class _CannotCompile(Exception):
+    '''
+    Raised on compilation if the behavior of statecls cannot be derived, the
+    node falls back to building states.
+    '''
+
+
+def _leaf_unwrapper(statecls):
+    if _inherits(statecls, LeafAttributeOutputState, 'init_state'):
+        return None
+
+    if _inherits(statecls, LeafAttributeInputState, 'init_state'):
+        attr_type = statecls.ATTR_TYPE
+
+        def unwrap(value):
+            if isinstance(value, abc.Mapping):
+                assert value['type'] == attr_type
+                return value['value']
+            return value
+
+        return unwrap
+
+    raise _CannotCompile
+
+
+def _list_unwrapper(statecls):
+    if _inherits(statecls, ArrayStateForInputDefault, 'unwrap_values'):
+        attr_type = statecls.ATTR_TYPE
+
+        def unwrap(values):
+            if isinstance(values, abc.Mapping):
+                assert values['type'] == attr_type
+                return values['value']
+            return values
+
+        return unwrap
+
+    if issubclass(statecls, (
+        ArrayStateForOutputDefault,
+        TupleStateForOutputDefault,
+    )) and statecls.init_state in (
+        ArrayStateForOutputDefault.init_state,
+        TupleStateForOutputDefault.init_state,
+    ):
+        return None
+
+    raise _CannotCompile
+
+
+class _ValidatorCompiler:
+
+    def __init__(self, attr_context, node2statecls):
+        self.attr_context = attr_context
+        self.node2statecls = node2statecls
+
+    def _is_required(self, node):
+        return self.attr_context.appear(node) is AppearanceConfig.REQUIRE
+
+    def compile(self, node):
+        try:
+            statecls = self.node2statecls(node)
+        except KeyError:
+            # raise on validation, like building states.
+            return self._compile_fallback(node)
+
+        if statecls is None:
+            raise RuntimeError('cannot get corresponding statecls for node.')
+        if not isinstance(node, statecls.bh_nodecls):
+            raise RuntimeError('statecls is not bound to nodecls.')
+
+        try:
+            if _inherits(statecls, LeafAttributeState, 'validate'):
+                return self._compile_leaf(node, statecls)
+            elif not _inherits(statecls, NestedAttributeState, 'validate'):
+                pass
+            elif _inherits(statecls, TupleStateCommon, 'iter_validate',
+                           'generate_element_states_for_list'):
+                return self._compile_tuple(node, statecls)
+            elif _inherits(statecls, ArrayStateCommon, 'iter_validate',
+                           'generate_element_states_for_list'):
+                return self._compile_array(node, statecls)
+            elif _inherits(statecls, ObjectStateCommon, 'iter_validate',
+                           'init_state', 'generate_element_states'):
+                return self._compile_object(node, statecls)
+        except _CannotCompile:
+            pass
+
+        return self._compile_fallback(node)
+
+    def _compile_fallback(self, node):
+        attr_context = self.attr_context
+        node2statecls = self.node2statecls
+
+        def validate(value):
+            state = create_attribute_state_tree(node, value, node2statecls)
+            return state.validate(attr_context)
+
+        return validate
+
+    def _compile_leaf(self, node, statecls):
+        unwrap = _leaf_unwrapper(statecls)
+        python_type = statecls.PYTHON_TYPE
+        null_is_valid = not self._is_required(node)
+
+        def validate(value):
+            if unwrap is not None:
+                value = unwrap(value)
+            if value is None:
+                return null_is_valid
+            return isinstance(value, python_type)
+
+        return validate
+
+    def _null_of_nested(self, node):
+        # see _check_on_none_value_case.
+        return node.bh_children_size == 0 or not self._is_required(node)
+
+    def _primitive_type(self, node):
+        # PYTHON_TYPE if node is compiled by _compile_leaf, otherwise None.
+        try:
+            statecls = self.node2statecls(node)
+            if not _inherits(statecls, LeafAttributeState, 'validate'):
+                return None
+            _leaf_unwrapper(statecls)
+        except (KeyError, TypeError, _CannotCompile):
+            return None
+        return statecls.PYTHON_TYPE
+
+    def _compile_array(self, node, statecls):
+        unwrap = _list_unwrapper(statecls)
+        element_attr = node.bh_named_child(type(node).ELEMENT_ATTR_NAME)
+        validate_element = self.compile(element_attr)
+        primitive_type = self._primitive_type(element_attr)
+        null_is_valid = self._null_of_nested(node)
+
+        def validate_ndarray(values):
+            element_type = ndarray_element_type(values)
+            if primitive_type is None or element_type is None:
+                return None
+            return issubclass(element_type, primitive_type)
+
+        def validate(values):
+            if unwrap is not None:
+                values = unwrap(values)
+            assert isinstance(values, abc.Iterable)
+
+            if is_ndarray(values):
+                if len(values) == 0:
+                    return null_is_valid
+                ret = validate_ndarray(values)
+                if ret is not None:
+                    return ret
+                values = ndarray_tolist(values)
+
+            is_null = True
+            for element_value in values:
+                is_null = False
+                # skip the call for the most common case.
+                if type(element_value) is primitive_type:
+                    continue
+                if not validate_element(element_value):
+                    return False
+
+            return null_is_valid if is_null else True
+
+        return validate
+
+    def _compile_tuple(self, node, statecls):
+        unwrap = _list_unwrapper(statecls)
+        validate_elements = [
+            self.compile(element_attr)
+            for element_attr in node.bh_children
+        ]
+        size = len(validate_elements)
+        null_is_valid = self._null_of_nested(node)
+
+        def validate(values):
+            if unwrap is not None:
+                values = unwrap(values)
+            assert isinstance(values, abc.Iterable)
+            if is_ndarray(values):
+                values = ndarray_tolist(values)
+
+            if len(values) != size:
+                raise RuntimeError('tuple values not matched')
+            if size == 0:
+                return null_is_valid
+
+            for validate_element, element_value in zip(
+                validate_elements, values,
+            ):
+                if not validate_element(element_value):
+                    return False
+
+            return True
+
+        return validate
+
+    def _compile_object(self, node, statecls):
+        name2validate = {
+            name: (
+                self.compile(element_attr),
+                self._primitive_type(element_attr),
+            )
+            for name, element_attr in node.bh_named_children.items()
+        }
+        required_names = frozenset(
+            name
+            for name, element_attr in node.bh_named_children.items()
+            if self._is_required(element_attr)
+        )
+        can_ignore_unknown = (
+            self.attr_context.unknown(node) is UnknowAttributeConfig.IGNORE
+        )
+        null_is_valid = self._null_of_nested(node)
+
+        def validate(mapping):
+            assert isinstance(mapping, abc.Mapping)
+
+            if not mapping:
+                return null_is_valid
+
+            for name, element_value in mapping.items():
+                validate_and_type = name2validate.get(name)
+                if validate_and_type is None:
+                    if can_ignore_unknown:
+                        continue
+                    else:
+                        return False
+                validate_element, primitive_type = validate_and_type
+                # skip the call for the most common case.
+                if type(element_value) is primitive_type:
+                    continue
+                if not validate_element(element_value):
+                    return False
+
+            return required_names <= mapping.keys()
+
+        return validate
+
+
+def compile_validator(node, attr_context, node2statecls, max_depth=None):
+    '''
+    `attr_context` should provide `appear(node)` and `unknown(node)`, which
+    are evaluated on compilation. Raise RuntimeError if state trees of `node`
+    are deeper than `max_depth`, MAX_STATE_TREE_DEPTH by default.
+    '''
+    check_state_tree_depth(node, max_depth)
+    return _ValidatorCompiler(attr_context, node2statecls).compile(node)
+
+
+# upper bound of cached validators of different sparse fieldsets per node.
+MAX_CACHED_SPARSE_VALIDATORS = 256
+
+
+def compiled_validator(node, http_method, node2statecls, fields=None):
+    '''
+    Cached version of compile_validator, for the attribute context of
+    `http_method` and the sparse fieldset `fields`. Validators of sparse
+    fieldsets are cached in a bounded LRU cache.
+    '''
+    check_state_tree_depth(node)
+    fields = prune_sparse_fields(normalize_sparse_fields(fields), node)
+
+    if fields is None:
+        cache = node.compiled_cache
+        key = ('validator', http_method, node2statecls)
+    else:
+        cache_key = ('sparse_validators', http_method, node2statecls)
+        cache = node.compiled_cache.get(cache_key)
+        if cache is None:
+            cache = LRUCache(max_entries=MAX_CACHED_SPARSE_VALIDATORS)
+            node.compiled_cache[cache_key] = cache
+        key = fields
+
+    validate = cache.get(key)
+    if validate is None:
+        attr_context = attribute_context(http_method)
+        if fields is not None:
+            attr_context = SparseFieldsAttributeContext(
+                attr_context, sparse_fields_to_tree(fields),
+            )
+        validate = compile_validator(node, attr_context, node2statecls)
+        if fields is None:
+            cache[key] = validate
+        else:
+            cache.set(key, validate)
+
+    return validate
+
+
+def validate_state(state, http_method, fields=None):
+    '''
+    Validate state, pending (lazy) nested state is validated on its raw
+    value by compiled validator.
+    '''
+    if isinstance(state, NestedAttributeState) and state.bh_is_pending:
+        if fields is None and state.bh_validated_for is http_method:
+            return True
+
+        value, node2statecls = state._bh_pending
+        return compiled_validator(
+            state.bh_node, http_method, node2statecls, fields,
+        )(value)
+
+    attr_context = attribute_context(http_method)
+    if fields is not None:
+        attr_context = SparseFieldsAttributeContext(
+            attr_context,
+            sparse_fields_to_tree(prune_sparse_fields(
+                normalize_sparse_fields(fields), state.bh_node,
+            )),
+        )
+    return state.validate(attr_context)
+
+
+class _SerializerCompiler:
+
+    def __init__(self, node2statecls):
+        self.node2statecls = node2statecls
+
+    def compile(self, node):
+        try:
+            statecls = self.node2statecls(node)
+        except KeyError:
+            return self._compile_fallback(node)
+
+        if statecls is None:
+            raise RuntimeError('cannot get corresponding statecls for node.')
+        if not isinstance(node, statecls.bh_nodecls):
+            raise RuntimeError('statecls is not bound to nodecls.')
+
+        list_names = (
+            'init_state', 'serialize', 'iter_serialize',
+            'generate_element_states_for_list',
+            'can_abbr', 'can_abbr_by_element_types', 'element_attr_type',
+        )
+        if _inherits(statecls, LeafAttributeOutputState,
+                     'init_state', 'serialize'):
+            return self._compile_leaf(node, statecls)
+        elif _inherits(statecls, TupleStateForOutputDefault, *list_names):
+            return self._compile_tuple(node, statecls)
+        elif _inherits(statecls, ArrayStateForOutputDefault, *list_names):
+            return self._compile_array(node, statecls)
+        elif _inherits(statecls, ObjectStateForOutputDefault,
+                       'init_state', 'serialize', 'iter_serialize',
+                       'generate_element_states'):
+            return self._compile_object(node, statecls)
+        else:
+            return self._compile_fallback(node)
+
+    def _compile_fallback(self, node):
+        node2statecls = self.node2statecls
+
+        def serialize(value):
+            return create_attribute_state_tree(
+                node, value, node2statecls,
+            ).serialize()
+
+        return serialize
+
+    def _compile_leaf(self, node, statecls):
+        attr_type = statecls.ATTR_TYPE
+
+        def serialize(value):
+            return {
+                'type': attr_type,
+                'value': value,
+            }
+
+        return serialize
+
+    def _element_type(self, node):
+        # (ATTR_TYPE, is_nested) of element, see can_abbr_by_element_types.
+        statecls = self.node2statecls(node)
+        return (
+            statecls.ATTR_TYPE,
+            issubclass(statecls, NestedAttributeState),
+        )
+
+    def _compile_array(self, node, statecls):
+        attr_type = statecls.ATTR_TYPE
+        element_attr = node.bh_named_child(type(node).ELEMENT_ATTR_NAME)
+        element_type = self._element_type(element_attr)
+        serialize_element = self.compile(element_attr)
+
+        if statecls.can_abbr_by_element_types([element_type]):
+            abbr_element_type = element_type[0]
+
+            def serialize(values):
+                assert isinstance(values, abc.Iterable)
+
+                # value of serialized leaf is the raw value.
+                if is_ndarray(values):
+                    output_list = ndarray_tolist(values)
+                else:
+                    output_list = list(values)
+                ret = {
+                    'type': attr_type,
+                    'value': output_list,
+                }
+                # can_abbr requires non-empty list.
+                if output_list:
+                    ret['element_type'] = abbr_element_type
+                return ret
+
+        else:
+            def serialize(values):
+                assert isinstance(values, abc.Iterable)
+                if is_ndarray(values):
+                    values = ndarray_tolist(values)
+
+                return {
+                    'type': attr_type,
+                    'value': list(map(serialize_element, values)),
+                }
+
+        return serialize
+
+    def _compile_tuple(self, node, statecls):
+        attr_type = statecls.ATTR_TYPE
+        element_attrs = list(node.bh_children)
+        element_types = list(map(self._element_type, element_attrs))
+        serialize_elements = list(map(self.compile, element_attrs))
+        size = len(serialize_elements)
+
+        abbr_element_type = None
+        if statecls.can_abbr_by_element_types(element_types):
+            abbr_element_type = element_types[0][0]
+
+        def serialize(values):
+            assert isinstance(values, abc.Iterable)
+            if is_ndarray(values):
+                values = ndarray_tolist(values)
+            if len(values) != size:
+                raise RuntimeError('tuple values not matched')
+
+            if abbr_element_type is not None:
+                return {
+                    'type': attr_type,
+                    'value': list(values),
+                    'element_type': abbr_element_type,
+                }
+
+            return {
+                'type': attr_type,
+                'value': [
+                    serialize_element(element_value)
+                    for serialize_element, element_value in zip(
+                        serialize_elements, values,
+                    )
+                ],
+            }
+
+        return serialize
+
+    def _compile_object(self, node, statecls):
+        name2serialize = {
+            name: self.compile(element_attr)
+            for name, element_attr in node.bh_named_children.items()
+        }
+
+        def serialize(mapping):
+            assert isinstance(mapping, abc.Mapping)
+
+            ret = {}
+            for name, element_value in mapping.items():
+                serialize_element = name2serialize.get(name)
+                # ignore unknown name.
+                if serialize_element is None:
+                    continue
+                ret[name] = serialize_element(element_value)
+            return ret
+
+        return serialize
+
+
+def _verified_serializer(node, node2statecls, serialize):
+
+    def verified_serialize(value):
+        ret = serialize(value)
+        expected = create_attribute_state_tree(
+            node, value, node2statecls,
+        ).serialize()
+        # compare JSON text, since NaN is not equal to itself.
+        if dumps_json(ret) != dumps_json(expected):
+            raise RuntimeError(
+                f'compiled serializer of {node.bh_name} mismatched: '
+                f'{ret} != {expected}',
+            )
+        return ret
+
+    return verified_serialize
+
+
+def compile_serializer(node, node2statecls=node2statecls_default_output,
+                       verify=False, max_depth=None):
+    '''
+    raw value -> representation, same as building output states and then
+    calling `serialize()`. If `verify` is set, the result is compared with
+    the state tree path, raise on mismatch. Depth is checked as
+    compile_validator.
+    '''
+    check_state_tree_depth(node, max_depth)
+    serialize = _SerializerCompiler(node2statecls).compile(node)
+    if verify:
+        serialize = _verified_serializer(node, node2statecls, serialize)
+    return serialize
+
+
+def compiled_serializer(node, node2statecls=node2statecls_default_output,
+                        verify=False):
+    check_state_tree_depth(node)
+    key = ('serializer', node2statecls, verify)
+
+    serialize = node.compiled_cache.get(key)
+    if serialize is None:
+        serialize = compile_serializer(node, node2statecls, verify)
+        node.compiled_cache[key] = serialize
+
+    return serialize
+
+
+def serialize_state(state, verify=False):
+    '''
+    Serialize state, pending (lazy) nested state is serialized from its raw
+    value by compiled serializer.
+    '''
+    if isinstance(state, NestedAttributeState) and state.bh_is_pending:
+        value, node2statecls = state._bh_pending
+        return compiled_serializer(
+            state.bh_node, node2statecls, verify,
+        )(value)
+
+    return state.serialize()
+
+
+class _EncoderCompiler(_SerializerCompiler):
+
+    '''
+    Same as _SerializerCompiler, but generate JSON text pieces of the
+    representation, without building it.
+    '''
+
+    # elements of abbreviated array encoded per piece.
+    ABBR_ELEMENTS_PER_PIECE = 1024
+
+    def _compile_fallback(self, node):
+        serialize = super()._compile_fallback(node)
+
+        def encode(value):
+            yield dumps_json(serialize(value))
+
+        return encode
+
+    def _compile_leaf(self, node, statecls):
+        prefix = '{"type":' + dumps_json(statecls.ATTR_TYPE) + ',"value":'
+
+        def encode(value):
+            yield prefix + dumps_json(value) + '}'
+
+        return encode
+
+    def _compile_array(self, node, statecls):
+        prefix = '{"type":' + dumps_json(statecls.ATTR_TYPE) + ',"value":['
+        element_attr = node.bh_named_child(type(node).ELEMENT_ATTR_NAME)
+        element_type = self._element_type(element_attr)
+        encode_element = self.compile(element_attr)
+
+        if statecls.can_abbr_by_element_types([element_type]):
+            suffix = '],"element_type":' + dumps_json(element_type[0]) + '}'
+            step = self.ABBR_ELEMENTS_PER_PIECE
+
+            def encode(values):
+                assert isinstance(values, abc.Iterable)
+                if not is_ndarray(values) and not isinstance(values, list):
+                    values = list(values)
+
+                # can_abbr requires non-empty list.
+                if len(values) == 0:
+                    yield prefix + ']}'
+                    return
+
+                yield prefix
+                for begin in range(0, len(values), step):
+                    piece = values[begin:begin + step]
+                    if is_ndarray(piece):
+                        piece = ndarray_tolist(piece)
+                    # strip brackets.
+                    piece = dumps_json(piece)[1:-1]
+                    yield piece if begin == 0 else ',' + piece
+                yield suffix
+
+        else:
+            def encode(values):
+                assert isinstance(values, abc.Iterable)
+                if is_ndarray(values):
+                    values = ndarray_tolist(values)
+
+                yield prefix
+                for idx, element_value in enumerate(values):
+                    if idx > 0:
+                        yield ','
+                    yield from encode_element(element_value)
+                yield ']}'
+
+        return encode
+
+    def _compile_tuple(self, node, statecls):
+        prefix = '{"type":' + dumps_json(statecls.ATTR_TYPE) + ',"value":['
+        encode_elements = list(map(self.compile, node.bh_children))
+        size = len(encode_elements)
+
+        suffix = None
+        element_types = list(map(self._element_type, node.bh_children))
+        if statecls.can_abbr_by_element_types(element_types):
+            suffix = (
+                '],"element_type":' + dumps_json(element_types[0][0]) + '}'
+            )
+
+        def encode(values):
+            assert isinstance(values, abc.Iterable)
+            if is_ndarray(values):
+                values = ndarray_tolist(values)
+            if len(values) != size:
+                raise RuntimeError('tuple values not matched')
+
+            if suffix is not None:
+                yield prefix + dumps_json(list(values))[1:-1] + suffix
+                return
+
+            yield prefix
+            for idx, (encode_element, element_value) in enumerate(
+                zip(encode_elements, values),
+            ):
+                if idx > 0:
+                    yield ','
+                yield from encode_element(element_value)
+            yield ']}'
+
+        return encode
+
+    def _compile_object(self, node, statecls):
+        name2encode = {
+            name: (dumps_json(name) + ':', self.compile(element_attr))
+            for name, element_attr in node.bh_named_children.items()
+        }
+
+        def encode(mapping):
+            assert isinstance(mapping, abc.Mapping)
+
+            yield '{'
+            is_first = True
+            for name, element_value in mapping.items():
+                key_and_encode = name2encode.get(name)
+                # ignore unknown name.
+                if key_and_encode is None:
+                    continue
+                key, encode_element = key_and_encode
+                yield key if is_first else ',' + key
+                is_first = False
+                yield from encode_element(element_value)
+            yield '}'
+
+        return encode
+
+
+def compile_encoder(node, node2statecls=node2statecls_default_output,
+                    max_depth=None):
+    '''
+    raw value -> generator of JSON text pieces, same as encoding the result
+    of compile_serializer by `dumps_json`. Depth is checked as
+    compile_validator.
+    '''
+    check_state_tree_depth(node, max_depth)
+    return _EncoderCompiler(node2statecls).compile(node)
+
+
+def compiled_encoder(node, node2statecls=node2statecls_default_output):
+    check_state_tree_depth(node)
+    key = ('encoder', node2statecls)
+
+    encode = node.compiled_cache.get(key)
+    if encode is None:
+        encode = compile_encoder(node, node2statecls)
+        node.compiled_cache[key] = encode
+
+    return encode
+
+
+def encode_state(state):
+    '''
+    Generate JSON text pieces of serialized state, pending (lazy) nested state
+    is encoded from its raw value by compiled encoder.
+    '''
+    if isinstance(state, NestedAttributeState) and state.bh_is_pending:
+        value, node2statecls = state._bh_pending
+        return compiled_encoder(state.bh_node, node2statecls)(value)
+
+    return iter_json(state.serialize())
+
+
+_scan_once = json.JSONDecoder().scan_once
+_match_whitespace = WHITESPACE.match
+
+
+def _skip_whitespace(text, idx):
+    # most of the values are followed by delimiters directly.
+    if text[idx:idx + 1] not in ' \t\n\r':
+        return idx
+    return _match_whitespace(text, idx).end()
+
+
+def _scan(text, idx):
+    # JSON value starts at idx -> (value, end).
+    try:
+        return _scan_once(text, idx)
+    except StopIteration as err:
+        raise JSONDecodeError('Expecting value', text, err.value) from None
+
+
+def _parse_json_list(text, idx, parse_element):
+    # text[idx] is '['.
+    ret = []
+    idx = _skip_whitespace(text, idx + 1)
+    if text[idx:idx + 1] == ']':
+        return ret, idx + 1
+
+    while True:
+        element_value, idx = parse_element(len(ret), text, idx)
+        ret.append(element_value)
+
+        idx = _skip_whitespace(text, idx)
+        char = text[idx:idx + 1]
+        if char == ']':
+            return ret, idx + 1
+        if char != ',':
+            raise JSONDecodeError("Expecting ',' delimiter", text, idx)
+        idx = _skip_whitespace(text, idx + 1)
+
+
+def _parse_json_object(text, idx, parse_member):
+    # text[idx] is '{'.
+    ret = {}
+    idx = _skip_whitespace(text, idx + 1)
+    if text[idx:idx + 1] == '}':
+        return ret, idx + 1
+
+    while True:
+        if text[idx:idx + 1] != '"':
+            raise JSONDecodeError(
+                'Expecting property name enclosed in double quotes',
+                text, idx,
+            )
+        name, idx = scanstring(text, idx + 1)
+
+        idx = _skip_whitespace(text, idx)
+        if text[idx:idx + 1] != ':':
+            raise JSONDecodeError("Expecting ':' delimiter", text, idx)
+        idx = _skip_whitespace(text, idx + 1)
+
+        ret[name], idx = parse_member(name, text, idx)
+
+        idx = _skip_whitespace(text, idx)
+        char = text[idx:idx + 1]
+        if char == '}':
+            return ret, idx + 1
+        if char != ',':
+            raise JSONDecodeError("Expecting ',' delimiter", text, idx)
+        idx = _skip_whitespace(text, idx + 1)
+
+
+def _reject(node, reason):
+    path = '.'.join(map(str, node.bh_path))
+    raise RuntimeError(f'invalid value of attribute {path!r}: {reason}')
+
+
+class _ParserCompiler(_ValidatorCompiler):
+
+    '''
+    Same as _ValidatorCompiler, but generate parsers of JSON text:
+    (text, idx) -> (value, end), raise RuntimeError on the first violation.
+
+    Leaves and objects of leaves are scanned as a whole (by the C scanner of
+    json), then validated.
+    '''
+
+    def __init__(self, attr_context, node2statecls):
+        super().__init__(attr_context, node2statecls)
+        self.validator_compiler = _ValidatorCompiler(
+            attr_context, node2statecls,
+        )
+
+    def _compile_scanned(self, node):
+        validate = self.validator_compiler.compile(node)
+
+        def parse(text, idx):
+            value, end = _scan(text, idx)
+            if not validate(value):
+                _reject(node, 'not valid')
+            return value, end
+
+        return parse
+
+    def _compile_fallback(self, node):
+        return self._compile_scanned(node)
+
+    def _compile_leaf(self, node, statecls):
+        return self._compile_scanned(node)
+
+    def _compile_list(self, node, statecls, parse_list):
+        # list or {"type": ATTR_TYPE, "value": list} if unwrappable.
+        can_unwrap = _list_unwrapper(statecls) is not None
+        attr_type = statecls.ATTR_TYPE
+        # compiled on the first string.
+        validate_scanned = []
+
+        def parse_wrapped_member(name, text, idx):
+            if name == 'value':
+                return parse_list(text, idx)
+
+            value, idx = _scan(text, idx)
+            if name == 'type' and value != attr_type:
+                _reject(node, f'type {value!r} not matched')
+            return value, idx
+
+        def parse(text, idx):
+            char = text[idx:idx + 1]
+            if char == '[':
+                return parse_list(text, idx)
+
+            if char == '{' and can_unwrap:
+                mapping, end = _parse_json_object(
+                    text, idx, parse_wrapped_member,
+                )
+                if 'type' not in mapping or 'value' not in mapping:
+                    _reject(node, 'type or value is missing')
+                return mapping, end
+
+            if char == '"':
+                # iterable as well, same as building states.
+                if not validate_scanned:
+                    validate_scanned.append(
+                        self.validator_compiler.compile(node),
+                    )
+                value, end = _scan(text, idx)
+                try:
+                    is_valid = validate_scanned[0](value)
+                except AssertionError:
+                    # e.g. characters as objects.
+                    is_valid = False
+                if not is_valid:
+                    _reject(node, 'not valid')
+                return value, end
+
+            _reject(node, 'expecting array')
+
+        return parse
+
+    def _compile_array(self, node, statecls):
+        element_attr = node.bh_named_child(type(node).ELEMENT_ATTR_NAME)
+        parse_element = self.compile(element_attr)
+        null_is_valid = self._null_of_nested(node)
+
+        def parse_indexed_element(_, text, idx):
+            return parse_element(text, idx)
+
+        def parse_list(text, idx):
+            values, end = _parse_json_list(text, idx, parse_indexed_element)
+            if not values and not null_is_valid:
+                _reject(node, 'null')
+            return values, end
+
+        return self._compile_list(node, statecls, parse_list)
+
+    def _compile_tuple(self, node, statecls):
+        parse_elements = list(map(self.compile, node.bh_children))
+        size = len(parse_elements)
+        null_is_valid = self._null_of_nested(node)
+
+        def parse_indexed_element(element_idx, text, idx):
+            if element_idx >= size:
+                _reject(node, 'tuple values not matched')
+            return parse_elements[element_idx](text, idx)
+
+        def parse_list(text, idx):
+            values, end = _parse_json_list(text, idx, parse_indexed_element)
+            if len(values) != size:
+                _reject(node, 'tuple values not matched')
+            if size == 0 and not null_is_valid:
+                _reject(node, 'null')
+            return values, end
+
+        return self._compile_list(node, statecls, parse_list)
+
+    def _compile_object(self, node, statecls):
+        if all(
+            isinstance(element_attr, LeafAttribute)
+            for element_attr in node.bh_children
+        ):
+            return self._compile_scanned(node)
+
+        name2parse = {
+            name: self.compile(element_attr)
+            for name, element_attr in node.bh_named_children.items()
+        }
+        required_names = frozenset(
+            name
+            for name, element_attr in node.bh_named_children.items()
+            if self._is_required(element_attr)
+        )
+        can_ignore_unknown = (
+            self.attr_context.unknown(node) is UnknowAttributeConfig.IGNORE
+        )
+        null_is_valid = self._null_of_nested(node)
+
+        def parse_member(name, text, idx):
+            parse_element = name2parse.get(name)
+            if parse_element is None:
+                if not can_ignore_unknown:
+                    _reject(node, f'unknown attribute {name!r}')
+                return _scan(text, idx)
+            return parse_element(text, idx)
+
+        def parse(text, idx):
+            if text[idx:idx + 1] != '{':
+                _reject(node, 'expecting object')
+
+            mapping, end = _parse_json_object(text, idx, parse_member)
+            if not mapping:
+                if not null_is_valid:
+                    _reject(node, 'null')
+            elif not required_names <= mapping.keys():
+                missing = ', '.join(sorted(required_names - mapping.keys()))
+                _reject(node, f'missing required attributes {missing}')
+            return mapping, end
+
+        return parse
+
+
+def compile_parser(node, attr_context,
+                   node2statecls=node2statecls_default_input,
+                   max_depth=None):
+    '''
+    JSON text (str or UTF-8 bytes) -> raw value, same as `json.loads` and
+    then compile_validator in one pass. Raise RuntimeError on the first
+    violation, without parsing the rest of text, and JSONDecodeError on
+    malformed text. Depth is checked as compile_validator.
+    '''
+    check_state_tree_depth(node, max_depth)
+    parse_value = _ParserCompiler(attr_context, node2statecls).compile(node)
+
+    def parse(text):
+        if isinstance(text, (bytes, bytearray, memoryview)):
+            text = bytes(text).decode('utf-8')
+
+        value, end = parse_value(text, _skip_whitespace(text, 0))
+        end = _skip_whitespace(text, end)
+        if end != len(text):
+            raise JSONDecodeError('Extra data', text, end)
+        return value
+
+    return parse
+
+
+def compiled_parser(node, http_method,
+                    node2statecls=node2statecls_default_input):
+    check_state_tree_depth(node)
+    key = ('parser', http_method, node2statecls)
+
+    parse = node.compiled_cache.get(key)
+    if parse is None:
+        parse = compile_parser(
+            node, attribute_context(http_method), node2statecls,
+        )
+        node.compiled_cache[key] = parse
+
+    return parse
+
+
+def _identity(value):
+    return value
+
+
+class _PackerCompiler(_SerializerCompiler):
+
+    '''
+    Same as _SerializerCompiler, but generate packers of representation:
+    type tags and names are dropped, since they could be derived from the
+    attribute tree.
+
+    - leaf: the value.
+    - array, tuple: list of packed elements.
+    - object: [bitmask of present names, packed elements...], following the
+    order of names in the attribute tree, unknown names are dropped.
+    '''
+
+    def _compile_fallback(self, node):
+        raise RuntimeError(f'cannot pack {node.bh_name}, statecls overridden.')
+
+    def _compile_leaf(self, node, statecls):
+
+        def pack(representation):
+            return representation['value']
+
+        return pack
+
+    def _compile_array(self, node, statecls):
+        pack_element = self.compile(
+            node.bh_named_child(type(node).ELEMENT_ATTR_NAME),
+        )
+
+        def pack(representation):
+            values = representation['value']
+            # abbreviated elements are packed already.
+            if 'element_type' in representation:
+                return list(values)
+            return list(map(pack_element, values))
+
+        return pack
+
+    def _compile_tuple(self, node, statecls):
+        pack_elements = list(map(self.compile, node.bh_children))
+
+        def pack(representation):
+            values = representation['value']
+            if 'element_type' in representation:
+                return list(values)
+            return [
+                pack_element(element_value)
+                for pack_element, element_value in zip(pack_elements, values)
+            ]
+
+        return pack
+
+    def _compile_object(self, node, statecls):
+        names_and_packs = [
+            (name, self.compile(element_attr))
+            for name, element_attr in node.bh_named_children.items()
+        ]
+
+        def pack(representation):
+            ret = [0]
+            bitmask = 0
+            for bit, (name, pack_element) in enumerate(names_and_packs):
+                element_representation = representation.get(name)
+                if element_representation is None:
+                    continue
+                bitmask |= 1 << bit
+                ret.append(pack_element(element_representation))
+            ret[0] = bitmask
+            return ret
+
+        return pack
+
+
+def _check_packed_list(node, packed):
+    if not isinstance(packed, list):
+        _reject(node, f'packed value should be a list, got {packed!r}')
+
+
+class _UnpackerCompiler(_SerializerCompiler):
+
+    '''
+    Reverse of _PackerCompiler, generate unpackers of packed value to raw
+    value, which could be serialized by compiled serializer, or used as
+    input. Raise RuntimeError on malformed packed value, values of leaves are
+    left to validation.
+    '''
+
+    def _compile_fallback(self, node):
+        raise RuntimeError(
+            f'cannot unpack {node.bh_name}, statecls overridden.',
+        )
+
+    def _compile_leaf(self, node, statecls):
+        return _identity
+
+    def _compile_array(self, node, statecls):
+        unpack_element = self.compile(
+            node.bh_named_child(type(node).ELEMENT_ATTR_NAME),
+        )
+
+        def unpack(packed):
+            if packed is None:
+                return None
+            _check_packed_list(node, packed)
+            if unpack_element is _identity:
+                return list(packed)
+            return list(map(unpack_element, packed))
+
+        return unpack
+
+    def _compile_tuple(self, node, statecls):
+        unpack_elements = list(map(self.compile, node.bh_children))
+
+        def unpack(packed):
+            if packed is None:
+                return None
+            _check_packed_list(node, packed)
+            if len(packed) != len(unpack_elements):
+                _reject(node, f'expect {len(unpack_elements)} elements')
+            return [
+                unpack_element(element_value)
+                for unpack_element, element_value in zip(
+                    unpack_elements, packed,
+                )
+            ]
+
+        return unpack
+
+    def _compile_object(self, node, statecls):
+        names_and_unpacks = [
+            (name, self.compile(element_attr))
+            for name, element_attr in node.bh_named_children.items()
+        ]
+        bitmask_limit = 1 << len(names_and_unpacks)
+
+        def unpack(packed):
+            if packed is None:
+                return None
+            _check_packed_list(node, packed)
+            bitmask = packed[0] if packed else None
+            if type(bitmask) is not int or not 0 <= bitmask < bitmask_limit:
+                _reject(node, f'invalid bitmask {bitmask!r}')
+            if len(packed) != 1 + bin(bitmask).count('1'):
+                _reject(node, 'number of elements mismatches bitmask')
+
+            ret = {}
+            pos = 1
+            for bit, (name, unpack_element) in enumerate(names_and_unpacks):
+                if bitmask >> bit & 1:
+                    ret[name] = unpack_element(packed[pos])
+                    pos += 1
+            return ret
+
+        return unpack
+
+
+def compiled_packer(node, node2statecls=node2statecls_default_output):
+    '''
+    representation -> packed value, see _PackerCompiler. Raise RuntimeError
+    on compilation if the behavior of any statecls is overridden.
+    '''
+    check_state_tree_depth(node)
+    key = ('packer', node2statecls)
+
+    pack = node.compiled_cache.get(key)
+    if pack is None:
+        pack = _PackerCompiler(node2statecls).compile(node)
+        node.compiled_cache[key] = pack
+
+    return pack
+
+
+def compiled_unpacker(node, node2statecls=node2statecls_default_output):
+    '''
+    packed value -> raw value, see _UnpackerCompiler.
+    '''
+    check_state_tree_depth(node)
+    key = ('unpacker', node2statecls)
+
+    unpack = node.compiled_cache.get(key)
+    if unpack is None:
+        unpack = _UnpackerCompiler(node2statecls).compile(node)
+        node.compiled_cache[key] = unpack
+
+    return unpack
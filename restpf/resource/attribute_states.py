@@ -1,7 +1,9 @@
 import collections.abc as abc
 from functools import wraps
+from types import GeneratorType
 
 from .attributes import (
+    LeafAttribute,
     Bool,
     Integer,
     Float,
@@ -18,10 +20,49 @@ from restpf.utils.behavior_tree import (
     BehaviorTreeNodeStateLeaf,
     BehaviorTreeNodeStateNested,
 )
-from restpf.utils.helper_functions import property_with_cache
+from restpf.utils.helper_functions import (
+    property_with_cache,
+    is_ndarray,
+    ndarray_tolist,
+)
+
+
+# maximum depth of state trees, deeper trees are rejected on building,
+# validation and serialization.
+MAX_STATE_TREE_DEPTH = 1024
+
+
+def _check_depth(depth, max_depth):
+    if max_depth is None:
+        max_depth = MAX_STATE_TREE_DEPTH
+    if depth > max_depth:
+        raise RuntimeError(f'state tree is deeper than {max_depth}.')
+
 
+def check_state_tree_depth(node, max_depth=None):
+    '''
+    Raise RuntimeError if state trees of `node` are deeper than `max_depth`,
+    for paths operating on raw values without building state trees. Depth of
+    state trees follows the attribute tree, which is cached on `node`.
+    '''
+    depth = node.compiled_cache.get('state_tree_depth')
+    if depth is None:
+        depth = 0
+        stack = [(node, 1)]
+        while stack:
+            attr, attr_depth = stack.pop()
+            if isinstance(attr, LeafAttribute):
+                continue
+            depth = max(depth, attr_depth)
+            for child in attr.bh_children:
+                stack.append((child, attr_depth + 1))
+        node.compiled_cache['state_tree_depth'] = depth
 
-def create_attribute_state_tree(node, value, node2statecls):
+    _check_depth(depth, max_depth)
+
+
+def create_attribute_state_tree(node, value, node2statecls, lazy=False,
+                                validated_for=None, max_depth=None):
     '''
     1. Attribute classes has nothing to do with side effect, including building
     nodes and consuming input value.
@@ -29,6 +70,11 @@ def create_attribute_state_tree(node, value, node2statecls):
     leading to different behavior for a single structure.
     3. State.init_state should consume the entire input value. Kind of top-down
     parsing structure.
+    4. If `lazy` is set, children of nested states are created on access.
+    `validated_for` marks the pending value as validated, see
+    NestedAttributeState.bh_validated_for.
+    5. Otherwise, nested states are materialized level by level with an
+    explicit stack, raise RuntimeError if deeper than `max_depth`.
     '''
 
     statecls = node2statecls(node)
@@ -43,17 +89,66 @@ def create_attribute_state_tree(node, value, node2statecls):
     state.bh_bind_node(node)
 
     # process
-    state.init_state(value, node2statecls)
+    if isinstance(state, NestedAttributeState):
+        state.init_state_lazily(value, node2statecls, validated_for)
+        if not lazy:
+            _materialize_state_tree(state, max_depth)
+    else:
+        state.init_state(value, node2statecls)
 
     return state
 
 
+def _materialize_state_tree(root, max_depth):
+    # children are created pending, then materialized in turn.
+    stack = [(root, 1)]
+    while stack:
+        state, depth = stack.pop()
+        _check_depth(depth, max_depth)
+
+        state.bh_materialize()
+        state._bh_lazy = False
+
+        for child in state.bh_children:
+            if isinstance(child, NestedAttributeState) and child.bh_is_pending:
+                stack.append((child, depth + 1))
+
+
+def _run_on_state_tree(root, start, max_depth):
+    '''
+    Recursion on state tree with an explicit stack. `start(state)` returns
+    the result, or a generator which yields child states and receives their
+    results, and finally returns the result.
+    '''
+    ret = start(root)
+    if not isinstance(ret, GeneratorType):
+        return ret
+
+    stack = [ret]
+    ret = None
+    while stack:
+        _check_depth(len(stack), max_depth)
+        try:
+            child = stack[-1].send(ret)
+        except StopIteration as stop:
+            stack.pop()
+            ret = stop.value
+            continue
+
+        ret = start(child)
+        if isinstance(ret, GeneratorType):
+            stack.append(ret)
+            ret = None
+
+    return ret
+
+
 def _check_on_none_value_case(state, attr_context):
 
     if isinstance(state, LeafAttributeState):
         is_null = state.bh_value is None
     elif isinstance(state, NestedAttributeState):
-        is_null = state.bh_children_size == 0
+        is_null = state.element_attr_states_is_empty()
     else:
         raise NotImplemented
 
@@ -90,8 +185,74 @@ def nullable_processor(validator):
     return validator_with_nullable_processing
 
 
+def _start_validation(state, attr_context):
+    # states overriding `validate` are validated by recursion.
+    if type(state).validate is NestedAttributeState.validate:
+        return state.iter_validate(attr_context)
+    return state.validate(attr_context)
+
+
+def _start_serialization(state):
+    if type(state).serialize is NestedAttributeState.serialize:
+        return state.iter_serialize()
+    return state.serialize()
+
+
+def _start_validation_and_serialization(state, attr_context):
+    # states overriding `validate` or `serialize` are run by recursion.
+    if (
+        type(state).validate is not NestedAttributeState.validate or
+        type(state).serialize is not NestedAttributeState.serialize
+    ):
+        is_valid = state.validate(attr_context)
+        return is_valid, state.serialize() if is_valid else None
+    return _iter_validation_and_serialization(state, attr_context)
+
+
+def _drive(ret, child2ret, idx):
+    '''
+    Run generator `ret` of iter_validate (`idx` 0) or iter_serialize (`idx`
+    1), yield children not in `child2ret` to get (is_valid, serialized value)
+    of them.
+    '''
+    if not isinstance(ret, GeneratorType):
+        return ret
+
+    gen = ret
+    ret = None
+    while True:
+        try:
+            child = gen.send(ret)
+        except StopIteration as stop:
+            return stop.value
+
+        child_ret = child2ret.get(id(child))
+        if child_ret is None:
+            child_ret = child2ret[id(child)] = yield child
+        ret = child_ret[idx]
+
+
+def _iter_validation_and_serialization(state, attr_context):
+    if state.bh_is_pending:
+        # generated once, shared by both walks.
+        state._bh_transient = list(state.iter_element_attr_states())
+    try:
+        child2ret = {}
+        is_valid = yield from _drive(
+            state.iter_validate(attr_context), child2ret, 0,
+        )
+        if not is_valid:
+            return False, None
+        serialized = yield from _drive(state.iter_serialize(), child2ret, 1)
+        return True, serialized
+    finally:
+        state._bh_transient = None
+
+
 class LeafAttributeState(BehaviorTreeNodeStateLeaf):
 
+    __slots__ = ()
+
     # require subclass to override.
     ATTR_TYPE = 'none'
     PYTHON_TYPE = None
@@ -113,6 +274,8 @@ class LeafAttributeState(BehaviorTreeNodeStateLeaf):
 
 class LeafAttributeOutputState(LeafAttributeState):
 
+    __slots__ = ()
+
     def init_state(self, value, node2statecls):
         self.bh_value = value
 
@@ -129,6 +292,8 @@ class LeafAttributeInputState(LeafAttributeState):
     InputState don't need to implement serialize.
     '''
 
+    __slots__ = ()
+
     def init_state(self, value=None, node2statecls=None):
         if isinstance(value, abc.Mapping):
             assert value['type'] == self.ATTR_TYPE
@@ -142,6 +307,163 @@ class LeafAttributeInputState(LeafAttributeState):
 
 class NestedAttributeState(BehaviorTreeNodeStateNested):
 
+    '''
+    In lazy mode, the value is kept pending until children are accessed.
+    Validation and serialization of a pending state walk through transient
+    children, without materializing them. `validate_and_serialize` does
+    both in a single walk.
+    '''
+
+    __slots__ = (
+        '_bh_pending', '_bh_lazy', '_bh_validated_for', '_bh_transient',
+    )
+
+    def __init__(self):
+        super().__init__()
+        self._bh_pending = None
+        self._bh_lazy = False
+        self._bh_validated_for = None
+        self._bh_transient = None
+
+    def init_state_lazily(self, value, node2statecls, validated_for=None):
+        self._bh_lazy = True
+        self._bh_pending = (value, node2statecls)
+        self._bh_transient = None
+        self._bh_validated_for = validated_for
+
+    @property
+    def bh_is_pending(self):
+        return self._bh_pending is not None
+
+    @property
+    def bh_validated_for(self):
+        '''
+        HTTP method whose attribute context the pending value has been
+        validated for, e.g. on parsing, None if unknown.
+        '''
+        if self._bh_pending is None:
+            return None
+        return self._bh_validated_for
+
+    def bh_materialize(self):
+        if self._bh_pending is not None:
+            value, node2statecls = self._bh_pending
+            self._bh_pending = None
+            self._bh_transient = None
+            self.init_state(value, node2statecls)
+
+    @property
+    def bh_children(self):
+        self.bh_materialize()
+        return super().bh_children
+
+    @property
+    def bh_named_children(self):
+        self.bh_materialize()
+        return super().bh_named_children
+
+    @property
+    def bh_children_size(self):
+        self.bh_materialize()
+        return super().bh_children_size
+
+    def bh_child(self, idx=0):
+        self.bh_materialize()
+        return super().bh_child(idx)
+
+    def bh_named_child(self, name):
+        self.bh_materialize()
+        return super().bh_named_child(name)
+
+    def bh_remove_named_child(self, name):
+        self.bh_materialize()
+        super().bh_remove_named_child(name)
+
+    def create_element_state(self, element_attr, element_value, node2statecls):
+        return create_attribute_state_tree(
+            element_attr,
+            element_value,
+            node2statecls,
+            lazy=self._bh_lazy,
+        )
+
+    def generate_element_states(self, value, node2statecls):
+        '''
+        Yield element states of value, should be overrided.
+        '''
+        return iter(())
+
+    def iter_element_attr_states(self):
+        '''
+        Element states, transient if this state is pending.
+        '''
+        if self._bh_pending is None:
+            yield from super().bh_children
+            return
+        if self._bh_transient is not None:
+            # kept during validate_and_serialize.
+            yield from self._bh_transient
+            return
+
+        value, node2statecls = self._bh_pending
+        for element_state in self.generate_element_states(
+            value, node2statecls,
+        ):
+            element_state._bh_parent = self
+            element_state._bh_root = self._bh_root
+            yield element_state
+
+    def element_attr_states_is_empty(self):
+        for _ in self.iter_element_attr_states():
+            return False
+        return True
+
+    def validate(self, attr_context, max_depth=None):
+        '''
+        Run `iter_validate` of nested states with an explicit stack, instead
+        of recursion.
+        '''
+        return _run_on_state_tree(
+            self,
+            lambda state: _start_validation(state, attr_context),
+            max_depth,
+        )
+
+    def iter_validate(self, attr_context):
+        '''
+        Yield element state to get its validation result, should be
+        overrided.
+        '''
+        raise NotImplementedError
+
+    def serialize(self, max_depth=None):
+        '''
+        Run `iter_serialize` of nested states with an explicit stack, instead
+        of recursion.
+        '''
+        return _run_on_state_tree(self, _start_serialization, max_depth)
+
+    def iter_serialize(self):
+        '''
+        Yield element state to get its serialized value, should be
+        overrided.
+        '''
+        raise NotImplementedError
+
+    def validate_and_serialize(self, attr_context, max_depth=None):
+        '''
+        Same as `validate` followed by `serialize`, walking through (transient)
+        children once. Return (is_valid, serialized value), the latter is None
+        if not valid.
+        '''
+        return _run_on_state_tree(
+            self,
+            lambda state: _start_validation_and_serialization(
+                state, attr_context,
+            ),
+            max_depth,
+        )
+
     @property
     def element_attrs(self):
         return self.bh_node.bh_children
@@ -156,14 +478,14 @@ class NestedAttributeState(BehaviorTreeNodeStateNested):
 
     @property
     def element_named_attrs(self):
-        return self.bh_node._bh_named_children
+        return self.bh_node.bh_named_children
 
     def element_named_attr(self, name):
         return self.bh_node.bh_named_child(name)
 
     @property
     def element_named_attr_states(self):
-        return self._bh_named_children
+        return self.bh_named_children
 
     def element_named_attr_state(self, name):
         return self.bh_named_child(name)
@@ -176,6 +498,9 @@ class NestedAttributeState(BehaviorTreeNodeStateNested):
 
 
 class BoolStateConfig:
+
+    __slots__ = ()
+
     BH_NODECLS = Bool
 
     ATTR_TYPE = 'bool'
@@ -183,14 +508,19 @@ class BoolStateConfig:
 
 
 class BoolStateForOutputDefault(BoolStateConfig, LeafAttributeOutputState):
-    pass
+
+    __slots__ = ()
 
 
 class BoolStateForInputDefault(BoolStateConfig, LeafAttributeInputState):
-    pass
+
+    __slots__ = ()
 
 
 class IntegerStateConfig:
+
+    __slots__ = ()
+
     BH_NODECLS = Integer
 
     ATTR_TYPE = 'integer'
@@ -199,15 +529,20 @@ class IntegerStateConfig:
 
 class IntegerStateForOutputDefault(IntegerStateConfig,
                                    LeafAttributeOutputState):
-    pass
+
+    __slots__ = ()
 
 
 class IntegerStateForInputDefault(IntegerStateConfig,
                                   LeafAttributeInputState):
-    pass
+
+    __slots__ = ()
 
 
 class FloatStateConfig:
+
+    __slots__ = ()
+
     BH_NODECLS = Float
 
     ATTR_TYPE = 'float'
@@ -215,14 +550,19 @@ class FloatStateConfig:
 
 
 class FloatStateForOutputDefault(FloatStateConfig, LeafAttributeOutputState):
-    pass
+
+    __slots__ = ()
 
 
 class FloatStateForInputDefault(FloatStateConfig, LeafAttributeInputState):
-    pass
+
+    __slots__ = ()
 
 
 class StringStateConfig:
+
+    __slots__ = ()
+
     BH_NODECLS = String
 
     ATTR_TYPE = 'string'
@@ -230,14 +570,19 @@ class StringStateConfig:
 
 
 class StringStateForOutputDefault(StringStateConfig, LeafAttributeOutputState):
-    pass
+
+    __slots__ = ()
 
 
 class StringStateForInputDefault(StringStateConfig, LeafAttributeInputState):
-    pass
+
+    __slots__ = ()
 
 
 class PrimitiveArrayStateConfig:
+
+    __slots__ = ()
+
     BH_NODECLS = PrimitiveArray
 
     ATTR_TYPE = 'primitive_array'
@@ -246,15 +591,20 @@ class PrimitiveArrayStateConfig:
 
 class PrimitiveArrayStateForOutputDefault(PrimitiveArrayStateConfig,
                                           LeafAttributeOutputState):
-    pass
+
+    __slots__ = ()
 
 
 class PrimitiveArrayStateForInputDefault(PrimitiveArrayStateConfig,
                                          LeafAttributeInputState):
-    pass
+
+    __slots__ = ()
 
 
 class PrimitiveObjectStateConfig:
+
+    __slots__ = ()
+
     BH_NODECLS = PrimitiveObject
 
     ATTR_TYPE = 'primitive_object'
@@ -263,15 +613,20 @@ class PrimitiveObjectStateConfig:
 
 class PrimitiveObjectStateForOutputDefault(PrimitiveArrayStateConfig,
                                            LeafAttributeOutputState):
-    pass
+
+    __slots__ = ()
 
 
 class PrimitiveObjectStateForInputDefault(PrimitiveObjectStateConfig,
                                           LeafAttributeInputState):
-    pass
+
+    __slots__ = ()
 
 
 class ArrayStateConfig:
+
+    __slots__ = ()
+
     BH_NODECLS = Array
 
     ATTR_TYPE = 'array'
@@ -279,6 +634,8 @@ class ArrayStateConfig:
 
 class ArrayStateCommon(ArrayStateConfig, NestedAttributeState):
 
+    __slots__ = ()
+
     def __getitem__(self, key):
         if isinstance(key, (int, slice)):
             return self.bh_child(key)
@@ -313,27 +670,47 @@ class ArrayStateCommon(ArrayStateConfig, NestedAttributeState):
         else:
             return not isinstance(self.bh_child(), NestedAttributeState)
 
-    def init_state_for_list(self, values, node2statecls):
+    @staticmethod
+    def can_abbr_by_element_types(element_types):
+        '''
+        `element_types`: list of (ATTR_TYPE, is_nested) of elements.
+        '''
+        if not element_types:
+            return False
+        else:
+            return not element_types[0][1]
+
+    def generate_element_states_for_list(self, values, node2statecls):
         assert isinstance(values, abc.Iterable)
+        if is_ndarray(values):
+            values = ndarray_tolist(values)
 
         element_attr = self.element_attr()
 
-        # recursive construction.
         for element_value in values:
-            element_state = create_attribute_state_tree(
+            yield self.create_element_state(
                 element_attr,
                 element_value,
                 node2statecls,
             )
+
+    def generate_element_states(self, values, node2statecls):
+        return self.generate_element_states_for_list(values, node2statecls)
+
+    def init_state_for_list(self, values, node2statecls):
+        # recursive construction.
+        for element_state in self.generate_element_states_for_list(
+            values, node2statecls,
+        ):
             self.bh_add_child(element_state)
 
     @nullable_processor
-    def validate(self, attr_context):
+    def iter_validate(self, attr_context):
         element_attrcls = self.element_attrcls()
-        for element_state in self.element_attr_states:
+        for element_state in self.iter_element_attr_states():
             if element_state.bh_nodecls is not element_attrcls:
                 return False
-            if not element_state.validate(attr_context):
+            if not (yield element_state):
                 return False
 
         return True
@@ -341,22 +718,36 @@ class ArrayStateCommon(ArrayStateConfig, NestedAttributeState):
 
 class ArrayStateForOutputDefault(ArrayStateCommon):
 
+    __slots__ = ()
+
     def init_state(self, values, node2statecls):
         self.init_state_for_list(values, node2statecls)
 
-    def serialize(self):
-        output_list = []
-
-        can_abbr = self.can_abbr()
-        element_attr_type = self.element_attr_type()
-
-        for element_state in self.element_attr_states:
-            element_value = element_state.serialize()
-
-            if can_abbr:
-                element_value = element_value['value']
+    def iter_serialize(self):
+        if not self.bh_is_pending:
+            can_abbr = self.can_abbr()
+            element_attr_type = self.element_attr_type()
+            output_list = []
+            for element_state in self.element_attr_states:
+                output_list.append((yield element_state))
+        else:
+            # walk through transient states, only types are kept.
+            output_list = []
+            element_types = []
+            for element_state in self.iter_element_attr_states():
+                output_list.append((yield element_state))
+                element_types.append((
+                    element_state.ATTR_TYPE,
+                    isinstance(element_state, NestedAttributeState),
+                ))
+            can_abbr = self.can_abbr_by_element_types(element_types)
+            element_attr_type = element_types[0][0] if element_types else None
 
-            output_list.append(element_value)
+        if can_abbr:
+            output_list = [
+                element_value['value']
+                for element_value in output_list
+            ]
 
         ret = {
             'type': self.ATTR_TYPE,
@@ -370,22 +761,35 @@ class ArrayStateForOutputDefault(ArrayStateCommon):
 
 class ArrayStateForInputDefault(ArrayStateCommon):
 
-    def init_state(self, values, node2statecls):
+    __slots__ = ('_cache_for_value',)
+
+    def unwrap_values(self, values):
         if isinstance(values, abc.Mapping):
             assert values['type'] == self.ATTR_TYPE
-            self.init_state_for_list(values['value'], node2statecls)
+            return values['value']
         else:
-            self.init_state_for_list(values, node2statecls)
+            return values
+
+    def generate_element_states(self, values, node2statecls):
+        return self.generate_element_states_for_list(
+            self.unwrap_values(values), node2statecls,
+        )
+
+    def init_state(self, values, node2statecls):
+        self.init_state_for_list(self.unwrap_values(values), node2statecls)
 
     def serialize(self):
         return None
 
     @property_with_cache
     def value(self):
-        return list(child.value for child in self)
+        return list(child.value for child in self.iter_element_attr_states())
 
 
 class TupleStateConfig:
+
+    __slots__ = ()
+
     BH_NODECLS = Tuple
 
     ATTR_TYPE = 'tuple'
@@ -393,6 +797,8 @@ class TupleStateConfig:
 
 class TupleStateCommon(TupleStateConfig):
 
+    __slots__ = ()
+
     def can_abbr(self):
         if self.bh_children_size == 0:
             return False
@@ -407,41 +813,56 @@ class TupleStateCommon(TupleStateConfig):
     def element_attr_name(self, idx):
         return self.bh_node.element_attr_name(idx)
 
-    def init_state_for_list(self, values, node2statecls):
+    @staticmethod
+    def can_abbr_by_element_types(element_types):
+        if not element_types:
+            return False
+
+        element_attr_type, is_nested = element_types[0]
+        for element_type, _ in element_types:
+            if element_attr_type != element_type:
+                return False
+
+        return not is_nested
+
+    def generate_element_states_for_list(self, values, node2statecls):
         assert isinstance(values, abc.Iterable)
+        if is_ndarray(values):
+            values = ndarray_tolist(values)
 
         if len(values) != self.element_attr_size:
             raise RuntimeError('tuple values not matched')
 
-        # recursive construction.
         for element_attr, element_value in zip(self.element_attrs, values):
-            element_state = create_attribute_state_tree(
+            yield self.create_element_state(
                 element_attr,
                 element_value,
                 node2statecls,
             )
-            self.bh_add_child(element_state)
 
     @nullable_processor
-    def validate(self, attr_context):
-
-        if len(self.element_attrs) != len(self.element_attr_states):
-            return False
+    def iter_validate(self, attr_context):
+        size = 0
+        for idx, element_state in enumerate(self.iter_element_attr_states()):
+            size += 1
+            if size > self.element_attr_size:
+                return False
 
-        for idx, element_state in enumerate(self.element_attr_states):
             element_attr = self.bh_relative_nodecls(
                 self.element_attr_name(idx),
             )
             if element_state.bh_nodecls is not element_attr:
                 return False
-            if not element_state.validate(attr_context):
+            if not (yield element_state):
                 return False
 
-        return True
+        return size == self.element_attr_size
 
 
 class TupleStateForOutputDefault(TupleStateCommon, ArrayStateForOutputDefault):
 
+    __slots__ = ()
+
     def init_state(self, values, node2statecls):
         self.init_state_for_list(values, node2statecls)
 
@@ -453,15 +874,22 @@ class TupleStateForInputDefault(TupleStateCommon, ArrayStateForInputDefault):
     been override in TupleStateCommon.
     '''
 
+    __slots__ = ()
+
     def serialize(self):
         return None
 
     @property_with_cache
     def value(self):
-        return tuple(child.value for child in self)
+        return tuple(
+            child.value for child in self.iter_element_attr_states()
+        )
 
 
 class ObjectStateConfig:
+
+    __slots__ = ()
+
     BH_NODECLS = Object
 
     ATTR_TYPE = 'object'
@@ -469,6 +897,8 @@ class ObjectStateConfig:
 
 class UnknownStatePlaceholderForObject(LeafAttributeState):
 
+    __slots__ = ()
+
     def __init__(self, name, value):
         super().__init__()
         self.bh_rename(name)
@@ -477,44 +907,44 @@ class UnknownStatePlaceholderForObject(LeafAttributeState):
 
 class ObjectStateCommon(ObjectStateConfig, NestedAttributeState):
 
-    def init_state(self, mapping, node2statecls):
+    __slots__ = ()
+
+    def generate_element_states(self, mapping, node2statecls):
         assert isinstance(mapping, abc.Mapping)
 
-        # recursive construction.
         for element_name, element_value in mapping.items():
             element_attr = self.element_named_attr(element_name)
 
             if element_attr:
-                element_state = create_attribute_state_tree(
+                yield self.create_element_state(
                     element_attr,
                     element_value,
                     node2statecls,
                 )
             else:
-                element_state = UnknownStatePlaceholderForObject(
+                yield UnknownStatePlaceholderForObject(
                     element_name, element_value,
                 )
 
+    def init_state(self, mapping, node2statecls):
+        # recursive construction.
+        for element_state in self.generate_element_states(
+            mapping, node2statecls,
+        ):
             self.bh_add_child(element_state)
 
     @nullable_processor
-    def validate(self, attr_context):
+    def iter_validate(self, attr_context):
         can_ignore_unknown = (
             attr_context.unknown(self.bh_node)
             is UnknowAttributeConfig.IGNORE
         )
 
-        all_attr_names = set(self.element_named_attrs)
-        all_state_names = set(self.element_named_attr_states)
-
-        # for missing keys.
-        for name in (all_attr_names - all_state_names):
-            attr = self.element_named_attr(name)
-            if attr_context.appear(attr) is AppearanceConfig.REQUIRE:
-                return False
+        all_state_names = set()
 
-        for name in all_state_names:
-            element_state = self.element_named_attr_state(name)
+        for element_state in self.iter_element_attr_states():
+            name = element_state.bh_name
+            all_state_names.add(name)
 
             # process unknown name.
             if isinstance(element_state, UnknownStatePlaceholderForObject):
@@ -528,10 +958,11 @@ class ObjectStateCommon(ObjectStateConfig, NestedAttributeState):
 
             if element_state.bh_nodecls is not element_attr:
                 return False
-            if not element_state.validate(attr_context):
+            if not (yield element_state):
                 return False
 
-        return True
+        # for missing keys.
+        return attr_context.required_children(self.bh_node) <= all_state_names
 
     def get(self, name):
         return self.__getattr__(name)
@@ -550,14 +981,16 @@ class ObjectStateCommon(ObjectStateConfig, NestedAttributeState):
 
 class ObjectStateForOutputDefault(ObjectStateCommon):
 
-    def serialize(self):
+    __slots__ = ()
+
+    def iter_serialize(self):
         ret = {}
-        for name, element_state in self.element_named_attr_states.items():
+        for element_state in self.iter_element_attr_states():
             # ignore unknown name.
             if isinstance(element_state, UnknownStatePlaceholderForObject):
                 continue
             # serialize element.
-            ret[name] = element_state.serialize()
+            ret[element_state.bh_name] = yield element_state
         return ret
 
 
@@ -568,14 +1001,16 @@ class ObjectStateForInputDefault(ObjectStateCommon):
     the same way to construct the state.
     '''
 
+    __slots__ = ('_cache_for_value',)
+
     def serialize(self):
         return None
 
     @property_with_cache
     def value(self):
         return {
-            name: child.value
-            for name, child in self.bh_named_children.items()
+            child.bh_name: child.value
+            for child in self.iter_element_attr_states()
         }
 
 
@@ -619,15 +1054,21 @@ def node2statecls_default_input():
     pass
 
 
-def create_attribute_state_tree_for_input(node, value):
+def create_attribute_state_tree_for_input(node, value, lazy=False,
+                                          max_depth=None):
     return create_attribute_state_tree(
         node, value,
         node2statecls_default_input,
+        lazy=lazy,
+        max_depth=max_depth,
     )
 
 
-def create_attribute_state_tree_for_output(node, value):
+def create_attribute_state_tree_for_output(node, value, lazy=False,
+                                           max_depth=None):
     return create_attribute_state_tree(
         node, value,
         node2statecls_default_output,
+        lazy=lazy,
+        max_depth=max_depth,
     )
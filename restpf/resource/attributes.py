@@ -40,6 +40,7 @@ special attributes:
 
 import collections.abc as abc
 import inspect
+from collections import deque
 
 from restpf.utils.constants import (
     HTTPMethodConfig,
@@ -47,8 +48,10 @@ from restpf.utils.constants import (
     UnknowAttributeConfig,
 )
 
-from restpf.utils.helper_functions import to_iterable
-from restpf.utils.helper_classes import ContextOperator
+from restpf.utils.helper_functions import (
+    to_iterable,
+    sparse_fields_cover,
+)
 from restpf.utils.behavior_tree import BehaviorTreeNode
 
 
@@ -118,6 +121,14 @@ class Attribute(BehaviorTreeNode):
         self._init_appearance_options()
         self._init_object_unknow_name_options()
 
+        # functions compiled from this node, see attribute_compilers.
+        self.compiled_cache = {}
+
+        # assigned by AttributeIndex.
+        self._path_id = None
+        self._interned_path = None
+        self._policy_tables = None
+
     def _generate_options_setter(self, enumcls):
 
         def setter(name, default):
@@ -154,24 +165,190 @@ class Attribute(BehaviorTreeNode):
     def name(self):
         return self.bh_name
 
+    def intern_path(self, path_id, path, index=None):
+        self._path_id = path_id
+        self._interned_path = path
+        if index is not None:
+            self._policy_tables = index.policy_tables
+
+    @property
+    def path_id(self):
+        '''
+        Integer id of this node in the index of its tree, None if not indexed.
+        '''
+        return self._path_id
+
+    @property
+    def bh_path(self):
+        path = self._interned_path
+        if path is None:
+            path = BehaviorTreeNode.bh_path.fget(self)
+        return path
+
+
+class AttributeIndex:
+
+    '''
+    Flat index of an attribute tree. Nodes are numbered in BFS order, the root
+    is 0, and each node is interned with its id and path, hence `bh_path` of
+    indexed nodes doesn't walk the parents.
+
+    `policy_tables`: HTTPMethodConfig -> AttributePolicyTable.
+
+    The tree should not be changed after indexing.
+    '''
+
+    def __init__(self, root):
+        self.nodes = []
+        self.path2node = {}
+        self.policy_tables = {}
+
+        queue = deque()
+        queue.append((root, ()))
+        while queue:
+            node, path = queue.popleft()
+            node.intern_path(len(self.nodes), path, self)
+            self.nodes.append(node)
+            self.path2node[path] = node
+
+            for name, child in node.bh_named_children.items():
+                queue.append((child, path + (name,)))
+
+        for http_method in HTTPMethodConfig:
+            self.policy_tables[http_method] = AttributePolicyTable(
+                self.nodes, http_method,
+            )
+
+    def __len__(self):
+        return len(self.nodes)
+
+    def node(self, path_id):
+        return self.nodes[path_id]
+
+    def lookup(self, path):
+        '''
+        `path`: sequence of names, return None if not found.
+        '''
+        if not isinstance(path, tuple):
+            path = tuple(path)
+        return self.path2node.get(path)
+
+    def path_id(self, path):
+        node = self.lookup(path)
+        return None if node is None else node.path_id
+
+
+def _appear_name(http_method):
+    return f'appear_in_{http_method.name.lower()}'
+
+
+def _unknown_name(http_method):
+    return f'unknown_in_{http_method.name.lower()}'
+
+
+def _required_children(node, appear):
+    return frozenset(
+        name
+        for name, child in node.bh_named_children.items()
+        if appear(child) is AppearanceConfig.REQUIRE
+    )
+
+
+class AttributePolicyTable:
+
+    '''
+    Options of the nodes of an indexed attribute tree for an HTTP method,
+    packed in lists indexed by `path_id`:
+
+    - `appearances`: AppearanceConfig of nodes.
+    - `unknowns`: UnknowAttributeConfig of nodes.
+    - `required_children`: frozenset of names of required children.
+    '''
+
+    __slots__ = ('appearances', 'unknowns', 'required_children')
+
+    def __init__(self, nodes, http_method):
+        appear_name = _appear_name(http_method)
+        unknown_name = _unknown_name(http_method)
+
+        self.appearances = [getattr(node, appear_name) for node in nodes]
+        self.unknowns = [getattr(node, unknown_name) for node in nodes]
+        self.required_children = [
+            _required_children(
+                node, lambda child: self.appearances[child._path_id],
+            )
+            for node in nodes
+        ]
+
+
+class AttributeContextOperator:
+
+    '''
+    Options of attributes for an HTTP method. Indexed attributes are looked up
+    in AttributePolicyTable, others fall back to their options.
+    '''
+
+    __slots__ = ('http_method', '_appear_name', '_unknown_name')
+
+    def __init__(self, http_method):
+        self.http_method = http_method
+        self._appear_name = _appear_name(http_method)
+        self._unknown_name = _unknown_name(http_method)
+
+    def appear(self, node):
+        tables = node._policy_tables
+        if tables is None:
+            return getattr(node, self._appear_name)
+        return tables[self.http_method].appearances[node._path_id]
+
+    def unknown(self, node):
+        tables = node._policy_tables
+        if tables is None:
+            return getattr(node, self._unknown_name)
+        return tables[self.http_method].unknowns[node._path_id]
+
+    def required_children(self, node):
+        '''
+        Names of required children of `node`.
+        '''
+        tables = node._policy_tables
+        if tables is None:
+            return _required_children(node, self.appear)
+        return tables[self.http_method].required_children[node._path_id]
+
+
+# shared by requests, see attribute_context.
+_attribute_contexts = {
+    http_method: AttributeContextOperator(http_method)
+    for http_method in HTTPMethodConfig
+}
+
+
+def attribute_context(http_method):
+    return _attribute_contexts[http_method]
+
+
+class SparseFieldsAttributeContext:
+
+    '''
+    Wraps AttributeContextOperator, attributes not covered by sparse fieldset
+    are considered as FREE.
+    '''
 
-def _generate_http_method_context_operator(method_prefix):
-    return {
-        HTTPMethodConfig.GET: f'{method_prefix}_in_get',
-        HTTPMethodConfig.PATCH: f'{method_prefix}_in_patch',
-        HTTPMethodConfig.POST: f'{method_prefix}_in_post',
-        HTTPMethodConfig.PUT: f'{method_prefix}_in_put',
-        HTTPMethodConfig.DELETE: f'{method_prefix}_in_delete',
-        HTTPMethodConfig.OPTIONS: f'{method_prefix}_in_options',
-    }
+    def __init__(self, attr_context, fields_tree):
+        self._attr_context = attr_context
+        self._fields_tree = fields_tree
 
+    def appear(self, node):
+        if not sparse_fields_cover(self._fields_tree, node.bh_path):
+            return AppearanceConfig.FREE
+        return self._attr_context.appear(node)
 
-class AttributeContextOperator(ContextOperator):
+    def unknown(self, node):
+        return self._attr_context.unknown(node)
 
-    OPERATION_MAPPING = {
-        'appear': _generate_http_method_context_operator('appear'),
-        'unknown': _generate_http_method_context_operator('unknown'),
-    }
+    def required_children(self, node):
+        return _required_children(node, self.appear)
 
 
 class LeafAttribute(Attribute):
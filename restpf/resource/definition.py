@@ -20,16 +20,26 @@ foo.username
 """
 
 import inspect
+from types import MappingProxyType
 
 from restpf.utils.constants import (
     HTTPMethodConfig,
     CallbackRegistrarOptions,
+    CallbackExecutorConfig,
 )
 from restpf.utils.helper_classes import (
-    TreeState,
+    LRUCache,
+)
+from restpf.utils.helper_functions import (
+    CallbackInvoker,
+    callback_invoker,
+)
+from restpf.utils.executors import (
+    default_callback_executors,
 )
 from .attributes import (
     Attribute,
+    AttributeIndex,
     Object,
     Integer,
     String,
@@ -89,6 +99,15 @@ class CallbackRegistrar:
         - run_after: Assign a callback that was registered. Then this callback
         is guaranteed to be executed after that callback.
         - after_all: Similar to before_all, but for the last execution.
+        - executor: One of CallbackExecutorConfig, for the execution of
+        synchronous callback. See restpf.utils.executors.
+        - batch: For pipelines of multiple resources. If is set, this callback
+        will be called once with `resource_ids` and should return a mapping of
+        resource_id -> value, instead of being called once per resource.
+        - cache_ttl: For GET. If is set, the return of this callback is
+        memoized per resource id for `cache_ttl` seconds, and dropped when the
+        resource is modified by other pipelines.
+        - cache_max_entries: Bound of memoized resource ids, 1024 by default.
         '''
 
         if callback:
@@ -110,36 +129,93 @@ class CallbackRegistrar:
             return _closure
 
 
+# lookup result of unregistered callback.
+_NOT_REGISTERED = (None, None)
+
+
 class CallbackInformation:
 
     def __init__(self, attr_obj):
         '''
-        (['next', [..., ]] 'value') => (callback, options)
+        (path, context) => (callback, options), compiled into a read-only
+        (path_id, context) => (callback, options) table on freezing.
         '''
-        self._registered_callback = TreeState()
+        self._registered_callback = {}
+        self._frozen_callbacks = None
+        self._index = None
+        # callback -> CallbackInvoker, compiled on registration.
+        self._invokers = {}
+        # bumped on every registration, to invalidate compiled plans.
+        self.version = 0
 
-    def _locate_registered_callback_tree(self, path):
-        return self._registered_callback.touch(path, default={})
+    @property
+    def frozen(self):
+        return self._frozen_callbacks is not None
+
+    def freeze(self, index):
+        '''
+        `index`: AttributeIndex of the attribute tree.
+        '''
+        if self.frozen:
+            return
+
+        self._index = index
+        self._frozen_callbacks = MappingProxyType({
+            (index.path_id(path), context): callback_and_options
+            for (path, context), callback_and_options
+            in self._registered_callback.items()
+        })
 
     def _set_callback_and_options(self, path, context, callback, options):
         assert isinstance(context, HTTPMethodConfig)
 
-        obj = self._locate_registered_callback_tree(path)
-        obj.value[context] = (callback, options)
+        self._registered_callback[(tuple(path), context)] = \
+            (callback, options)
 
     def get_registered_callback_and_options(self, path, context):
         assert isinstance(context, HTTPMethodConfig)
 
-        obj = self._locate_registered_callback_tree(path)
-        return obj.value.get(context, (None, None))
+        if self._frozen_callbacks is not None:
+            return self.get_registered_callback_and_options_by_id(
+                self._index.path_id(path), context,
+            )
+        return self._registered_callback.get(
+            (tuple(path), context), _NOT_REGISTERED,
+        )
+
+    def get_registered_callback_and_options_by_id(self, path_id, context):
+        '''
+        Only available after freezing.
+        '''
+        return self._frozen_callbacks.get((path_id, context), _NOT_REGISTERED)
+
+    def registered_options(self):
+        '''
+        Options of all registered callbacks.
+        '''
+        return [options for _, options in self._registered_callback.values()]
+
+    def get_callback_invoker(self, callback):
+        invoker = self._invokers.get(callback)
+        if invoker is None:
+            invoker = callback_invoker(callback)
+        return invoker
 
     def register_callback(self, callback_registrar):
+        if self.frozen:
+            raise RuntimeError('cannot register callback after freezing.')
+
+        callback = callback_registrar.callback
+        if callback not in self._invokers:
+            self._invokers[callback] = CallbackInvoker(callback)
+
         self._set_callback_and_options(
             callback_registrar.attr_path,
             callback_registrar.context,
             callback_registrar.callback,
             callback_registrar.options,
         )
+        self.version += 1
 
 
 class SpecialHooksCallbackInformation(CallbackInformation):
@@ -169,6 +245,7 @@ class AttributeCollection:
             raise RuntimeError('TODO: AttributeCollection.__init__')
 
         self._callback_info = CallbackInformation(self._attr_obj)
+        self._index = None
 
     def _check_attr_obj(self, attr_obj):
         return True
@@ -177,6 +254,21 @@ class AttributeCollection:
     def attr_obj(self):
         return self._attr_obj
 
+    def build_index(self):
+        if self._index is None:
+            self._index = AttributeIndex(self._attr_obj)
+        return self._index
+
+    @property
+    def index(self):
+        '''
+        Flat path -> node, id -> node index, see AttributeIndex.
+        '''
+        return self.build_index()
+
+    def get_callback_invoker(self, callback):
+        return self._callback_info.get_callback_invoker(callback)
+
     @property
     def collection_name(self):
         return self.COLLECTION_NAME
@@ -189,6 +281,33 @@ class AttributeCollection:
             path, context,
         )
 
+    def get_registered_callback_and_options_of_attr(self, attr, context):
+        '''
+        `attr`: node of `attr_obj`, looked up by `path_id` once frozen.
+        '''
+        callback_info = self._callback_info
+        if callback_info.frozen:
+            return callback_info.get_registered_callback_and_options_by_id(
+                attr.path_id, context,
+            )
+        return callback_info.get_registered_callback_and_options(
+            attr.bh_path, context,
+        )
+
+    @property
+    def frozen(self):
+        return self._callback_info.frozen
+
+    def registered_options(self):
+        return self._callback_info.registered_options()
+
+    def freeze(self):
+        self._callback_info.freeze(self.build_index())
+
+    @property
+    def callbacks_version(self):
+        return self._callback_info.version
+
 
 class Attributes(AttributeCollection):
 
@@ -262,12 +381,19 @@ class SpecialHooks(AttributeCollection):
 # TODO: refactor class attribute definitions.
 class Resource:
 
+    # upper bound of cached plans and candidates, for different sparse
+    # fieldsets and shapes of input state.
+    MAX_CACHED_PLANS = 256
+
     def __init__(self,
                  name,
                  attributes,
                  relationships=None,
                  id_attr=Integer,
-                 id_appear_in_post=AppearanceConfig.PROHIBITE):
+                 id_appear_in_post=AppearanceConfig.PROHIBITE,
+                 callback_executors=None,
+                 coalesce_pipelines=False,
+                 representation_cache=None):
 
         self.name = name
 
@@ -278,6 +404,26 @@ class Resource:
         self._relationships = relationships or Relationships()
         self._special_hooks = SpecialHooks()
 
+        self._callback_executors = callback_executors
+        # opt-in, coalesce concurrent identical pipelines, see
+        # PipelineRunner.coalescing_key. Callers share the same pipeline and
+        # representation, callbacks run once for all of them.
+        self.coalesce_pipelines = coalesce_pipelines
+        # see restpf.pipeline.caches.RepresentationCache.
+        self.representation_cache = representation_cache
+        # callback -> LRUCache of resource_id -> memoized return.
+        self.callback_memos = {}
+
+        self._execution_plan_cache = self._create_execution_plan_cache()
+        self._execution_plan_cache_version = None
+
+        # assign ids and paths to nodes of attribute trees.
+        for attr_collection in (
+            self._attributes, self._relationships, self._special_hooks,
+        ):
+            attr_collection.build_index()
+        AttributeIndex(self.id_obj)
+
     def _generate_id_obj(self, id_attr, id_appear_in_post):
         if id_attr not in (Integer, String) and \
                 not isinstance(id_attr, (Integer, String)):
@@ -305,6 +451,64 @@ class Resource:
     def special_hooks_obj(self):
         return self._special_hooks
 
+    @property
+    def callback_executors(self):
+        return self._callback_executors or default_callback_executors
+
+    def freeze(self):
+        '''
+        Compile registered callbacks into read-only tables keyed by
+        `path_id`, registering callbacks afterwards raises RuntimeError.
+        '''
+        for attr_collection in (
+            self._attributes, self._relationships, self._special_hooks,
+        ):
+            attr_collection.freeze()
+
+    @property
+    def frozen(self):
+        return self._attributes.frozen
+
+    def callback_executor_configs(self):
+        '''
+        CallbackExecutorConfig of callbacks registered with `executor`.
+        '''
+        ret = set()
+        for attr_collection in (
+            self._attributes, self._relationships, self._special_hooks,
+        ):
+            for options in attr_collection.registered_options():
+                executor = (options or {}).get(
+                    CallbackRegistrarOptions.EXECUTOR.value,
+                )
+                if executor is not None:
+                    ret.add(CallbackExecutorConfig(executor))
+        return ret
+
+    @property
+    def callbacks_version(self):
+        return (
+            self._attributes.callbacks_version,
+            self._relationships.callbacks_version,
+            self._special_hooks.callbacks_version,
+        )
+
+    def _create_execution_plan_cache(self):
+        return LRUCache(max_entries=self.MAX_CACHED_PLANS)
+
+    @property
+    def execution_plan_cache(self):
+        '''
+        LRU cache of compiled execution plans, dropped whenever a new callback
+        is registered to this resource.
+        '''
+        version = self.callbacks_version
+        if version != self._execution_plan_cache_version:
+            self._execution_plan_cache = \
+                self._create_execution_plan_cache()
+            self._execution_plan_cache_version = version
+        return self._execution_plan_cache
+
     def __getattribute__(self, name):
         if name in ('attributes', 'relationships', 'special_hooks'):
             # for callback registrater.
@@ -7,7 +7,7 @@ classes:
 BehaviorTreeRoot is a special case of BehaviorTreeNode.
 """
 
-from restpf.utils.helper_classes import LinkedPath
+from types import MappingProxyType
 
 
 class classproperty:
@@ -19,18 +19,38 @@ class classproperty:
         return self._f(owner)
 
 
+# shared by nodes without children.
+_EMPTY_CHILDREN = ()
+_EMPTY_NAMED_CHILDREN = MappingProxyType({})
+
+
 class BehaviorTreeNode:
 
+    '''
+    Compact node, since a state tree could contain a large number of nodes:
+
+    - attributes are stored in slots.
+    - path is derived from parents on demand.
+    - containers of children are allocated on adding the first child.
+    '''
+
+    __slots__ = (
+        '_bh_name',
+        '_bh_root',
+        '_bh_parent',
+        '_bh_children',
+        '_bh_named_children',
+        '__weakref__',
+    )
+
     def __init__(self):
         self._bh_name = type(self).__name__.lower()
 
         self._bh_root = None
         self._bh_parent = None
 
-        self._bh_children = []
-        self._bh_named_children = {}
-
-        self._bh_linked_path = LinkedPath()
+        self._bh_children = None
+        self._bh_named_children = None
 
     def bh_rename(self, name):
         self._bh_name = name
@@ -39,50 +59,65 @@ class BehaviorTreeNode:
     def bh_name(self):
         return self._bh_name
 
+    @property
+    def bh_parent(self):
+        return self._bh_parent
+
     def bh_add_child(self, child):
         assert isinstance(child, BehaviorTreeNode)
 
         child._bh_parent = self
         child._bh_root = self._bh_root
-        child._bh_linked_path.set_name_and_parent(
-            child._bh_name,
-            self._bh_linked_path,
-        )
+
+        if self._bh_children is None:
+            self._bh_children = []
+            self._bh_named_children = {}
 
         self._bh_children.append(child)
         self._bh_named_children[child._bh_name] = child
 
     @property
     def bh_children(self):
-        return self._bh_children
+        return self._bh_children or _EMPTY_CHILDREN
 
     @property
     def bh_named_children(self):
-        return self._bh_named_children
+        return self._bh_named_children or _EMPTY_NAMED_CHILDREN
 
     @property
     def bh_children_size(self):
-        return len(self._bh_children)
+        return len(self._bh_children) if self._bh_children else 0
 
     def bh_child(self, idx=0):
-        return self._bh_children[idx]
+        return self.bh_children[idx]
 
     def bh_named_child(self, name):
+        if self._bh_named_children is None:
+            return None
         return self._bh_named_children.get(name)
 
     def bh_remove_named_child(self, name):
-        self._bh_named_children.pop(name, None)
+        if self._bh_named_children is not None:
+            self._bh_named_children.pop(name, None)
 
     @property
     def bh_path(self):
-        if self._bh_linked_path is None:
-            return []
-        else:
-            return iter(self._bh_linked_path)
+        '''
+        Names from root (excluded) to this node.
+        '''
+        path = []
+        node = self
+        while node._bh_parent is not None:
+            path.append(node._bh_name)
+            node = node._bh_parent
+        path.reverse()
+        return tuple(path)
 
 
 class BehaviorTreeRoot(BehaviorTreeNode):
 
+    __slots__ = ()
+
     def __init__(self):
         super().__init__()
         self._bh_root = self
@@ -90,6 +125,8 @@ class BehaviorTreeRoot(BehaviorTreeNode):
 
 class BehaviorTreeNodeState(BehaviorTreeNode):
 
+    __slots__ = ('_bh_node',)
+
     BH_NODECLS = None
 
     def __init__(self):
@@ -126,6 +163,8 @@ class BehaviorTreeNodeState(BehaviorTreeNode):
 
 class BehaviorTreeNodeStateLeaf(BehaviorTreeNodeState):
 
+    __slots__ = ('_bh_value',)
+
     def _set_bh_value(self, value):
         self._bh_value = value
 
@@ -136,4 +175,5 @@ class BehaviorTreeNodeStateLeaf(BehaviorTreeNodeState):
 
 
 class BehaviorTreeNodeStateNested(BehaviorTreeNodeState):
-    pass
+
+    __slots__ = ()
@@ -41,6 +41,25 @@ class CallbackRegistrarOptions(EnumByLowerCaseName):
     BEFORE_ALL = auto()
     AFTER_ALL = auto()
     RUN_AFTER = auto()
+    EXECUTOR = auto()
+    BATCH = auto()
+    CACHE_TTL = auto()
+    CACHE_MAX_ENTRIES = auto()
+
+
+class CallbackExecutorConfig(EnumByLowerCaseName):
+
+    INLINE = auto()
+    THREAD = auto()
+    PROCESS = auto()
+
+
+class CallbackSchedulerConfig(EnumByUpperCaseName):
+
+    # run parallel groups one after another.
+    LAYERED = auto()
+    # run a callback as soon as all its dependencies are completed.
+    DATAFLOW = auto()
 
 
 class TopologySearchColor(Enum):
@@ -0,0 +1,55 @@
+"""
+Incremental JSON encoding of representations.
+
+- iter_json: value -> JSON text pieces.
+- iter_chunks: JSON text pieces -> UTF-8 byte chunks of bounded size, to be
+written to a chunked response as data is produced.
+
+Output is compact, e.g. `{"a":[1,2]}`, NumPy ndarray is encoded as list.
+"""
+
+import json
+
+from restpf.utils.helper_functions import (
+    is_ndarray,
+    ndarray_tolist,
+)
+
+
+DEFAULT_CHUNK_SIZE = 64 * 1024
+
+
+def _default(value):
+    if is_ndarray(value):
+        return ndarray_tolist(value)
+    raise TypeError(f'{type(value).__name__} is not JSON serializable')
+
+
+_json_encoder = json.JSONEncoder(
+    separators=(',', ':'),
+    default=_default,
+)
+
+
+def dumps_json(value):
+    return _json_encoder.encode(value)
+
+
+def iter_json(value):
+    return _json_encoder.iterencode(value)
+
+
+def iter_chunks(pieces, chunk_size=DEFAULT_CHUNK_SIZE):
+    '''
+    Join text pieces into byte chunks, each chunk except the last one has
+    exactly `chunk_size` bytes.
+    '''
+    buf = bytearray()
+    for piece in pieces:
+        buf += piece.encode('utf-8')
+        while len(buf) >= chunk_size:
+            yield bytes(buf[:chunk_size])
+            del buf[:chunk_size]
+
+    if buf:
+        yield bytes(buf)
@@ -0,0 +1,413 @@
+"""
+Executors for synchronous callbacks.
+
+- INLINE: call on the event loop (default).
+- THREAD: call in a bounded thread pool.
+- PROCESS: call in a bounded process pool, for CPU-bound callbacks.
+
+Coroutine callbacks are always awaited on the event loop.
+
+The executor of a callback is resolved in following order:
+
+1. the `executor` option of registrar, e.g.
+`@resource.attributes.foo.GET(executor='thread')`.
+2. the default of `CallbackExecutorManager` bound to resource, e.g.
+`Resource(..., callback_executors=CallbackExecutorManager(default='thread'))`.
+3. the default of `default_callback_executors`.
+"""
+
+import asyncio
+import os
+import pickle
+import threading
+import time
+import weakref
+from collections import (
+    deque,
+    namedtuple,
+)
+from concurrent.futures import (
+    ThreadPoolExecutor,
+    ProcessPoolExecutor,
+)
+from functools import partial
+
+from restpf.utils.constants import CallbackExecutorConfig
+from restpf.utils.behavior_tree import (
+    BehaviorTreeNode,
+    BehaviorTreeNodeState,
+)
+from restpf.utils.helper_functions import callback_signature
+
+
+ExecutorMetrics = namedtuple(
+    'ExecutorMetrics',
+    [
+        # configurations.
+        'max_workers',
+        'max_in_flight',
+        # callbacks running in workers.
+        'active',
+        # callbacks submitted to the pool, including the active ones.
+        'in_flight',
+        # callbacks blocked by the bound of pool.
+        'waiting',
+        'submitted',
+        'completed',
+        'peak_in_flight',
+    ],
+)
+
+
+class _SharedSemaphore:
+
+    '''
+    Semaphore shared by event loops, e.g. loops of different threads or a
+    restarted server. Waiters are suspended in their own loop and woken in
+    FIFO order.
+    '''
+
+    def __init__(self, value):
+        self._lock = threading.Lock()
+        self._value = value
+        # (loop, future) of suspended waiters.
+        self._waiters = deque()
+
+    async def acquire(self):
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            if self._value > 0 and not self._waiters:
+                self._value -= 1
+                return
+            future = loop.create_future()
+            self._waiters.append((loop, future))
+
+        try:
+            await future
+        except asyncio.CancelledError:
+            with self._lock:
+                try:
+                    self._waiters.remove((loop, future))
+                except ValueError:
+                    # handed over already.
+                    if future.done() and not future.cancelled():
+                        self._release()
+            raise
+
+    def release(self):
+        with self._lock:
+            self._release()
+
+    def _release(self):
+        # hand over to the first waiter whose loop is alive.
+        while self._waiters:
+            loop, future = self._waiters.popleft()
+            try:
+                loop.call_soon_threadsafe(self._wake_up, future)
+                return
+            except RuntimeError:
+                # loop is closed.
+                continue
+        self._value += 1
+
+    def _wake_up(self, future):
+        if future.cancelled():
+            # waiter is gone, pass on.
+            self.release()
+        else:
+            future.set_result(None)
+
+
+class _BoundedExecutor:
+
+    '''
+    Executor with a bound on the number of submitted callbacks. Callers are
+    suspended (not blocking the event loop) when the bound is reached. The
+    bound is shared by all event loops using the executor.
+    '''
+
+    def __init__(self, max_workers=None, max_queue_size=None):
+        self.max_workers = max_workers or self._default_max_workers()
+        if max_queue_size is None:
+            max_queue_size = self.max_workers
+        self.max_in_flight = self.max_workers + max_queue_size
+
+        self._executor = None
+        self._semaphore = _SharedSemaphore(self.max_in_flight)
+
+        self._in_flight = 0
+        self._waiting = 0
+        self._submitted = 0
+        self._completed = 0
+        self._peak_in_flight = 0
+
+    def _default_max_workers(self):
+        raise NotImplementedError
+
+    def _create_executor(self):
+        raise NotImplementedError
+
+    def _get_executor(self):
+        if self._executor is None:
+            self._executor = self._create_executor()
+        return self._executor
+
+    def _prepare(self, func, kwargs):
+        '''
+        return the callable to be submitted.
+        '''
+        raise NotImplementedError
+
+    def _active(self):
+        raise NotImplementedError
+
+    async def run(self, func, kwargs):
+        submitted_callable = self._prepare(func, kwargs)
+        loop = asyncio.get_running_loop()
+        semaphore = self._semaphore
+
+        self._waiting += 1
+        try:
+            await semaphore.acquire()
+        finally:
+            self._waiting -= 1
+
+        self._in_flight += 1
+        self._submitted += 1
+        self._peak_in_flight = max(self._peak_in_flight, self._in_flight)
+        try:
+            return await loop.run_in_executor(
+                self._get_executor(), submitted_callable,
+            )
+        finally:
+            self._in_flight -= 1
+            self._completed += 1
+            semaphore.release()
+
+    def metrics(self):
+        return ExecutorMetrics(
+            max_workers=self.max_workers,
+            max_in_flight=self.max_in_flight,
+            active=self._active(),
+            in_flight=self._in_flight,
+            waiting=self._waiting,
+            submitted=self._submitted,
+            completed=self._completed,
+            peak_in_flight=self._peak_in_flight,
+        )
+
+    def shutdown(self, wait=True):
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait)
+            self._executor = None
+
+
+class BoundedThreadPoolExecutor(_BoundedExecutor):
+
+    def __init__(self, max_workers=None, max_queue_size=None):
+        super().__init__(max_workers, max_queue_size)
+
+        self._active_lock = threading.Lock()
+        self._active_count = 0
+
+    def _default_max_workers(self):
+        return min(32, (os.cpu_count() or 1) + 4)
+
+    def _create_executor(self):
+        return ThreadPoolExecutor(max_workers=self.max_workers)
+
+    def _run_in_worker(self, func, kwargs):
+        with self._active_lock:
+            self._active_count += 1
+        try:
+            return func(**kwargs)
+        finally:
+            with self._active_lock:
+                self._active_count -= 1
+
+    def _prepare(self, func, kwargs):
+        return partial(self._run_in_worker, func, kwargs)
+
+    def _active(self):
+        return self._active_count
+
+
+def _call_in_process(func, kwargs):
+    return func(**kwargs)
+
+
+def _warm_up_process():
+    # keep the worker busy for a while, so that every warm up task is
+    # executed by a different worker.
+    time.sleep(0.01)
+    return os.getpid()
+
+
+def _to_process_kwarg(value):
+    # swap tree nodes for plain values.
+    if isinstance(value, BehaviorTreeNodeState):
+        # lookup on class, since state may override __getattr__.
+        statecls = type(value)
+        if getattr(statecls, 'value', None) is not None:
+            return value.value
+        if getattr(statecls, 'serialize', None) is not None:
+            # output states, e.g. nested ones, have no raw value.
+            return value.serialize()
+        raise RuntimeError(
+            f'{statecls.__name__} cannot be sent to process.',
+        )
+    elif isinstance(value, BehaviorTreeNode):
+        return tuple(value.bh_path)
+    else:
+        return value
+
+
+class BoundedProcessPoolExecutor(_BoundedExecutor):
+
+    '''
+    For CPU-bound callbacks. The callback itself must be picklable (defined at
+    module level), and it receives a picklable subset of kwargs:
+
+    - `attr` is replaced by its path (tuple of names).
+    - `state` is replaced by its value, or its serialized value if it has
+    none (output states).
+    - other unpicklable kwargs are dropped, raise if the callback requires it.
+
+    Picklability of the callback is tested once, kwargs are tested on every
+    call.
+    '''
+
+    def __init__(self, max_workers=None, max_queue_size=None, mp_context=None):
+        super().__init__(max_workers, max_queue_size)
+        self._mp_context = mp_context
+        # callbacks tested to be picklable.
+        self._picklable_funcs = weakref.WeakSet()
+
+    def _default_max_workers(self):
+        return os.cpu_count() or 1
+
+    def _create_executor(self):
+        return ProcessPoolExecutor(
+            max_workers=self.max_workers,
+            mp_context=self._mp_context,
+        )
+
+    def start(self):
+        '''
+        Start and warm up all workers. Blocking, should be called before
+        serving.
+        '''
+        executor = self._get_executor()
+        futures = [
+            executor.submit(_warm_up_process)
+            for _ in range(self.max_workers)
+        ]
+        return set(future.result() for future in futures)
+
+    def _prepare(self, func, kwargs):
+        if func not in self._picklable_funcs:
+            try:
+                pickle.dumps(func)
+            except Exception:
+                raise RuntimeError(
+                    f'{func} is not picklable, cannot be run in process.',
+                )
+            try:
+                self._picklable_funcs.add(func)
+            except TypeError:
+                # not weakly referenceable, e.g. builtins.
+                pass
+
+        required = callback_signature(func).params_without_default
+
+        process_kwargs = {}
+        for name, value in kwargs.items():
+            value = _to_process_kwarg(value)
+            try:
+                pickle.dumps(value)
+            except Exception:
+                if name in required:
+                    raise RuntimeError(
+                        f'kwarg {name} is not picklable, '
+                        'cannot be sent to process.',
+                    )
+                continue
+            process_kwargs[name] = value
+
+        return partial(_call_in_process, func, process_kwargs)
+
+    def _active(self):
+        return min(self._in_flight, self.max_workers)
+
+
+class CallbackExecutorManager:
+
+    def __init__(self,
+                 default=CallbackExecutorConfig.INLINE,
+                 thread_pool_size=None,
+                 thread_pool_queue_size=None,
+                 process_pool_size=None,
+                 process_pool_queue_size=None):
+
+        self.default = CallbackExecutorConfig(default)
+
+        self._thread_pool_size = thread_pool_size
+        self._thread_pool_queue_size = thread_pool_queue_size
+        self._thread_pool = None
+
+        self._process_pool_size = process_pool_size
+        self._process_pool_queue_size = process_pool_queue_size
+        self._process_pool = None
+
+    @property
+    def thread_pool(self):
+        if self._thread_pool is None:
+            self._thread_pool = BoundedThreadPoolExecutor(
+                max_workers=self._thread_pool_size,
+                max_queue_size=self._thread_pool_queue_size,
+            )
+        return self._thread_pool
+
+    @property
+    def process_pool(self):
+        if self._process_pool is None:
+            self._process_pool = BoundedProcessPoolExecutor(
+                max_workers=self._process_pool_size,
+                max_queue_size=self._process_pool_queue_size,
+            )
+        return self._process_pool
+
+    def start(self, *resources):
+        '''
+        Warm up the process pool, if it is the default executor, or any
+        callback of `resources` is registered with `executor='process'`.
+        Blocking, should be called explicitly before serving.
+        '''
+        configs = {self.default}
+        for resource in resources:
+            configs |= resource.callback_executor_configs()
+
+        if CallbackExecutorConfig.PROCESS in configs:
+            self.process_pool.start()
+
+    def select(self, config=None):
+        '''
+        return executor for `config`, None for running inline.
+        '''
+        config = self.default if config is None \
+            else CallbackExecutorConfig(config)
+
+        if config is CallbackExecutorConfig.THREAD:
+            return self.thread_pool
+        elif config is CallbackExecutorConfig.PROCESS:
+            return self.process_pool
+        else:
+            return None
+
+    def shutdown(self, wait=True):
+        for pool in (self._thread_pool, self._process_pool):
+            if pool is not None:
+                pool.shutdown(wait=wait)
+
+
+default_callback_executors = CallbackExecutorManager()
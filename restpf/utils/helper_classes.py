@@ -1,7 +1,10 @@
+import asyncio
 import collections.abc as abc
 import operator
 import copy
 import inspect
+import time
+from collections import OrderedDict
 
 from .helper_functions import method_named_args
 
@@ -40,27 +43,6 @@ class ContextOperator:
             return operator.attrgetter(op_proxy)
 
 
-class LinkedPath:
-
-    def __init__(self):
-        self.empty = True
-
-    def set_name_and_parent(self, name, parent):
-        self.empty = False
-        self.name = name
-        self.parent = parent
-
-    def __iter__(self):
-        node = self
-        path = []
-
-        while not node.empty:
-            path.append(node.name)
-            node = node.parent
-
-        return reversed(path)
-
-
 class TreeState:
 
     _NEXT = '__next'
@@ -145,10 +127,20 @@ class ProxyStateOperator:
     def _get_proxy_attrs(cls):
         return cls.PROXY_ATTRS
 
-    def _cache_hierarchy_proxy_attrs(self):
+    @classmethod
+    def _hierarchy_proxy_attrs(cls):
+        # walk the MRO once per class.
+        ret = cls.__dict__.get('_pso_hierarchy_proxy_attrs')
+        if ret is None:
+            ret = cls._collect_hierarchy_proxy_attrs()
+            cls._pso_hierarchy_proxy_attrs = ret
+        return ret
+
+    @classmethod
+    def _collect_hierarchy_proxy_attrs(cls):
         ret = {}
 
-        for _cls in type(self).__mro__:
+        for _cls in cls.__mro__:
             proxy_attrs_accessor = getattr(_cls, '_get_proxy_attrs', None)
             if proxy_attrs_accessor is None:
                 continue
@@ -158,9 +150,8 @@ class ProxyStateOperator:
                     name = attr
                     default = None
                 elif isinstance(attr, abc.Sequence) and len(attr) == 2:
+                    # class default is instantiated on binding.
                     name, default = attr
-                    if inspect.isclass(default):
-                        default = default()
                 else:
                     raise RuntimeError("wrong format of PROXY_ATTRS.")
 
@@ -169,14 +160,19 @@ class ProxyStateOperator:
         return ret
 
     def bind_proxy_state(self, state):
-        # cache PROXY_ATTRS.
-        self.PROXY_ATTRS = self._cache_hierarchy_proxy_attrs()
+        '''
+        Could be called again to swap the bound state.
+        '''
+        # cache PROXY_ATTRS, shared by instances of the same class.
+        self.PROXY_ATTRS = type(self)._hierarchy_proxy_attrs()
         # bind state.
         self._pso_proxy_state = state
         # __getattribute__ works now.
         # bind default value.
         for name, default in self.PROXY_ATTRS.items():
             if getattr(self, name) is None:
+                if inspect.isclass(default):
+                    default = default()
                 setattr(self, name, default)
 
     def __getattribute__(self, name):
@@ -203,6 +199,129 @@ class ProxyStateOperator:
             object.__setattr__(self, name, value)
 
 
+class SingleFlight:
+
+    '''
+    Coalesce concurrent calls with the same key: while a call is in flight,
+    later callers await the same result (or exception) instead of starting a
+    new one.
+    '''
+
+    def __init__(self):
+        self._key2task = {}
+
+    def in_flight(self, key):
+        return key in self._key2task
+
+    async def run(self, key, coroutine_factory):
+        task = self._key2task.get(key)
+
+        if task is None:
+            task = asyncio.ensure_future(coroutine_factory())
+            self._key2task[key] = task
+
+            def _release(_):
+                if self._key2task.get(key) is task:
+                    del self._key2task[key]
+
+            task.add_done_callback(_release)
+
+        # cancellation of one caller should not affect others.
+        return await asyncio.shield(task)
+
+
+class LRUCache:
+
+    '''
+    Mapping with LRU eviction, bounded by number of entries and/or estimated
+    bytes (by `sizeof`). Entries expire after `ttl` seconds if set.
+    '''
+
+    _MISSING = object()
+
+    def __init__(self,
+                 max_entries=None,
+                 max_bytes=None,
+                 ttl=None,
+                 sizeof=None,
+                 timer=time.monotonic):
+
+        if max_bytes is not None and sizeof is None:
+            raise RuntimeError('sizeof is required by max_bytes.')
+
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+
+        self._sizeof = sizeof
+        self._timer = timer
+
+        # key -> (value, expire_at, size)
+        self._data = OrderedDict()
+        self._bytes = 0
+
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        return self.get(key, self._MISSING) is not self._MISSING
+
+    @property
+    def bytes(self):
+        return self._bytes
+
+    def get(self, key, default=None):
+        item = self._data.get(key)
+        if item is None:
+            self.misses += 1
+            return default
+
+        value, expire_at, _ = item
+        if expire_at is not None and expire_at <= self._timer():
+            self.pop(key)
+            self.misses += 1
+            return default
+
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key, value):
+        self.pop(key)
+
+        size = self._sizeof(value) if self._sizeof else 0
+        if self.max_bytes is not None and size > self.max_bytes:
+            # never fit.
+            return
+
+        expire_at = None if self.ttl is None else self._timer() + self.ttl
+        self._data[key] = (value, expire_at, size)
+        self._bytes += size
+
+        while (
+            (self.max_entries is not None
+             and len(self._data) > self.max_entries) or
+            (self.max_bytes is not None
+             and self._bytes > self.max_bytes)
+        ):
+            _, (_, _, evicted_size) = self._data.popitem(last=False)
+            self._bytes -= evicted_size
+
+    def pop(self, key, default=None):
+        item = self._data.pop(key, None)
+        if item is None:
+            return default
+        self._bytes -= item[2]
+        return item[0]
+
+    def clear(self):
+        self._data.clear()
+        self._bytes = 0
+
+
 class StateCreator(type):
 
     # return a simple namespace with parameters of __init__ defined in ATTRS.
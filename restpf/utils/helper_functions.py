@@ -1,4 +1,5 @@
 import inspect
+import weakref
 
 import collections.abc as abc
 from collections import (
@@ -7,13 +8,53 @@ from collections import (
     namedtuple,
 )
 
-from functools import wraps
+from functools import (
+    partial,
+    wraps,
+)
 
 from restpf.utils.constants import (
     CallbackRegistrarOptions,
     TopologySearchColor,
 )
 
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+def is_ndarray(value):
+    return numpy is not None and isinstance(value, numpy.ndarray)
+
+
+def ndarray_tolist(values):
+    '''
+    ndarray -> list of builtin values. NaN stays a float, same as in lists.
+    '''
+    return values.tolist()
+
+
+# kind of ndarray dtype -> python type of elements after tolist().
+_NDARRAY_KIND_TO_PYTHON_TYPE = {
+    'b': bool,
+    'i': int,
+    'u': int,
+    'f': float,
+    'U': str,
+    'O': None,
+}
+
+
+def ndarray_element_type(values):
+    '''
+    Python type of elements of 1-d ndarray, or None if elements should be
+    checked one by one (object dtype, multidimensional array).
+    '''
+    if values.ndim != 1:
+        return None
+    return _NDARRAY_KIND_TO_PYTHON_TYPE.get(values.dtype.kind, object)
+
 
 def namedtuple_with_default(name, *pairs):
     keys, defaults = zip(*pairs)
@@ -29,42 +70,161 @@ def to_iterable(element):
     return element
 
 
-_extract_kwargs_subset_cache = {}
+CallbackSignature = namedtuple(
+    'CallbackSignature',
+    ['params_all', 'params_without_default', 'is_coroutine'],
+)
 
 
-def _extract_kwargs_subset(func, kwargs):
+_CallbackSpec = namedtuple(
+    '_CallbackSpec',
+    ['signature', 'positional', 'keyword', 'var_keyword'],
+)
 
-    if func in _extract_kwargs_subset_cache:
-        params_all, params_without_default = _extract_kwargs_subset_cache[func]
 
-    else:
-        sig_parameters = inspect.signature(func).parameters
+def _compile_callback_spec(func):
+    positional = []
+    keyword = []
+    required = []
+    var_keyword = False
+    for name, param in inspect.signature(func).parameters.items():
+        if param.kind is param.VAR_POSITIONAL:
+            continue
+        if param.kind is param.VAR_KEYWORD:
+            var_keyword = True
+            continue
+
+        if param.kind is param.POSITIONAL_ONLY:
+            positional.append(name)
+        else:
+            keyword.append(name)
+        if param.default is param.empty:
+            required.append(name)
+
+    return _CallbackSpec(
+        CallbackSignature(
+            frozenset(positional + keyword),
+            frozenset(required),
+            inspect.iscoroutinefunction(func),
+        ),
+        tuple(positional),
+        tuple(keyword),
+        var_keyword,
+    )
+
+
+class CallbackInvoker:
+
+    '''
+    Callback with precomputed parameters, to be called with a mapping of
+    available kwargs:
+
+    - parameters not in kwargs are omitted, raise if required.
+    - positional-only parameters are passed positionally.
+    - `**kwargs` receives all the kwargs not bound to other parameters.
+    - `*args` receives nothing.
+    '''
+
+    __slots__ = ('func', '_spec', '__weakref__')
+
+    def __init__(self, func, spec=None):
+        self.func = func
+        self._spec = spec or _compile_callback_spec(func)
+
+    @property
+    def signature(self):
+        return self._spec.signature
+
+    @property
+    def is_coroutine(self):
+        return self._spec.signature.is_coroutine
+
+    def extract_kwargs(self, kwargs):
+        '''
+        return (args, kwargs) to call the callback. `kwargs` could be any
+        mapping, only the declared names are looked up.
+        '''
+        spec = self._spec
+        for name in spec.signature.params_without_default:
+            if name not in kwargs:
+                raise RuntimeError('Missing keys')
+
+        args = tuple(kwargs[name] for name in spec.positional)
+
+        if spec.var_keyword:
+            ret = {
+                key: value
+                for key, value in kwargs.items()
+                if key not in spec.positional
+            }
+        else:
+            ret = {
+                name: kwargs[name]
+                for name in spec.keyword
+                if name in kwargs
+            }
+        return args, ret
+
+    def call(self, kwargs):
+        '''
+        Call directly, returns a coroutine if the callback is a coroutine
+        function.
+        '''
+        args, kwargs = self.extract_kwargs(kwargs)
+        return self.func(*args, **kwargs)
+
+    async def __call__(self, kwargs, executor=None):
+        '''
+        `executor` should provide `async run(func, kwargs)`, and will be used
+        only if the callback is not a coroutine function.
+        '''
+        if self.is_coroutine:
+            return await self.call(kwargs)
+        elif executor is None:
+            return self.call(kwargs)
+        else:
+            args, kwargs = self.extract_kwargs(kwargs)
+            func = partial(self.func, *args) if args else self.func
+            return await executor.run(func, kwargs)
+
+
+# specs of callbacks, released along with the callbacks. specs don't reference
+# the callbacks, registered callbacks hold their invokers instead.
+_callback_specs = weakref.WeakKeyDictionary()
+# bound methods are created on every attribute access, specs are keyed by the
+# underlying functions instead, without referencing the instances.
+_bound_method_specs = weakref.WeakKeyDictionary()
 
-        params_all = set(sig_parameters)
-        params_without_default = set(filter(
-            lambda k: sig_parameters[k].default is inspect.Parameter.empty,
-            params_all,
-        ))
 
-        _extract_kwargs_subset_cache[func] = (
-            params_all, params_without_default,
-        )
+def callback_invoker(func):
+    if isinstance(func, CallbackInvoker):
+        return func
+
+    if inspect.ismethod(func):
+        cache, key = _bound_method_specs, func.__func__
+    else:
+        cache, key = _callback_specs, func
 
-    kwargs_keys = set(kwargs)
+    try:
+        spec = cache.get(key)
+        if spec is None:
+            spec = _compile_callback_spec(func)
+            cache[key] = spec
+    except TypeError:
+        # not weakly referenceable.
+        spec = None
 
-    if not params_without_default <= kwargs_keys:
-        raise RuntimeError('Missing keys')
+    return CallbackInvoker(func, spec)
 
-    intersection = params_all & kwargs_keys
-    kwargs_subset = {key: kwargs[key] for key in intersection}
 
-    return kwargs_subset
+def callback_signature(func):
+    return callback_invoker(func).signature
 
 
 async def async_call(func, *args, **kwargs):
     if not args:
         # turn on kwargs filtering.
-        kwargs = _extract_kwargs_subset(func, kwargs)
+        return await callback_invoker(func)(kwargs)
 
     if inspect.iscoroutinefunction(func):
         return await func(*args, **kwargs)
@@ -72,6 +232,109 @@ async def async_call(func, *args, **kwargs):
         return func(*args, **kwargs)
 
 
+def normalize_sparse_fields(fields):
+    '''
+    Normalize sparse fieldset (JSON:API `fields[type]=a,b.c`) to a sorted
+    tuple of paths, e.g. (('a',), ('b', 'c')). None means all fields.
+
+    fields could be a comma separated string, or an iterable of dotted paths or
+    paths.
+    '''
+    if fields is None:
+        return None
+
+    if isinstance(fields, str):
+        fields = fields.split(',')
+
+    paths = set()
+    for field in fields:
+        if isinstance(field, str):
+            field = field.strip()
+            if not field:
+                continue
+            field = field.split('.')
+        paths.add(tuple(field))
+
+    return tuple(sorted(paths))
+
+
+def prune_sparse_fields(fields, *roots):
+    '''
+    Drop paths of normalized sparse fieldset not found in any of the
+    attribute trees `roots`, hence junk names don't make new cache keys.
+    '''
+    if fields is None:
+        return None
+
+    def exists(path):
+        for root in roots:
+            node = root
+            for name in path:
+                node = node.bh_named_child(name)
+                if node is None:
+                    break
+            else:
+                return True
+        return False
+
+    return tuple(path for path in fields if exists(path))
+
+
+def sparse_fields_to_tree(fields):
+    '''
+    Normalized sparse fieldset to tree of names. An empty child means the
+    whole subtree is requested.
+    '''
+    if fields is None:
+        return None
+
+    tree = {}
+    for path in fields:
+        node = tree
+        for idx, name in enumerate(path):
+            if name in node and not node[name]:
+                # whole subtree has been requested.
+                break
+            if idx == len(path) - 1:
+                node[name] = {}
+            else:
+                node = node.setdefault(name, {})
+    return tree
+
+
+def sparse_fields_cover(fields_tree, path):
+    '''
+    If path is requested, or is an ancestor of a requested path.
+    '''
+    if fields_tree is None:
+        return True
+
+    node = fields_tree
+    for name in path:
+        if name not in node:
+            return False
+        node = node[name]
+        if not node:
+            # descendant of a requested path.
+            return True
+    return True
+
+
+def prune_by_sparse_fields(value, fields_tree):
+    if fields_tree is None or not isinstance(value, abc.Mapping):
+        return value
+
+    ret = {}
+    for name, child_tree in fields_tree.items():
+        if name not in value:
+            continue
+        if child_tree:
+            ret[name] = prune_by_sparse_fields(value[name], child_tree)
+        else:
+            ret[name] = value[name]
+    return ret
+
+
 def bind_self_with_options(names, self, options):
     for name in names:
         setattr(self, name, options.get(name))
@@ -97,7 +360,7 @@ def method_named_args(*names):
 
 def property_with_cache(accessor):
 
-    CACHE_KEY = f'__cache_for_{accessor.__name__}'
+    CACHE_KEY = f'_cache_for_{accessor.__name__}'
 
     @wraps(accessor)
     def _wrapper(self):
@@ -118,7 +381,7 @@ def property_with_cache(accessor):
 
 
 # restricted options only contains CallbackRegistrarOptions.
-def parallel_groups_of_callbacks(callback_and_restricted_options):
+def _link_callbacks(callback_and_restricted_options):
     root = None
     last = None
 
@@ -193,6 +456,29 @@ def parallel_groups_of_callbacks(callback_and_restricted_options):
         # only one start point.
         search_starts = [root]
 
+    return root, last, children, parents, searched, search_starts
+
+
+def callback_dependencies(callback_and_restricted_options):
+    '''
+    return callback -> set of callbacks that must be completed before it.
+    '''
+    _, last, _, parents, searched, _ = _link_callbacks(
+        callback_and_restricted_options,
+    )
+
+    ret = {callback: set(parents[callback]) for callback in searched}
+    if last:
+        # after_all depends on every other callback.
+        ret[last] = set(searched)
+
+    return ret
+
+
+def parallel_groups_of_callbacks(callback_and_restricted_options):
+    root, last, children, parents, searched, search_starts = \
+        _link_callbacks(callback_and_restricted_options)
+
     def DFS(group, callback):
         # stop searching.
         if searched[callback] == TopologySearchColor.GRAY:
@@ -54,6 +54,11 @@ setup(
     # critical configurations.
     packages=find_packages(),
     install_requires=load_requirements('requirements.txt'),
+    extras_require={
+        'numpy': ['numpy'],
+        'msgpack': ['msgpack'],
+        'cbor': ['cbor2'],
+    },
     entry_points={
         'console_scripts': [
             'restpf_cli = restpf.main:entry_point'
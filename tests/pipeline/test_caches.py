@@ -0,0 +1,258 @@
+import pytest
+
+from tests.utils.attr_config import *
+from restpf.resource.definition import (
+    Attributes,
+    Resource,
+)
+from restpf.pipeline.caches import RepresentationCache
+from restpf.pipeline.single_resource.get import (
+    GetSingleResourcePipelineRunner,
+)
+from restpf.pipeline.single_resource.patch import (
+    PatchSingleResourcePipelineRunner,
+)
+from restpf.pipeline.single_resource.delete import (
+    DeleteSingleResourcePipelineRunner,
+)
+
+
+async def run(runner_cls, resource, **pipeline_state):
+    tp = runner_cls()
+    tp.build_pipeline_state(**pipeline_state)
+    tp.build_context_rule()
+    tp.build_state_tree_builder()
+    tp.build_representation_generator()
+    tp.set_resource(resource)
+    return await tp.run_pipeline()
+
+
+@pytest.mark.asyncio
+async def test_representation_cache():
+    cache = RepresentationCache(max_entries=10)
+    test = Resource(
+        'test',
+        Attributes({
+            'foo': Integer,
+        }),
+        representation_cache=cache,
+    )
+
+    db = {1: 10, 2: 20}
+    called = []
+
+    @test.attributes.foo.GET
+    def get_foo(resource_id):
+        called.append(resource_id)
+        return db[resource_id]
+
+    @test.attributes.foo.PATCH
+    def patch_foo(resource_id, state):
+        db[resource_id] = state.value
+
+    @test.special_hooks.before_all.DELETE
+    def delete(resource_id):
+        db.pop(resource_id)
+
+    def value_of(pipeline):
+        return pipeline.representation['attributes']['foo']['value']
+
+    assert 10 == value_of(await run(
+        GetSingleResourcePipelineRunner, test, raw_resource_id=1,
+    ))
+    assert 10 == value_of(await run(
+        GetSingleResourcePipelineRunner, test, raw_resource_id=1,
+    ))
+    assert 20 == value_of(await run(
+        GetSingleResourcePipelineRunner, test, raw_resource_id=2,
+    ))
+    assert [1, 2] == called
+    assert 2 == len(cache)
+
+    await run(
+        PatchSingleResourcePipelineRunner, test,
+        raw_resource_id=1,
+        raw_attributes={'foo': 11},
+        raw_relationships={},
+    )
+    assert 1 == len(cache)
+    assert 11 == value_of(await run(
+        GetSingleResourcePipelineRunner, test, raw_resource_id=1,
+    ))
+    assert [1, 2, 1] == called
+
+    await run(DeleteSingleResourcePipelineRunner, test, raw_resource_id=2)
+    assert 1 == len(cache)
+
+
+def test_representation_cache_generation():
+    test = Resource('test', Attributes({}))
+    cache = RepresentationCache()
+
+    token = cache.begin()
+    cache.invalidate(test, 1)
+    # stale.
+    cache.set(test, 1, {}, token)
+    assert cache.get(test, 1) is None
+
+    cache.set(test, 1, {}, cache.begin())
+    assert {} == cache.get(test, 1)
+
+
+@pytest.mark.asyncio
+async def test_callback_memo():
+    test = Resource(
+        'test',
+        Attributes({
+            'slow': String,
+            'live': Integer,
+        }),
+    )
+
+    called = []
+
+    @test.attributes.slow.GET(cache_ttl=300)
+    def get_slow(resource_id):
+        called.append('slow')
+        return str(resource_id)
+
+    @test.attributes.live.GET
+    def get_live(resource_id):
+        called.append('live')
+        return resource_id
+
+    @test.attributes.live.PATCH
+    def patch_live(resource_id, state):
+        pass
+
+    for _ in range(3):
+        pipeline = await run(
+            GetSingleResourcePipelineRunner, test, raw_resource_id=1,
+        )
+        assert '1' == pipeline.representation['attributes']['slow']['value']
+    assert ['slow', 'live', 'live', 'live'] == called
+
+    # invalidated by PATCH.
+    await run(
+        PatchSingleResourcePipelineRunner, test,
+        raw_resource_id=1,
+        raw_attributes={'live': 2},
+        raw_relationships={},
+    )
+    del called[:]
+    await run(GetSingleResourcePipelineRunner, test, raw_resource_id=1)
+    assert ['live', 'slow'] == sorted(called)
+
+
+@pytest.mark.asyncio
+async def test_callback_memo_with_live_child():
+    test = Resource(
+        'test',
+        Attributes({
+            'obj': Object({
+                'a': Integer,
+                'b': Integer,
+            }),
+        }),
+    )
+
+    ret = {'a': 1}
+
+    @test.attributes.obj.GET(cache_ttl=300)
+    def get_obj(resource_id):
+        return ret
+
+    live = [101]
+
+    @test.attributes.obj.b.GET
+    def get_b(resource_id):
+        return live.pop() if live else None
+
+    pipeline = await run(
+        GetSingleResourcePipelineRunner, test, raw_resource_id=1,
+    )
+    obj = pipeline.representation['attributes']['obj']
+    assert 101 == obj['b']['value']
+
+    # the memoized return is not modified by merging children.
+    assert {'a': 1} == ret
+    pipeline = await run(
+        GetSingleResourcePipelineRunner, test, raw_resource_id=1,
+    )
+    obj = pipeline.representation['attributes']['obj']
+    assert 1 == obj['a']['value']
+    assert obj['b']['value'] is None
+
+
+@pytest.mark.asyncio
+async def test_callback_memo_invalidated_concurrently():
+    import asyncio
+
+    test = Resource(
+        'test',
+        Attributes({
+            'slow': String,
+        }),
+    )
+
+    called = []
+    event = asyncio.Event()
+
+    @test.attributes.slow.GET(cache_ttl=300)
+    async def get_slow(resource_id):
+        called.append('slow')
+        await event.wait()
+        return 'stale'
+
+    @test.attributes.slow.PATCH
+    def patch_slow(resource_id, state):
+        pass
+
+    get = asyncio.ensure_future(
+        run(GetSingleResourcePipelineRunner, test, raw_resource_id=1),
+    )
+    await asyncio.sleep(0)
+    # invalidated while the GET is running.
+    await run(
+        PatchSingleResourcePipelineRunner, test,
+        raw_resource_id=1,
+        raw_attributes={'slow': 'fresh'},
+        raw_relationships={},
+    )
+    event.set()
+    await get
+
+    # the return of the GET is not memoized.
+    await run(GetSingleResourcePipelineRunner, test, raw_resource_id=1)
+    assert ['slow', 'slow'] == called
+
+
+@pytest.mark.asyncio
+async def test_callback_memo_of_batch():
+    from restpf.pipeline.multiple_resource.get import (
+        GetMultipleResourcePipelineRunner,
+    )
+
+    test = Resource(
+        'test',
+        Attributes({
+            'slow': Integer,
+        }),
+    )
+
+    called = []
+
+    @test.attributes.slow.GET(batch=True, cache_ttl=300, cache_max_entries=2)
+    def get_slow(resource_ids):
+        called.append(list(resource_ids))
+        return {resource_id: resource_id for resource_id in resource_ids}
+
+    await run(GetMultipleResourcePipelineRunner, test, raw_resource_ids=[1, 2])
+    pipeline = await run(
+        GetMultipleResourcePipelineRunner, test, raw_resource_ids=[2, 3],
+    )
+    assert [[1, 2], [3]] == called
+    assert [2, 3] == [
+        rep['attributes']['slow']['value'] for rep in pipeline.representation
+    ]
+    assert 2 == len(test.callback_memos[get_slow])
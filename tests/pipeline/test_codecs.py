@@ -0,0 +1,176 @@
+import pytest
+
+from tests.utils.attr_config import *
+from restpf.resource.definition import (
+    Attributes,
+    Resource,
+)
+from restpf.pipeline.codecs import (
+    JSONCodec,
+    MessagePackCodec,
+    CBORCodec,
+    SchemaCodec,
+    CodecRegistry,
+)
+from restpf.pipeline.single_resource.get import (
+    GetSingleResourcePipelineRunner,
+)
+from restpf.pipeline.multiple_resource.get import (
+    GetMultipleResourcePipelineRunner,
+)
+from restpf.pipeline.single_resource.post import (
+    PostSingleResourcePipelineRunner,
+)
+
+
+def test_negotiate():
+    json_codec = JSONCodec()
+    schema_codec = SchemaCodec(json_codec)
+    codecs = CodecRegistry([json_codec, schema_codec])
+
+    assert json_codec is codecs.negotiate()
+    assert json_codec is codecs.negotiate('*/*')
+    assert schema_codec is codecs.negotiate(
+        'application/vnd.restpf.schema+json',
+    )
+    assert schema_codec is codecs.negotiate(
+        'application/json;q=0.5, application/vnd.restpf.schema+json',
+    )
+    assert json_codec is codecs.negotiate('text/html, application/*;q=0.1')
+    assert codecs.negotiate('text/html') is None
+    assert codecs.negotiate('application/json;q=0') is None
+
+    assert json_codec is codecs.get('application/json; charset=utf-8')
+    assert codecs.get('application/msgpack') is None
+
+
+def _create_codecs():
+    codecs = [JSONCodec(), SchemaCodec(JSONCodec())]
+    for module, codec_cls in [
+        ('msgpack', MessagePackCodec),
+        ('cbor2', CBORCodec),
+    ]:
+        try:
+            __import__(module)
+        except ImportError:
+            continue
+        codecs.append(codec_cls())
+        codecs.append(SchemaCodec(codec_cls()))
+    return codecs
+
+
+def _create_resource():
+    test = Resource(
+        'test',
+        Attributes({
+            'foo': Integer,
+            'bar': Array(Object({
+                'a': String,
+                'b': Tuple(Integer, Float),
+            })),
+            'baz': Array(Integer),
+        }),
+        None,
+    )
+
+    @test.attributes.foo.GET
+    def get_foo(resource_id):
+        return resource_id
+
+    @test.attributes.bar.GET
+    def get_bar(resource_id):
+        return [{'a': str(resource_id), 'b': [1, 2.0]}, {'b': [3, 4.0]}]
+
+    @test.attributes.baz.GET
+    def get_baz(resource_id):
+        return list(range(resource_id))
+
+    return test
+
+
+@pytest.mark.asyncio
+async def test_representation_codecs():
+    test = _create_resource()
+
+    single = GetSingleResourcePipelineRunner()
+    single.build(test, raw_resource_id=3)
+    single = await single.run_pipeline()
+
+    multiple = GetMultipleResourcePipelineRunner()
+    multiple.build(test, raw_resource_ids=[1, 2, 3])
+    multiple = await multiple.run_pipeline()
+
+    json_size = len(single.encode_representation(JSONCodec()))
+
+    for codec in _create_codecs():
+        for pipeline in [single, multiple]:
+            data = pipeline.encode_representation(codec)
+            assert isinstance(data, bytes)
+            assert pipeline.representation == \
+                codec.decode_representation(test, data)
+
+        if isinstance(codec, SchemaCodec):
+            assert len(single.encode_representation(codec)) < json_size / 2
+
+
+@pytest.mark.asyncio
+async def test_input_codecs():
+    test = Resource(
+        'test',
+        Attributes({
+            'foo': Integer,
+            'bar': Object({
+                'a': String,
+                'b': Array(Float),
+            }),
+        }),
+        None,
+    )
+
+    called = []
+
+    @test.attributes.bar.POST
+    def post_bar(raw_attributes, state):
+        called.append(raw_attributes)
+        assert [1.0, 2.0] == state.b.value
+
+    raw_attributes = {'foo': 1, 'bar': {'a': 'x', 'b': [1.0, 2.0]}}
+
+    for codec in _create_codecs():
+        node = test.attributes_obj.attr_obj
+        data = codec.encode_input(node, raw_attributes)
+        assert raw_attributes == codec.decode_input(node, data)
+
+        runner = PostSingleResourcePipelineRunner()
+        runner.build(
+            test,
+            raw_resource_id=None,
+            raw_attributes=data,
+            raw_relationships={},
+            input_codec=codec,
+        )
+        await runner.run_pipeline()
+        assert raw_attributes == called.pop()
+
+
+def test_decode_malformed_input():
+    attr = Object({
+        'foo': Integer,
+        'bar': Object({
+            'a': String,
+            'b': Array(Float),
+            'c': Tuple(Integer, Integer),
+        }),
+    })
+    codec = SchemaCodec(JSONCodec())
+
+    for body in [
+        '[3]', '{}', '7', '[]', '[true]', '[8]', '[1]', '[1, 1, 2]',
+        '[2, [2, 1.0]]', '[2, [4, [1]]]', '[2, [4, [1, 2, 3]]]',
+    ]:
+        with pytest.raises(RuntimeError):
+            codec.decode_input(attr, body.encode())
+
+    assert {'foo': 1, 'bar': {'b': [1.0]}} == codec.decode_input(
+        attr, b'[3, 1, [2, [1.0]]]',
+    )
@@ -5,6 +5,8 @@ from restpf.resource.definition import (
     Attributes,
     Resource,
 )
+from restpf.utils.constants import CallbackSchedulerConfig
+from restpf.pipeline.protocol import PipelineRunnerPool
 from restpf.pipeline.single_resource.get import (
     GetSingleResourcePipelineRunner,
 )
@@ -54,3 +56,283 @@ async def test_simple_get():
         'relationships': {},
     }
     assert expected == pipeline.representation
+
+
+@pytest.mark.asyncio
+async def test_get_with_dataflow_scheduler():
+    import asyncio
+
+    test = Resource(
+        'test',
+        Attributes({
+            'slow': Integer,
+            'fast': Integer,
+            'after_fast': Integer,
+        }),
+        None,
+    )
+
+    finished = []
+
+    @test.attributes.slow.GET
+    async def get_slow(resource_id):
+        await asyncio.sleep(0.05)
+        finished.append('slow')
+        return 1
+
+    @test.attributes.fast.GET
+    async def get_fast(resource_id):
+        finished.append('fast')
+        return 2
+
+    @test.attributes.after_fast.GET(run_after=get_fast)
+    async def get_after_fast(resource_id):
+        finished.append('after_fast')
+        return 3
+
+    class TestRunner(GetSingleResourcePipelineRunner):
+        CALLBACK_SCHEDULER = CallbackSchedulerConfig.DATAFLOW
+
+    tp = TestRunner()
+    tp.build_pipeline_state(raw_resource_id=42)
+    tp.build_context_rule()
+    tp.build_state_tree_builder()
+    tp.build_representation_generator()
+    tp.set_resource(test)
+
+    pipeline = await tp.run_pipeline()
+
+    # after_fast doesn't wait for slow.
+    assert ['fast', 'after_fast', 'slow'] == finished
+    assert 3 == pipeline.representation['attributes']['after_fast']['value']
+
+
+def _build_get_runner(resource, resource_id, fields=None):
+    tp = GetSingleResourcePipelineRunner()
+    tp.build_pipeline_state(raw_resource_id=resource_id, fields=fields)
+    tp.build_context_rule()
+    tp.build_state_tree_builder()
+    tp.build_representation_generator()
+    tp.set_resource(resource)
+    return tp
+
+
+@pytest.mark.asyncio
+async def test_coalesce_concurrent_get():
+    import asyncio
+
+    test = Resource(
+        'test',
+        Attributes({
+            'foo': Integer,
+        }),
+        coalesce_pipelines=True,
+    )
+
+    called = []
+
+    @test.attributes.foo.GET
+    async def get_foo(resource_id):
+        called.append(resource_id)
+        await asyncio.sleep(0.01)
+        if resource_id < 0:
+            raise ValueError(resource_id)
+        return resource_id
+
+    pipelines = await asyncio.gather(*(
+        _build_get_runner(test, resource_id).run_pipeline()
+        for resource_id in [1, 1, 1, 2]
+    ))
+    assert [1, 2] == called
+    assert pipelines[0] is pipelines[1] is pipelines[2]
+    assert 2 == pipelines[3].representation['attributes']['foo']['value']
+
+    # error propagation.
+    del called[:]
+    rets = await asyncio.gather(
+        *(_build_get_runner(test, -1).run_pipeline() for _ in range(3)),
+        return_exceptions=True,
+    )
+    assert [-1] == called
+    assert all(isinstance(ret, ValueError) for ret in rets)
+
+    # opt out, by default.
+    del called[:]
+    test = Resource(
+        'test',
+        Attributes({
+            'foo': Integer,
+        }),
+    )
+    test.attributes.foo.GET(get_foo)
+    await asyncio.gather(*(
+        _build_get_runner(test, 1).run_pipeline()
+        for _ in range(3)
+    ))
+    assert [1, 1, 1] == called
+
+
+@pytest.mark.asyncio
+async def test_get_sparse_fields():
+    test = Resource(
+        'test',
+        Attributes({
+            'a': Integer(appear_in_get=AppearanceConfig.REQUIRE),
+            'b': Object({
+                'c': Integer,
+                'd': Integer,
+            }),
+        }),
+    )
+
+    called = []
+
+    @test.attributes.a.GET
+    def get_a(resource_id):
+        called.append('a')
+        return 1
+
+    @test.attributes.b.GET
+    def get_b(resource_id):
+        called.append('b')
+        return {'c': 2}
+
+    @test.attributes.b.d.GET
+    def get_d(resource_id):
+        called.append('d')
+        return 3
+
+    pipeline = await _build_get_runner(test, 1, 'b.c').run_pipeline()
+    assert ['b'] == called
+    assert {
+        'b': {
+            'c': {'type': 'integer', 'value': 2},
+        },
+    } == pipeline.representation['attributes']
+
+    del called[:]
+    pipeline = await _build_get_runner(test, 1, ['a', 'b']).run_pipeline()
+    assert ['a', 'b', 'd'] == sorted(called)
+    assert 3 == pipeline.representation['attributes']['b']['d']['value']
+
+    del called[:]
+    pipeline = await _build_get_runner(test, 1).run_pipeline()
+    assert ['a', 'b', 'd'] == sorted(called)
+
+    # unknown names are dropped, and don't make new cache entries.
+    cache_size = len(test.execution_plan_cache)
+    for idx in range(10):
+        await _build_get_runner(test, 1, f'b.c,junk{idx}').run_pipeline()
+    assert cache_size + 2 >= len(test.execution_plan_cache)
+
+    # bounded.
+    test.MAX_CACHED_PLANS = 4
+    test._execution_plan_cache = test._create_execution_plan_cache()
+    for fields in ['a', 'b', 'b.c', 'b.d', 'a,b.c', 'a,b.d']:
+        await _build_get_runner(test, 1, fields).run_pipeline()
+    assert 4 >= len(test.execution_plan_cache)
+
+
+@pytest.mark.asyncio
+async def test_runner_pool():
+    test = Resource(
+        'test',
+        Attributes({
+            'foo': Integer,
+            'bar': Integer,
+        }),
+        None,
+    )
+
+    @test.attributes.foo.GET
+    def get_foo(resource_id, callback_kwargs):
+        callback_kwargs.register('base', resource_id * 10)
+        return resource_id
+
+    @test.attributes.bar.GET(run_after=get_foo)
+    def get_bar(resource_id, base=None):
+        return base + resource_id
+
+    pool = PipelineRunnerPool(GetSingleResourcePipelineRunner, test)
+
+    for resource_id in [1, 2, 3]:
+        pipeline = await pool.run_pipeline(raw_resource_id=resource_id)
+        attributes = pipeline.representation['attributes']
+        assert resource_id == pipeline.representation['id']
+        assert resource_id == attributes['foo']['value']
+        assert resource_id * 11 == attributes['bar']['value']
+
+    assert 1 == pool.built
+    assert 1 == len(pool)
+
+    runner = pool.acquire(raw_resource_id=4)
+    assert 0 == len(pool)
+    # registered kwargs of last request are cleared.
+    kwargs = await runner.context_rule.callback_kwargs(None, None)
+    assert 'base' not in kwargs
+    assert 4 == kwargs['resource_id']
+    pool.release(runner)
+
+
+@pytest.mark.asyncio
+async def test_runner_pool_cancelled():
+    import asyncio
+
+    test = Resource(
+        'test',
+        Attributes({
+            'foo': Integer,
+        }),
+        None,
+        coalesce_pipelines=True,
+    )
+
+    event = asyncio.Event()
+
+    @test.attributes.foo.GET
+    async def get_foo(resource_id):
+        await event.wait()
+        return resource_id
+
+    pool = PipelineRunnerPool(GetSingleResourcePipelineRunner, test)
+
+    leader = asyncio.ensure_future(pool.run_pipeline(raw_resource_id=1))
+    await asyncio.sleep(0)
+    follower = asyncio.ensure_future(pool.run_pipeline(raw_resource_id=1))
+    await asyncio.sleep(0)
+
+    leader.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await leader
+    # the runner of leader is still running for the follower.
+    assert 0 == len(pool)
+
+    event.set()
+    pipeline = await follower
+    assert 1 == pipeline.representation['attributes']['foo']['value']
+    await asyncio.sleep(0)
+    assert 2 == len(pool)
+
+
+@pytest.mark.asyncio
+async def test_get_ndarray():
+    numpy = pytest.importorskip('numpy')
+
+    test = Resource(
+        'test',
+        Attributes({
+            'foo': Array(Float),
+        }),
+        None,
+    )
+
+    @test.attributes.foo.GET
+    def get_foo(resource_id):
+        return numpy.arange(resource_id, dtype=float)
+
+    pipeline = await _build_get_runner(test, 3).run_pipeline()
+    assert {
+        'type': 'array',
+        'value': [0.0, 1.0, 2.0],
+        'element_type': 'float',
+    } == pipeline.representation['attributes']['foo']
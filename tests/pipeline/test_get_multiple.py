@@ -0,0 +1,96 @@
+import pytest
+
+from tests.utils.attr_config import *
+from restpf.resource.definition import (
+    Attributes,
+    Resource,
+)
+from restpf.pipeline.multiple_resource.get import (
+    GetMultipleResourcePipelineRunner,
+)
+
+
+@pytest.mark.asyncio
+async def test_batched_get():
+    test = Resource(
+        'test',
+        Attributes({
+            'foo': Integer,
+            'bar': String,
+        }),
+        None,
+    )
+
+    called = []
+
+    @test.attributes.foo.GET(batch=True)
+    def get_foo(resource_ids):
+        called.append(('foo', list(resource_ids)))
+        return {resource_id: resource_id * 10 for resource_id in resource_ids}
+
+    @test.attributes.bar.GET
+    async def get_bar(resource_id):
+        called.append(('bar', resource_id))
+        return str(resource_id)
+
+    tp = GetMultipleResourcePipelineRunner()
+    tp.build_pipeline_state(raw_resource_ids=[1, 2, 3])
+    tp.build_context_rule()
+    tp.build_state_tree_builder()
+    tp.build_representation_generator()
+    tp.set_resource(test)
+
+    pipeline = await tp.run_pipeline()
+
+    # batched callback is called once.
+    assert [('foo', [1, 2, 3])] == [c for c in called if c[0] == 'foo']
+    assert 3 == len([c for c in called if c[0] == 'bar'])
+
+    expected = [
+        {
+            'id': resource_id,
+            'type': 'test',
+            'attributes': {
+                'foo': {
+                    'type': 'integer',
+                    'value': resource_id * 10,
+                },
+                'bar': {
+                    'type': 'string',
+                    'value': str(resource_id),
+                },
+            },
+            'relationships': {},
+        }
+        for resource_id in [1, 2, 3]
+    ]
+    assert expected == pipeline.representation
+
+
+@pytest.mark.asyncio
+async def test_stream_get():
+    import json
+
+    test = Resource(
+        'test',
+        Attributes({
+            'foo': Array(Integer),
+        }),
+        None,
+    )
+
+    @test.attributes.foo.GET
+    def get_foo(resource_id):
+        return list(range(resource_id))
+
+    tp = GetMultipleResourcePipelineRunner()
+    tp.build(test, raw_resource_ids=[1, 2000])
+
+    pipeline, chunks = await tp.stream_pipeline(chunk_size=256)
+    assert pipeline.representation is None
+    chunks = list(chunks)
+    assert all(256 == len(chunk) for chunk in chunks[:-1])
+
+    tp.rebuild_pipeline_state(raw_resource_ids=[1, 2000])
+    pipeline = await tp.run_pipeline()
+    assert pipeline.representation == json.loads(b''.join(chunks))
@@ -1,6 +1,7 @@
 import pytest
 
 from tests.utils.attr_config import *
+from restpf.utils.constants import CallbackSchedulerConfig
 from restpf.resource.definition import (
     Attributes,
     Resource,
@@ -47,3 +48,41 @@ async def test_simple_patch():
 
     await tp.run_pipeline()
     assert [foo] == called
+
+
+@pytest.mark.asyncio
+async def test_patch_run_after_unselected():
+    test = build_shared_resource()
+    called = []
+
+    @test.attributes.foo.PATCH
+    def foo(state):
+        called.append('foo')
+
+    @test.attributes.bar.PATCH(run_after=foo)
+    def bar(state):
+        called.append('bar')
+
+    for scheduler in [
+        CallbackSchedulerConfig.LAYERED,
+        CallbackSchedulerConfig.DATAFLOW,
+    ]:
+        del called[:]
+
+        tp = PatchSingleResourcePipelineRunner()
+        tp.CALLBACK_SCHEDULER = scheduler
+        tp.build_pipeline_state(
+            raw_resource_id=42,
+            raw_attributes={
+                'bar': 2.0,
+            },
+            raw_relationships={},
+        )
+        tp.build_context_rule()
+        tp.build_state_tree_builder()
+        tp.build_representation_generator()
+        tp.set_resource(test)
+
+        # foo is not selected, bar is not dropped.
+        await tp.run_pipeline()
+        assert ['bar'] == called
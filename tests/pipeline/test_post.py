@@ -75,3 +75,33 @@ async def test_simple_post():
     # no order required.
     assert ['a', 'c'] == called
     assert 999 == tp.pipeline_state.var_collector['generated_resource_id']
+
+
+@pytest.mark.asyncio
+async def test_post_raw_json():
+    test = build_shared_resource()
+
+    called = []
+
+    @test.attributes.a.POST
+    def a(raw_attributes, state):
+        called.append(raw_attributes)
+        assert 1 == state.b.c.value
+
+    def build_runner(raw_attributes):
+        tp = PostSingleResourcePipelineRunner()
+        tp.build(
+            test,
+            raw_resource_id=None,
+            raw_attributes=raw_attributes,
+            raw_relationships={},
+        )
+        return tp
+
+    await build_runner(
+        b'{"foo": 42, "a": {"b": {"c": 1}, "d": 2}}',
+    ).run_pipeline()
+    assert [{'foo': 42, 'a': {'b': {'c': 1}, 'd': 2}}] == called
+
+    with pytest.raises(RuntimeError):
+        await build_runner(b'{"foo": "42"}').run_pipeline()
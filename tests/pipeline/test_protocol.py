@@ -5,9 +5,6 @@ from tests.utils.attr_config import *
 from restpf.utils.helper_functions import (
     async_call,
 )
-from restpf.utils.helper_classes import (
-    TreeState,
-)
 from restpf.resource.definition import (
     Attributes,
     Resource,
@@ -18,7 +15,6 @@ from restpf.pipeline.protocol import (
     RepresentationGenerator,
     PipelineBase,
     ResourceState,
-    _merge_output_of_callbacks,
     PipelineRunner,
 )
 
@@ -67,26 +63,64 @@ async def test_resource_definition():
     assert list(range(1, 5)) == list(map(lambda x: x[0](), ret['attributes']))
 
 
-def test_merge_tree_state():
-    ts = TreeState()
-    ts.touch([]).value = {
-        'a': {
-            'b': 'should be override',
-            'c': 2,
+@pytest.mark.asyncio
+async def test_merge_layout():
+    class TestContext(ContextRule):
+        HTTPMethod = HTTPMethodConfig.GET
+
+    rd = Resource(
+        'test',
+        Attributes({
+            'a': Object({
+                'b': String,
+                'c': Integer,
+                'e': Object({
+                    'f': Integer,
+                }),
+            }),
+            'd': String,
+        }),
+        None,
+    )
+
+    path2ret = {
+        (): {
+            'a': {
+                'b': 'should be override',
+                'c': 2,
+            },
+            'd': 'should be override',
         },
-        'd': 'should be override',
+        ('a', 'b'): 1,
+        ('a', 'e', 'f'): 4,
+        ('d',): 3,
     }
-    ts.touch(['a', 'b']).value = 1
-    ts.touch(['d']).value = 3
+    for path in path2ret:
+        registrar = rd.attributes
+        for name in path:
+            registrar = getattr(registrar, name)
+        registrar.GET(lambda: None)
 
-    expected = {
+    plan, _ = await TestContext().select_plan(
+        rd, ResourceState(None, None, None),
+    )
+    layout = plan.merge_layout
+    # ('a', 'e') is an ancestor without callback.
+    assert 6 == len(layout)
+
+    slot_values = layout.create_slot_values()
+    for idx, entry in enumerate(plan.entries):
+        slot_values[layout.entry_slots[idx]] = path2ret[entry.path]
+
+    merged = layout.merge(slot_values)
+    assert {
         'a': {
             'b': 1,
             'c': 2,
+            'e': {'f': 4},
         },
         'd': 3,
-    }
-    assert expected == _merge_output_of_callbacks(ts)
+    } == merged['attributes']
 
 
 @pytest.mark.asyncio
@@ -210,3 +244,119 @@ async def test_pipeline():
         },
     }
     assert expected == pipeline.representation
+
+
+@pytest.mark.asyncio
+async def test_select_plan_cache():
+    class TestContextRule(ContextRule):
+        HTTPMethod = HTTPMethodConfig.POST
+
+    resource = Resource(
+        'test',
+        Attributes({
+            'foo': Integer,
+            'bar': String,
+        }),
+        None,
+    )
+
+    @resource.attributes.foo.POST
+    def process_foo(state):
+        return state.value
+
+    @resource.attributes.bar.POST(run_after=process_foo)
+    def process_bar(state):
+        return state.value
+
+    def build_input_state(raw_attributes):
+        return ResourceState(
+            create_attribute_state_tree_for_input(
+                resource.attributes_obj.attr_obj,
+                raw_attributes,
+            ),
+            None,
+            None,
+        )
+
+    ct = TestContextRule()
+    plan, states = await ct.select_plan(
+        resource, build_input_state({'foo': 1, 'bar': 'a'}),
+    )
+    assert [process_foo, process_bar] == [e.callback for e in plan.entries]
+    assert [('foo',), ('bar',)] == [e.path for e in plan.entries]
+    assert [[0], [1]] == plan.parallel_groups
+    assert [1, 'a'] == [s.value for s in states]
+
+    # same shape, same plan.
+    plan_again, states = await ct.select_plan(
+        resource, build_input_state({'foo': 2, 'bar': 'b'}),
+    )
+    assert plan is plan_again
+    assert [2, 'b'] == [s.value for s in states]
+
+    # different shape.
+    plan_foo, states = await ct.select_plan(
+        resource, build_input_state({'foo': 3}),
+    )
+    assert [process_foo] == [e.callback for e in plan_foo.entries]
+    assert [3] == [s.value for s in states]
+
+    # invalidated by registration.
+    @resource.special_hooks.before_all.POST
+    def run_before_all():
+        pass
+
+    plan_new, _ = await ct.select_plan(
+        resource, build_input_state({'foo': 1, 'bar': 'a'}),
+    )
+    assert plan_new is not plan
+    assert run_before_all is plan_new.entries[0].callback
+
+
+@pytest.mark.asyncio
+async def test_callback_kwargs_snapshot():
+    import types
+
+    from restpf.pipeline.protocol import (
+        CallbackKwargsStateVariableMapper,
+        CallbackKwargsVariableCollector,
+    )
+
+    class TestMapper(CallbackKwargsStateVariableMapper):
+        ATTR2KWARG = {'raw_resource_id': 'resource_id'}
+
+    class TestCollector(CallbackKwargsVariableCollector):
+        VARIABLES = ['generated']
+
+    class TestUpdateOnly:
+        def update(self, ret):
+            ret['resource_id'] = 'overridden'
+
+    pipeline_state = types.SimpleNamespace(raw_resource_id=42)
+    ct = ContextRule()
+    mapper = TestMapper()
+    collector = TestCollector()
+    for controller in [mapper, collector]:
+        controller.bind_proxy_state(pipeline_state)
+        ct.attach_callback_kwargs_controller(controller)
+
+    kwargs = await ct.callback_kwargs('attr', 'state')
+    assert 'attr' == kwargs['attr']
+    assert 42 == kwargs['resource_id']
+    assert collector is kwargs['var_collector']
+
+    # registered by previous callbacks, visible to following callbacks.
+    kwargs['callback_kwargs'].register('foo', 1)
+    collector.generated = 2
+    kwargs = await ct.callback_kwargs('other', None)
+    assert 'other' == kwargs['attr']
+    assert 1 == kwargs['foo']
+    assert 2 == kwargs['generated']
+
+    ct.attach_callback_kwargs_controller(TestUpdateOnly())
+    kwargs = await ct.callback_kwargs(None, None)
+    assert 'overridden' == kwargs['resource_id']
+
+    ct.reset()
+    kwargs = await ct.callback_kwargs(None, None)
+    assert 'foo' not in kwargs
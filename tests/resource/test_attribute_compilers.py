@@ -0,0 +1,427 @@
+import math
+
+import pytest
+
+from tests.utils.attr_config import *
+from restpf.resource.attribute_compilers import (
+    compile_validator,
+    compiled_validator,
+    validate_state,
+    compile_serializer,
+    serialize_state,
+    _verified_serializer,
+    compile_encoder,
+    encode_state,
+    compile_parser,
+    compiled_packer,
+    compiled_unpacker,
+)
+from restpf.resource.attribute_states import IntegerStateForOutputDefault
+from restpf.utils.encoders import dumps_json
+
+
+def _validate_by_state(attr, value, attr_context, node2statecls):
+    state = create_attribute_state_tree(attr, value, node2statecls)
+    return state.validate(attr_context)
+
+
+def _assert_same_result(attr, values):
+    for method in [HTTPMethodConfig.GET, HTTPMethodConfig.POST]:
+        attr_context = AttributeContextOperator(method)
+
+        for node2statecls in [
+            node2statecls_default_input,
+            node2statecls_default_output,
+        ]:
+            validate = compile_validator(attr, attr_context, node2statecls)
+
+            for value in values:
+                try:
+                    expected = _validate_by_state(
+                        attr, value, attr_context, node2statecls,
+                    )
+                except (AssertionError, RuntimeError) as e:
+                    with pytest.raises(type(e)):
+                        validate(value)
+                    continue
+
+                assert expected == validate(value), (method, value)
+
+
+def test_compiled_validator_leaf():
+    _assert_same_result(Integer(), [1, True, 1.0, '1', None])
+    _assert_same_result(Float(), [1.0, 1, None])
+    _assert_same_result(String(), [
+        'a', 1, None, {'type': 'string', 'value': 'a'},
+    ])
+
+
+def test_compiled_validator_nested():
+    attr = Object({
+        'foo': Integer,
+        'bar': Array(Object({
+            'a': String(appear_in_get=AppearanceConfig.REQUIRE),
+            'b': Tuple(Integer, Float),
+        })),
+        'baz': Array(Integer),
+    })
+
+    _assert_same_result(attr, [
+        {},
+        {'foo': 1},
+        {'foo': '1'},
+        {'foo': 1, 'unknown': 2},
+        {'foo': 1, 'bar': [], 'baz': [1, 2]},
+        {'foo': 1, 'bar': [{'a': 'x', 'b': [1, 2.0]}], 'baz': []},
+        {'foo': 1, 'bar': [{'a': 'x', 'b': [1, 2]}], 'baz': []},
+        {'foo': 1, 'bar': [{'b': [1, 2.0]}], 'baz': [1]},
+        {'foo': 1, 'bar': [{'a': 'x', 'b': [1]}], 'baz': [1]},
+        {'foo': 1, 'bar': [{'a': 'x'}], 'baz': ['1']},
+        {'foo': 1, 'bar': [{}]},
+        {'foo': 1, 'baz': {'type': 'array', 'value': [1, 2]}},
+    ])
+
+
+def test_compiled_validator_fallback():
+    class DoubledIntegerState(IntegerStateForOutputDefault):
+
+        __slots__ = ()
+
+        def init_state(self, value, node2statecls):
+            self.bh_value = value * 2 if isinstance(value, int) else value
+
+    def node2statecls(node):
+        if isinstance(node, Integer):
+            return DoubledIntegerState
+        if isinstance(node, Float):
+            raise NotImplementedError
+        return node2statecls_default_output(node)
+
+    attr_context = AttributeContextOperator(HTTPMethodConfig.GET)
+    # statecls overriding init_state falls back to building states.
+    attr = Array(Integer)
+    validate = compile_validator(attr, attr_context, node2statecls)
+    for value in [[1, 2], [1, '2'], []]:
+        assert _validate_by_state(
+            attr, value, attr_context, node2statecls,
+        ) == validate(value)
+
+    # errors of node2statecls are not taken as fallback.
+    with pytest.raises(NotImplementedError):
+        compile_validator(Array(Float), attr_context, node2statecls)
+
+
+def test_validate_pending_state():
+    attr = Object({
+        'foo': Integer(appear_in_get=AppearanceConfig.REQUIRE),
+        'bar': Integer,
+    })
+
+    state = create_attribute_state_tree(
+        attr, {'bar': 1}, node2statecls_default_output, lazy=True,
+    )
+    assert not validate_state(state, HTTPMethodConfig.GET)
+    assert validate_state(state, HTTPMethodConfig.GET, fields='bar')
+    assert validate_state(state, HTTPMethodConfig.PATCH)
+    # validated on raw value.
+    assert state.bh_is_pending
+
+    validate = compiled_validator(
+        attr, HTTPMethodConfig.GET, node2statecls_default_output,
+    )
+    assert validate is compiled_validator(
+        attr, HTTPMethodConfig.GET, node2statecls_default_output,
+    )
+
+    # unknown names of sparse fieldset share the same validator.
+    validate = compiled_validator(
+        attr, HTTPMethodConfig.GET, node2statecls_default_output, 'bar',
+    )
+    for idx in range(10):
+        assert validate is compiled_validator(
+            attr, HTTPMethodConfig.GET, node2statecls_default_output,
+            f'bar,junk{idx}',
+        )
+
+
+def test_compiled_serializer():
+    attr = Object({
+        'foo': Integer,
+        'bar': Array(Object({
+            'a': String,
+            'b': Tuple(Integer, Float),
+            'c': Tuple(Integer, Integer),
+        })),
+        'baz': Array(Integer),
+        'empty': Tuple(),
+    })
+    serialize = compile_serializer(attr)
+    verified = compile_serializer(attr, verify=True)
+
+    for value in [
+        {},
+        {'foo': 1, 'unknown': 2},
+        {'foo': None, 'bar': [], 'baz': []},
+        {'bar': [{'a': 'x', 'b': [1, 2.0], 'c': (1, 2)}], 'baz': [1, 2]},
+        {'bar': [{'b': [1, 2.0]}, {'a': None}], 'empty': []},
+    ]:
+        expected = create_attribute_state_tree_for_output(
+            attr, value,
+        ).serialize()
+        assert expected == serialize(value)
+        assert expected == verified(value)
+
+    with pytest.raises(RuntimeError):
+        serialize({'bar': [{'b': [1]}]})
+
+    broken = _verified_serializer(
+        attr, node2statecls_default_output, lambda value: {},
+    )
+    with pytest.raises(RuntimeError):
+        broken({'foo': 1})
+
+    state = create_attribute_state_tree_for_output(
+        attr, {'foo': 1}, lazy=True,
+    )
+    assert {'foo': {'type': 'integer', 'value': 1}} == serialize_state(state)
+    assert state.bh_is_pending
+
+
+def test_ndarray():
+    numpy = pytest.importorskip('numpy')
+
+    attr = Object({
+        'ints': Array(Integer),
+        'floats': Array(Float),
+        'required': Array(Float(appear_in_get=AppearanceConfig.REQUIRE)),
+        'matrix': Array(Array(Integer)),
+        'pair': Tuple(Integer, Integer),
+    })
+    validate = compiled_validator(
+        attr, HTTPMethodConfig.GET, node2statecls_default_output,
+    )
+    serialize = compile_serializer(attr, verify=True)
+
+    value = {
+        'ints': numpy.arange(3),
+        'floats': numpy.array([1.0, numpy.nan]),
+        'required': numpy.array([], dtype=float),
+        'matrix': numpy.arange(4).reshape(2, 2),
+        'pair': numpy.array([1, 2], dtype=numpy.uint8),
+    }
+    assert validate(value)
+    state = create_attribute_state_tree_for_output(attr, value)
+    assert state.validate(AttributeContextOperator(HTTPMethodConfig.GET))
+
+    ret = serialize(value)
+    assert {
+        'type': 'array', 'value': [0, 1, 2], 'element_type': 'integer',
+    } == ret['ints']
+    assert 1.0 == ret['floats']['value'][0]
+    assert math.isnan(ret['floats']['value'][1])
+    assert [[0, 1], [2, 3]] == [
+        row['value'] for row in ret['matrix']['value']
+    ]
+    assert [1, 2] == ret['pair']['value']
+    assert all(type(v) is int for v in ret['ints']['value'])
+
+    # dtype mismatched.
+    assert not validate({'ints': numpy.array([1.5])})
+    assert not validate({'floats': numpy.array(['a'])})
+    assert validate({'required': numpy.array([1.0])})
+    # object dtype is checked one by one.
+    assert validate({'ints': numpy.array([1, None], dtype=object)})
+    assert not validate({'ints': numpy.array([1, 'a'], dtype=object)})
+
+
+def test_nan():
+    numpy = pytest.importorskip('numpy')
+
+    attr = Object({
+        'optional': Array(Float),
+        'required': Array(Float(appear_in_get=AppearanceConfig.REQUIRE)),
+    })
+    validate = compiled_validator(
+        attr, HTTPMethodConfig.GET, node2statecls_default_output,
+    )
+    attr_context = AttributeContextOperator(HTTPMethodConfig.GET)
+
+    def check(value):
+        ret = validate(value)
+        state = create_attribute_state_tree_for_output(attr, value)
+        assert ret == state.validate(attr_context)
+        return ret
+
+    # NaN is a float value in both ndarray and list, None is null.
+    for name in ['optional', 'required']:
+        assert check({name: numpy.array([1.0, numpy.nan])})
+        assert check({name: [1.0, float('nan')]})
+    assert check({'optional': [1.0, None]})
+    assert not check({'required': [1.0, None]})
+
+    serialize = compile_serializer(attr, verify=True)
+    for values in [numpy.array([numpy.nan]), [float('nan')]]:
+        ret = serialize({'optional': values})
+        assert math.isnan(ret['optional']['value'][0])
+
+
+def test_compiled_encoder():
+    attr = Object({
+        'foo': Integer,
+        'bar': Array(Object({
+            'a': String,
+            'b': Tuple(Integer, Float),
+            'c': Tuple(Integer, Integer),
+        })),
+        'baz': Array(Integer),
+    })
+    serialize = compile_serializer(attr)
+    encode = compile_encoder(attr)
+
+    for value in [
+        {},
+        {'foo': 1, 'unknown': 2},
+        {'foo': None, 'bar': [], 'baz': []},
+        {'bar': [{'a': 'x', 'b': [1, 2.0], 'c': (1, 2)}, {'a': None}]},
+        {'baz': list(range(3000))},
+    ]:
+        assert dumps_json(serialize(value)) == ''.join(encode(value))
+
+    state = create_attribute_state_tree_for_output(
+        attr, {'foo': 1}, lazy=True,
+    )
+    assert '{"foo":{"type":"integer","value":1}}' == ''.join(
+        encode_state(state),
+    )
+
+
+def test_compiled_parser():
+    import json
+
+    attr = Object({
+        'foo': Integer,
+        'bar': Array(Object({
+            'a': String(appear_in_post=AppearanceConfig.REQUIRE),
+            'b': Tuple(Integer, Float),
+        })),
+        'baz': Array(Integer),
+    })
+
+    for method in [HTTPMethodConfig.GET, HTTPMethodConfig.POST]:
+        attr_context = AttributeContextOperator(method)
+        validate = compile_validator(
+            attr, attr_context, node2statecls_default_input,
+        )
+        parse = compile_parser(attr, attr_context)
+
+        for text in [
+            '{}',
+            ' {"foo": 1} ',
+            '{"foo": "1"}',
+            '{"foo": {"type": "integer", "value": 1}}',
+            '{"foo": 1, "unknown": [1, {}]}',
+            '{"bar": [], "baz": [1, 2]}',
+            '{"bar": [{"a": "x", "b": [1, 2.0]}]}',
+            '{"bar": [{"a": "x", "b": [1, 2]}]}',
+            '{"bar": [{"b": [1, 2.0]}]}',
+            '{"bar": [{"a": "x", "b": [1]}]}',
+            '{"bar": [{"a": "x", "b": [1, 2.0, 3.0]}]}',
+            '{"bar": [{}], "baz": ["1"]}',
+            '{"baz": {"type": "array", "value": [1, 2]}}',
+            '{"baz": {"value": [1, "2"], "type": "array"}}',
+            # strings are iterable, same as building states.
+            '{"bar": [{"a": "x", "b": "12"}]}',
+            '{"bar": "x"}',
+        ]:
+            value = json.loads(text)
+            try:
+                expected = validate(value)
+            except (AssertionError, RuntimeError):
+                expected = False
+            try:
+                expected_by_state = _validate_by_state(
+                    attr, value, attr_context, node2statecls_default_input,
+                )
+            except (AssertionError, RuntimeError):
+                expected_by_state = False
+            assert expected == expected_by_state, text
+
+            if expected:
+                assert value == parse(text) == parse(text.encode())
+            else:
+                with pytest.raises(RuntimeError):
+                    parse(text)
+
+    attr_context = AttributeContextOperator(HTTPMethodConfig.GET)
+    attr = Object({
+        'pair': Tuple(String, String),
+        'chars': Array(String),
+        'objs': Array(Object({'a': Array(String)})),
+    })
+    parse = compile_parser(attr, attr_context)
+    for text, expected in [
+        ('{"pair": "ab", "chars": "abc"}', True),
+        ('{"pair": "abc"}', False),
+        ('{"chars": ""}', True),
+        ('{"objs": [{"a": "xy"}]}', True),
+        ('{"objs": "xy"}', False),
+    ]:
+        value = json.loads(text)
+        try:
+            expected_by_state = _validate_by_state(
+                attr, value, attr_context, node2statecls_default_input,
+            )
+        except (AssertionError, RuntimeError):
+            expected_by_state = False
+        assert expected == expected_by_state
+
+        if expected:
+            assert value == parse(text)
+        else:
+            with pytest.raises(RuntimeError):
+                parse(text)
+
+    parse = compile_parser(
+        Object({
+            'foo': Integer,
+            'bar': Array(Object({
+                'a': String(appear_in_post=AppearanceConfig.REQUIRE),
+                'b': Tuple(Integer, Float),
+            })),
+            'baz': Array(Integer),
+        }),
+        AttributeContextOperator(HTTPMethodConfig.POST),
+    )
+    # rejected on the first violation, the rest is not parsed.
+    with pytest.raises(RuntimeError):
+        parse('{"baz": [1, "2", this is not json')
+    with pytest.raises(json.JSONDecodeError):
+        parse('{"baz": [1, 2, this is not json')
+    with pytest.raises(json.JSONDecodeError):
+        parse('{"foo": 1, "bar": [{"a": "x", "b": [1, 2.0]}], "baz": [1]} []')
+
+
+def test_compiled_packer():
+    attr = Object({
+        'foo': Integer,
+        'bar': Array(Object({
+            'a': String,
+            'b': Tuple(Integer, Float),
+            'c': Tuple(Integer, Integer),
+        })),
+        'baz': Array(Integer),
+    })
+    serialize = compile_serializer(attr)
+    pack = compiled_packer(attr)
+    unpack = compiled_unpacker(attr)
+
+    for value in [
+        {},
+        {'foo': None, 'bar': [], 'baz': []},
+        {'bar': [{'a': 'x', 'b': [1, 2.0], 'c': [1, 2]}, {'a': None}]},
+        {'foo': 1, 'baz': [1, 2]},
+    ]:
+        packed = pack(serialize(value))
+        assert serialize(value) == serialize(unpack(packed))
+
+    assert [0b101, 1, [1, 2]] == pack(serialize({'foo': 1, 'baz': [1, 2]}))
@@ -2,6 +2,13 @@ import pytest
 
 from tests.utils.attr_config import *
 
+from restpf.resource.attribute_states import NestedAttributeState
+from restpf.resource.attribute_compilers import (
+    compile_validator,
+    validate_state,
+    serialize_state,
+)
+
 
 class _TestContext:
 
@@ -399,3 +406,162 @@ def test_object_path():
 
     assert list(state.a.b.c.bh_path) == ['a', 'b', 'c']
     assert list(state.bh_path) == []
+
+
+def test_compact_state():
+    attr = Array(Object({'foo': Integer}))
+
+    for gen in [gen_test_state_for_input, gen_test_state_for_output]:
+        state = gen(attr, [{'foo': 1}, {'foo': 2}])
+
+        for node in [state, state[0], state[0].foo]:
+            with pytest.raises(AttributeError):
+                object.__getattribute__(node, '__dict__')
+
+        # containers of children are allocated lazily.
+        assert state[0].foo._bh_children is None
+        assert () == state[0].foo.bh_children
+        assert 0 == state[0].foo.bh_children_size
+
+        assert ('element_attr', 'foo') == state[1].foo.bh_path
+
+    state = gen_test_state_for_input(attr, [{'foo': 1}])
+    assert [{'foo': 1}] == state.value
+    assert state.value is state.value
+
+
+def test_lazy_state(monkeypatch):
+    _TestContext.set_context(HTTPMethodConfig.GET)
+
+    attr = Object({
+        'foo': Array(Object({'bar': Integer})),
+        'baz': Tuple(Integer, String),
+    })
+    value = {
+        'foo': [{'bar': 1}, {'bar': 2}],
+        'baz': [3, 'test'],
+        'unknown': 42,
+    }
+
+    eager = create_attribute_state_tree_for_output(attr, value)
+    lazy = create_attribute_state_tree_for_output(attr, value, lazy=True)
+    assert lazy.bh_is_pending
+
+    assert eager.serialize() == lazy.serialize()
+    assert eager.validate(_TestContext.gen_attr_context()) \
+        == lazy.validate(_TestContext.gen_attr_context())
+    # walked through without materializing.
+    assert lazy.bh_is_pending
+
+    # validated and serialized in a single walk, transient children are
+    # generated once.
+    created = []
+    create_element_state = NestedAttributeState.create_element_state
+
+    def counted_create_element_state(self, *args):
+        created.append(self.bh_path)
+        return create_element_state(self, *args)
+
+    monkeypatch.setattr(
+        NestedAttributeState, 'create_element_state',
+        counted_create_element_state,
+    )
+    lazy = create_attribute_state_tree_for_output(
+        attr, {'foo': value['foo'], 'baz': value['baz']}, lazy=True,
+    )
+    assert lazy.validate(_TestContext.gen_attr_context())
+    expected = lazy.serialize()
+    walked_twice = len(created)
+    del created[:]
+
+    assert (True, expected) == lazy.validate_and_serialize(
+        _TestContext.gen_attr_context(),
+    )
+    # foo, baz, 2 elements of foo with their bar, 2 elements of baz.
+    assert 8 == len(created)
+    assert 2 * len(created) <= walked_twice
+    assert lazy.bh_is_pending
+    assert lazy._bh_transient is None
+    monkeypatch.undo()
+
+    invalid = create_attribute_state_tree_for_output(
+        attr, {'foo': [{'bar': 'x'}]}, lazy=True,
+    )
+    assert (False, None) == invalid.validate_and_serialize(
+        _TestContext.gen_attr_context(),
+    )
+
+    # materialized on access.
+    assert 2 == lazy.foo[1].bar.value
+    assert not lazy.bh_is_pending
+    assert lazy.foo.bh_path == ('foo',)
+
+    state = create_attribute_state_tree_for_input(attr, value, lazy=True)
+    assert state.bh_is_pending
+    assert {'foo': [{'bar': 1}, {'bar': 2}], 'baz': (3, 'test'),
+            'unknown': 42} == state.value
+
+    # missing required attribute.
+    attr = Object({
+        'a': Integer(appear_in_get=AppearanceConfig.REQUIRE),
+        'b': Integer,
+    })
+    for lazy in [False, True]:
+        assert not create_attribute_state_tree_for_output(
+            attr, {'b': 1}, lazy=lazy,
+        ).validate(_TestContext.gen_attr_context())
+
+
+def test_deep_state_tree():
+    depth = 3000
+    attr = Integer()
+    value = 1
+    for _ in range(depth):
+        attr = Object({'a': attr})
+        value = {'a': value}
+
+    # deeper than the recursion limit.
+    max_depth = depth + 1
+    for lazy in [False, True]:
+        state = create_attribute_state_tree_for_output(
+            attr, value, lazy=lazy, max_depth=max_depth,
+        )
+        assert state.validate(
+            _TestContext.gen_attr_context(), max_depth=max_depth,
+        )
+
+        ret = state.serialize(max_depth=max_depth)
+        levels = 0
+        while 'a' in ret:
+            ret = ret['a']
+            levels += 1
+        assert depth == levels
+
+    with pytest.raises(RuntimeError):
+        create_attribute_state_tree_for_output(attr, value, max_depth=100)
+
+    state = create_attribute_state_tree_for_output(attr, value, lazy=True)
+    with pytest.raises(RuntimeError):
+        state.serialize(max_depth=100)
+    with pytest.raises(RuntimeError):
+        state.validate(_TestContext.gen_attr_context(), max_depth=100)
+
+    # compiled paths, used by pipelines for pending states, check the depth
+    # of attribute tree.
+    with pytest.raises(RuntimeError):
+        validate_state(state, HTTPMethodConfig.GET)
+    with pytest.raises(RuntimeError):
+        serialize_state(state)
+    with pytest.raises(RuntimeError):
+        compile_validator(
+            attr, _TestContext.gen_attr_context(),
+            node2statecls_default_output, max_depth=100,
+        )
+
+    # within the limit.
+    for _ in range(depth - 10):
+        attr = attr.bh_named_child('a')
+        value = value['a']
+    state = create_attribute_state_tree_for_output(attr, value, lazy=True)
+    assert validate_state(state, HTTPMethodConfig.GET)
+    assert 'a' in serialize_state(state)
@@ -1,3 +1,5 @@
+import pytest
+
 from tests.utils.attr_config import *
 
 from restpf.resource.attributes import (
@@ -5,6 +7,9 @@ from restpf.resource.attributes import (
     Object,
     AttributeContextOperator,
     HTTPMethodConfig,
+    AppearanceConfig,
+    UnknowAttributeConfig,
+    attribute_context,
 )
 from restpf.resource.definition import (
     AttributeCollection,
@@ -114,3 +119,137 @@ def test_validate_on_empty_relationships():
         {},
     )
     assert obj.validate(context)
+
+
+def test_attribute_index():
+    rd = Resource(
+        'test',
+        Attributes({
+            'foo': String,
+            'a': Object({
+                'b': Object({
+                    'bar': String,
+                }),
+            }),
+        }),
+        None,
+    )
+    index = rd.attributes_obj.index
+    attr_obj = rd.attributes_obj.attr_obj
+
+    assert 5 == len(index)
+    assert attr_obj is index.node(0)
+    assert 0 == attr_obj.path_id
+    assert () == attr_obj.bh_path
+
+    bar = attr_obj.bh_named_child('a').bh_named_child('b')
+    bar = bar.bh_named_child('bar')
+    assert ('a', 'b', 'bar') == bar.bh_path
+    assert bar is index.lookup(['a', 'b', 'bar'])
+    assert bar is index.node(bar.path_id)
+    assert bar.path_id == index.path_id(('a', 'b', 'bar'))
+    assert None is index.lookup(('a', 'missing'))
+    assert None is index.path_id(('a', 'missing'))
+
+    # ids are unique within a tree.
+    assert list(range(len(index))) == sorted(
+        node.path_id for node in index.nodes
+    )
+    assert 0 == rd.id_obj.path_id
+
+
+def test_freeze():
+    rd = Resource(
+        'test',
+        Attributes({
+            'foo': String,
+            'a': Object({
+                'bar': String,
+            }),
+        }),
+        None,
+    )
+
+    @rd.attributes.a.bar.GET(whatever=42)
+    def callback_bar():
+        return 'a.bar'
+
+    attributes_obj = rd.attributes_obj
+    registered = attributes_obj._callback_info._registered_callback
+    # lookups don't grow the registry.
+    assert (None, None) == attributes_obj.get_registered_callback_and_options(
+        ['foo'], HTTPMethodConfig.GET,
+    )
+    assert 1 == len(registered)
+
+    assert not rd.frozen
+    rd.freeze()
+    assert rd.frozen
+
+    bar = attributes_obj.index.lookup(('a', 'bar'))
+    for callback, options in [
+        attributes_obj.get_registered_callback_and_options(
+            ['a', 'bar'], HTTPMethodConfig.GET,
+        ),
+        attributes_obj.get_registered_callback_and_options_of_attr(
+            bar, HTTPMethodConfig.GET,
+        ),
+    ]:
+        assert callback is callback_bar
+        assert {'whatever': 42} == options
+
+    assert (None, None) == attributes_obj.get_registered_callback_and_options(
+        ['a', 'bar'], HTTPMethodConfig.POST,
+    )
+    assert (None, None) == \
+        attributes_obj.get_registered_callback_and_options_of_attr(
+            attributes_obj.attr_obj, HTTPMethodConfig.GET,
+        )
+
+    with pytest.raises(RuntimeError):
+        @rd.attributes.foo.GET
+        def callback_foo():
+            pass
+
+
+def test_attribute_policy_table():
+    rd = Resource(
+        'test',
+        Attributes({
+            'foo': String(appear_in_get=AppearanceConfig.REQUIRE),
+            'a': Object({
+                'bar': String,
+            }, unknown_in_post=UnknowAttributeConfig.PROHIBITE),
+        }),
+        None,
+    )
+    attr_obj = rd.attributes_obj.attr_obj
+    foo = attr_obj.bh_named_child('foo')
+    a = attr_obj.bh_named_child('a')
+
+    table = rd.attributes_obj.index.policy_tables[HTTPMethodConfig.GET]
+    assert AppearanceConfig.REQUIRE is table.appearances[foo.path_id]
+    assert frozenset(['foo']) == table.required_children[0]
+
+    for indexed in [True, False]:
+        if not indexed:
+            attr_obj = Object({
+                'foo': String(appear_in_get=AppearanceConfig.REQUIRE),
+                'a': Object({
+                    'bar': String,
+                }, unknown_in_post=UnknowAttributeConfig.PROHIBITE),
+            })
+            foo = attr_obj.bh_named_child('foo')
+            a = attr_obj.bh_named_child('a')
+
+        get_context = attribute_context(HTTPMethodConfig.GET)
+        post_context = attribute_context(HTTPMethodConfig.POST)
+
+        assert AppearanceConfig.REQUIRE is get_context.appear(foo)
+        assert AppearanceConfig.FREE is get_context.appear(a)
+        assert frozenset(['foo']) == get_context.required_children(attr_obj)
+        assert frozenset(['foo', 'a']) == \
+            post_context.required_children(attr_obj)
+        assert UnknowAttributeConfig.PROHIBITE is post_context.unknown(a)
+        assert UnknowAttributeConfig.IGNORE is \
+            attribute_context(HTTPMethodConfig.PATCH).unknown(a)
@@ -0,0 +1,278 @@
+import asyncio
+import os
+import threading
+
+import pytest
+
+from tests.utils.attr_config import *
+from restpf.utils.constants import CallbackExecutorConfig
+from restpf.utils.executors import (
+    BoundedThreadPoolExecutor,
+    BoundedProcessPoolExecutor,
+    CallbackExecutorManager,
+)
+from restpf.resource.definition import (
+    Attributes,
+    Resource,
+)
+from restpf.pipeline.single_resource.get import (
+    GetSingleResourcePipelineRunner,
+)
+
+
+@pytest.mark.asyncio
+async def test_bounded_thread_pool():
+    pool = BoundedThreadPoolExecutor(max_workers=2, max_queue_size=1)
+    release = threading.Event()
+
+    def blocking(value):
+        release.wait()
+        return value
+
+    futures = [
+        asyncio.ensure_future(pool.run(blocking, {'value': idx}))
+        for idx in range(5)
+    ]
+    await asyncio.sleep(0.05)
+
+    metrics = pool.metrics()
+    assert 3 == metrics.max_in_flight
+    assert 2 == metrics.active
+    assert 3 == metrics.in_flight
+    assert 2 == metrics.waiting
+
+    # cancelled waiter doesn't take the slot.
+    futures[4].cancel()
+    await asyncio.sleep(0)
+    assert 1 == pool.metrics().waiting
+
+    release.set()
+    assert list(range(4)) == await asyncio.gather(*futures[:4])
+    assert 4 == await pool.run(blocking, {'value': 4})
+
+    metrics = pool.metrics()
+    assert 0 == metrics.in_flight
+    assert 5 == metrics.completed
+    assert 3 == metrics.peak_in_flight
+
+    pool.shutdown()
+
+
+def test_bounded_thread_pool_in_loops():
+    pool = BoundedThreadPoolExecutor(max_workers=1, max_queue_size=0)
+
+    async def contend():
+        return await asyncio.gather(*(
+            pool.run(lambda value: value, {'value': idx})
+            for idx in range(3)
+        ))
+
+    # the executor outlives the first loop.
+    for _ in range(2):
+        assert [0, 1, 2] == asyncio.run(contend())
+
+    pool.shutdown()
+
+
+def test_bounded_thread_pool_shared_by_loops():
+    import time
+
+    pool = BoundedThreadPoolExecutor(max_workers=2, max_queue_size=0)
+
+    def sleep(value):
+        time.sleep(0.01)
+        return value
+
+    async def contend():
+        return await asyncio.gather(*(
+            pool.run(sleep, {'value': idx})
+            for idx in range(4)
+        ))
+
+    rets = []
+    threads = [
+        threading.Thread(target=lambda: rets.append(asyncio.run(contend())))
+        for _ in range(3)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert [[0, 1, 2, 3]] * 3 == rets
+    metrics = pool.metrics()
+    # bounded across loops.
+    assert 2 == metrics.peak_in_flight
+    assert 0 == metrics.in_flight
+    assert 12 == metrics.completed
+
+    pool.shutdown()
+
+
+def test_callback_executor_manager_select():
+    manager = CallbackExecutorManager()
+    assert manager.select() is None
+    assert manager.select('thread') is manager.thread_pool
+
+    manager = CallbackExecutorManager(default=CallbackExecutorConfig.THREAD)
+    assert manager.select() is manager.thread_pool
+    assert manager.select('inline') is None
+
+
+async def _run_get(resource):
+    tp = GetSingleResourcePipelineRunner()
+    tp.build_pipeline_state(raw_resource_id=42)
+    tp.build_context_rule()
+    tp.build_state_tree_builder()
+    tp.build_representation_generator()
+    tp.set_resource(resource)
+    return await tp.run_pipeline()
+
+
+@pytest.mark.asyncio
+async def test_thread_executor_option():
+    test = Resource(
+        'test',
+        Attributes({
+            'foo': Integer,
+            'bar': Integer,
+        }),
+    )
+
+    threads = {}
+
+    @test.attributes.foo.GET(executor='thread')
+    def get_foo(resource_id):
+        threads['foo'] = threading.get_ident()
+        return resource_id
+
+    @test.attributes.bar.GET
+    def get_bar(resource_id):
+        threads['bar'] = threading.get_ident()
+        return resource_id + 1
+
+    pipeline = await _run_get(test)
+
+    assert threading.get_ident() != threads['foo']
+    assert threading.get_ident() == threads['bar']
+    assert 42 == pipeline.representation['attributes']['foo']['value']
+    assert 43 == pipeline.representation['attributes']['bar']['value']
+
+
+@pytest.mark.asyncio
+async def test_thread_executor_of_resource():
+    manager = CallbackExecutorManager(
+        default=CallbackExecutorConfig.THREAD,
+        thread_pool_size=1,
+    )
+    test = Resource(
+        'test',
+        Attributes({
+            'foo': Integer,
+        }),
+        callback_executors=manager,
+    )
+
+    threads = []
+
+    @test.attributes.foo.GET
+    def get_foo(resource_id):
+        threads.append(threading.get_ident())
+        return resource_id
+
+    await _run_get(test)
+
+    assert threading.get_ident() != threads[0]
+    assert 1 == manager.thread_pool.metrics().completed
+    manager.shutdown()
+
+
+def score(resource_id, attr, state=None):
+    return (os.getpid(), resource_id * resource_id, '.'.join(attr))
+
+
+@pytest.mark.asyncio
+async def test_process_executor_option():
+    manager = CallbackExecutorManager(process_pool_size=2)
+    pids = manager.process_pool.start()
+    assert 2 == len(pids)
+
+    test = Resource(
+        'test',
+        Attributes({
+            'score': Tuple(Integer, Integer, String),
+        }),
+        callback_executors=manager,
+    )
+    test.attributes.score.GET(executor='process')(score)
+
+    pipeline = await _run_get(test)
+    pid, value, path = map(
+        lambda x: x['value'],
+        pipeline.representation['attributes']['score']['value'],
+    )
+
+    assert pid in pids
+    assert os.getpid() != pid
+    assert 42 * 42 == value
+    assert 'score' == path
+    manager.shutdown()
+
+
+def test_start_process_pool_of_resources():
+    manager = CallbackExecutorManager(process_pool_size=1)
+    test = Resource(
+        'test',
+        Attributes({
+            'score': Tuple(Integer, Integer, String),
+        }),
+        callback_executors=manager,
+    )
+
+    manager.start(test)
+    # not used by default nor by any callback.
+    assert manager._process_pool is None
+
+    test.attributes.score.GET(executor='process')(score)
+    assert {CallbackExecutorConfig.PROCESS} == test.callback_executor_configs()
+    manager.start(test)
+    assert 1 == manager.process_pool.metrics().max_workers
+    assert manager.process_pool._executor is not None
+    manager.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_process_executor_rejects_closure():
+    manager = CallbackExecutorManager(process_pool_size=1)
+
+    def closure():
+        pass
+
+    with pytest.raises(RuntimeError):
+        await manager.process_pool.run(closure, {})
+    manager.shutdown()
+
+
+def weigh(resource_id, state, extra=None):
+    return resource_id, state, extra
+
+
+def test_process_kwargs():
+    pool = BoundedProcessPoolExecutor(max_workers=1)
+
+    def kwargs_of(**kwargs):
+        return pool._prepare(weigh, kwargs).args[1]
+
+    # unpicklable optional kwarg is dropped, checked on every call.
+    assert 'extra' not in kwargs_of(resource_id=1, state=1, extra=lambda: 0)
+    assert 2 == kwargs_of(resource_id=1, state=1, extra=2)['extra']
+
+    with pytest.raises(RuntimeError, match='state'):
+        kwargs_of(resource_id=1, state=lambda: 0)
+
+    # output states without value are serialized.
+    state = create_attribute_state_tree_for_output(
+        Object({'a': Integer}), {'a': 1},
+    )
+    assert {'a': {'type': 'integer', 'value': 1}} == \
+        kwargs_of(resource_id=1, state=state)['state']
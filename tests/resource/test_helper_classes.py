@@ -2,6 +2,7 @@ from restpf.utils.helper_classes import (
     ContextOperator,
     TreeState,
     ProxyStateOperator,
+    LRUCache,
 )
 
 
@@ -80,3 +81,47 @@ def test_proxy_state_operator():
     t.bind_proxy_state(state)
     assert 42 == state.foo
     assert {} == state.bar
+
+    # rebind, hierarchy is cached and class default is not shared.
+    other_state = types.SimpleNamespace()
+    other = TestDefault()
+    other.bind_proxy_state(other_state)
+    assert t.PROXY_ATTRS is other.PROXY_ATTRS
+    assert state.bar is not other_state.bar
+
+    new_state = types.SimpleNamespace(foo=1)
+    t.bind_proxy_state(new_state)
+    assert 1 == t.foo
+    assert new_state.bar is not state.bar
+
+
+def test_lru_cache():
+    cache = LRUCache(max_entries=2)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    assert 1 == cache.get('a')
+    # b is the least recently used.
+    cache.set('c', 3)
+    assert 'b' not in cache
+    assert 1 == cache.get('a')
+    assert 3 == cache.get('c')
+
+    cache = LRUCache(max_bytes=10, sizeof=len)
+    cache.set('a', 'x' * 6)
+    cache.set('b', 'x' * 4)
+    assert 10 == cache.bytes
+    cache.set('c', 'x')
+    assert 'a' not in cache
+    assert 5 == cache.bytes
+    # too large.
+    cache.set('d', 'x' * 11)
+    assert 'd' not in cache
+
+    now = [0]
+    cache = LRUCache(ttl=10, timer=lambda: now[0])
+    cache.set('a', 1)
+    now[0] = 9
+    assert 1 == cache.get('a')
+    now[0] = 10
+    assert cache.get('a') is None
+    assert 0 == len(cache)
@@ -1,10 +1,21 @@
 import pytest
 
 from restpf.utils.helper_functions import (
+    CallbackInvoker,
+    callback_invoker,
     async_call,
     bind_self_with_options,
     method_named_args,
     parallel_groups_of_callbacks,
+    callback_dependencies,
+    normalize_sparse_fields,
+    sparse_fields_to_tree,
+    sparse_fields_cover,
+    prune_by_sparse_fields,
+)
+from restpf.utils.encoders import (
+    dumps_json,
+    iter_chunks,
 )
 
 
@@ -20,6 +31,11 @@ async def test_async_call():
     assert 3 == await async_call(not_async, 1, b=2)
     assert 3 == await async_call(is_async, 1, 2)
 
+    # signature is not inspected without kwargs filtering.
+    assert 2 == await async_call(max, 1, 2)
+    with pytest.raises(ValueError):
+        await async_call(max, a=1)
+
 
 @pytest.mark.asyncio
 async def test_async_call_kwargs_subset_filtering():
@@ -156,3 +172,112 @@ def testparallel_groups_of_callbacks():
     assert 2 == len(groups)
     assert set([a, b, c]) == set(groups[0])
     assert set([d]) == set(groups[1])
+
+
+def test_callback_dependencies():
+
+    def a():
+        pass
+
+    def b():
+        pass
+
+    def c():
+        pass
+
+    def d():
+        pass
+
+    def e():
+        pass
+
+    deps = callback_dependencies([
+        (a, {'before_all': True}),
+        (b, {}),
+        (c, {'run_after': b}),
+        (d, {}),
+        (e, {'after_all': True}),
+    ])
+    assert set() == deps[a]
+    assert set([a]) == deps[b]
+    assert set([b]) == deps[c]
+    assert set([a]) == deps[d]
+    assert set([a, b, c, d]) == deps[e]
+
+
+def test_sparse_fields():
+    fields = normalize_sparse_fields('b.c, a,b.c,')
+    assert (('a',), ('b', 'c')) == fields
+    assert fields == normalize_sparse_fields([('b', 'c'), 'a'])
+    assert normalize_sparse_fields(None) is None
+
+    tree = sparse_fields_to_tree(normalize_sparse_fields('a,a.x,b.c'))
+    assert {'a': {}, 'b': {'c': {}}} == tree
+
+    assert sparse_fields_cover(tree, [])
+    assert sparse_fields_cover(tree, ['a', 'x', 'y'])
+    assert sparse_fields_cover(tree, ['b'])
+    assert not sparse_fields_cover(tree, ['b', 'd'])
+    assert not sparse_fields_cover(tree, ['e'])
+
+    assert {'a': 1, 'b': {'c': 2}} == prune_by_sparse_fields(
+        {'a': 1, 'b': {'c': 2, 'd': 3}, 'e': 4}, tree,
+    )
+
+
+@pytest.mark.asyncio
+async def test_callback_invoker():
+    import gc
+    import weakref
+
+    def positional_only(a, /, b, c=3, *args):
+        return (a, b, c, args)
+
+    invoker = CallbackInvoker(positional_only)
+    assert (1, 2, 3, ()) == await invoker({'a': 1, 'b': 2, 'd': 4})
+    with pytest.raises(RuntimeError):
+        invoker.call({'b': 2})
+
+    async def var_keyword(a, **kwargs):
+        return (a, kwargs)
+
+    invoker = CallbackInvoker(var_keyword)
+    assert invoker.is_coroutine
+    assert (1, {'b': 2}) == await invoker({'a': 1, 'b': 2})
+
+    # unregistered callbacks are not kept alive by cache.
+    def create_closure():
+        value = object()
+
+        def closure(a):
+            return value
+        return closure
+
+    closure = create_closure()
+    assert 1 == len(callback_invoker(closure).signature.params_all)
+    ref = weakref.ref(closure)
+    del closure
+    gc.collect()
+    assert ref() is None
+
+    class Foo:
+        def method(self, a, b=2):
+            return a + b
+
+    foo = Foo()
+    assert 3 == await async_call(foo.method, a=1, c=3)
+    ref = weakref.ref(foo)
+    del foo
+    gc.collect()
+    assert ref() is None
+
+
+def test_iter_chunks():
+    pieces = ['{"a":', '"\u00e9\u00e9"', ',"b":[1,2,3]}']
+    chunks = list(iter_chunks(pieces, chunk_size=4))
+    assert all(4 == len(chunk) for chunk in chunks[:-1])
+    assert 0 < len(chunks[-1]) <= 4
+    assert ''.join(pieces).encode('utf-8') == b''.join(chunks)
+
+    assert [] == list(iter_chunks([]))
+    assert '{"a":[1,2]}' == dumps_json({'a': (1, 2)})